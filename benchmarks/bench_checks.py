@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmarks of meteocheck with synthetic data (see synthetic.py).
+
+Times every check of 'Checking' (MultiDayChecking for more than one day),
+open_meteo_file() with and without the on-disk cache, solpos(),
+valleys_radiation() and finish_log(), for several data sizes and resolutions:
+
+    python benchmarks/bench_checks.py [--sizes 1D 1M 1Y 5Y] [--freqs 1min 1s]
+
+Each line gives the throughput in samples/s and the peak memory allocated
+during the call (measured with tracemalloc in a second run, so it does not
+slow down the timing). Memory of pyarrow's own allocator is not included.
+Sizes with more samples than --max-samples are skipped.
+
+No '.ini' file is needed. Files, logs and cache are written to a temporary
+directory.
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+
+# synthetic.py, and meteocheck from this tree if it is not installed
+sys.path.insert(0, str(Path(__file__).parent))
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import synthetic # noqa: E402
+
+import meteocheck.core as mc_core # noqa: E402
+import meteocheck.cache as mc_cache # noqa: E402
+import meteocheck.solar_functions as mc_solar # noqa: E402
+import meteocheck.config_meteo_stations as mc_meteo # noqa: E402
+import meteocheck.config_email as mc_email # noqa: E402
+from meteocheck.multiday import MultiDayChecking # noqa: E402
+
+SIZES = {'1D': 1, '1W': 7, '1M': 30, '1Y': 365, '5Y': 1826}
+
+DATE_START = '2019-01-01'
+
+# Checks of each station and their arguments. 'other_radiation' is taken
+# from the geonica frame of the same size
+CHECKS = {
+    'helios': [
+        ('check_format', {'num_columns': 7}),
+        ('check_time_index', {}),
+        ('check_null', {'column': 'B'}),
+        ('check_range', {'column': 'B', 'minimum': 0, 'maximum': 1200}),
+        ('check_pct_change', {'column': 'Tamb', 'window': 5, 'threshold_pct': 10}),
+        ('check_abs_change', {'column': 'B', 'window': 5, 'threshold': 400}),
+        ('check_differential', {'column': 'B', 'threshold': 200}),
+        ('check_total_irradiation', {'column': 'B', 'total_irradiation_threshold': 12}),
+        ('check_coherence_radiation', {'threshold_pct': 10, 'dni': 'B', 'ghi': 'G(0)', 'dhi': 'D(0)'}),
+        ('check_radiation_other_source', {'column': 'B', 'threshold_pct': 5}),
+        ('check_total_irradiation_other_source', {'column': 'B', 'threshold_pct': 5}),
+        ('check_num_radiation_transitions_other_source', {'column': 'B',
+                                                          'num_diff_radiation_transitions_thresold': 5}),
+        ('check_same_magnitude_pct_change', {'column': 'G(41)', 'column_other': 'G(0)', 'threshold_pct': 15}),
+        ('check_same_irradiance_pct_change', {'column': 'G(41)', 'column_other': 'G(0)', 'threshold_pct': 15}),
+        ('check_same_magnitude_total_irradiation', {'column': 'G(41)', 'column_other': 'G(0)',
+                                                    'threshold_pct': 15}),
+    ],
+    'geonica': [
+        ('check_misalignment_geonica', {'column': 'DNI'}),
+        ('check_coherence_isotypes', {'dni': 'DNI', 'top': 'Top', 'mid': 'Mid', 'bot': 'Bot', 'threshold_pct': 5}),
+        ('check_coherence_radiation', {'threshold_pct': 10, 'dni': 'DNI', 'ghi': 'GHI', 'dhi': 'DHI'}),
+        ('check_abs_change', {'column': 'DNI', 'window': [5, 60, 600], 'threshold': [400, 600, 800]}),
+    ],
+    'meteo': [
+        ('check_format', {'num_columns': 4}),
+        ('check_null', {'column': 'T'}),
+        ('check_range', {'column': 'T', 'minimum': -20, 'maximum': 50}),
+    ],
+}
+
+
+def measure(function, *args, **kwargs):
+    """
+    Returns the seconds and the peak of allocated bytes of 'function(*args, **kwargs)'
+    """
+    with contextlib.redirect_stdout(io.StringIO()): # checks may print
+        start = time.perf_counter()
+        function(*args, **kwargs)
+        seconds = time.perf_counter() - start
+
+        tracemalloc.start()
+        function(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return seconds, peak
+
+
+def report(station, freq, size, name, num_samples, seconds, peak):
+    print('{:8} {:5} {:3} {:46} {:>10} {:10.4f} {:>14,.0f} {:10.1f}'.format(
+        station, freq, size, name, num_samples, seconds, num_samples / seconds, peak / 2**20))
+
+
+def checking_of(station, df, samples_per_hour):
+    if df.index[0].normalize() == df.index[-1].normalize():
+        return mc_core.Checking.from_frame(df, station, samples_per_hour, date=df.index[0].date())
+    return MultiDayChecking(station, df, samples_per_hour=samples_per_hour)
+
+
+def bench_checks(station, freq, size, df, other_radiation, samples_per_hour):
+    for name_check, kwargs in CHECKS[station]:
+        if 'column' in kwargs and name_check.endswith('other_source'):
+            kwargs = dict(kwargs, other_radiation=other_radiation)
+
+        def run_check():
+            # a new Checking each time, so every check computes its own intermediate results
+            getattr(checking_of(station, df, samples_per_hour), name_check)(**kwargs)
+
+        report(station, freq, size, name_check, len(df), *measure(run_check))
+
+
+def bench_files(station, freq, size, days, path, samples_per_hour):
+    """
+    open_meteo_file() of the first 'days' files, parsed and from the cache
+    """
+    synthetic.write_station_files(path, station, DATE_START, days=days, freq=freq)
+    dates = pd.date_range(DATE_START, periods=days, freq='D').date
+    num_samples = int(days * 24 * samples_per_hour)
+
+    def open_files(use_cache):
+        for date in dates:
+            mc_meteo.open_meteo_file(date, station, use_cache=use_cache)
+
+    report(station, freq, size, 'open_meteo_file', num_samples, *measure(open_files, False))
+
+    cache = mc_cache.get_file_cache()
+    cache.clear()
+    open_files(True) # fills the cache
+    report(station, freq, size, 'open_meteo_file (cached)', num_samples, *measure(open_files, True))
+
+
+def bench_solar(freq, size, df):
+
+    def solpos_cold():
+        mc_solar._solpos_regular.cache_clear()
+        mc_solar.solpos(df.index)
+
+    report('-', freq, size, 'solpos', len(df), *measure(solpos_cold))
+    report('-', freq, size, 'valleys_radiation (by_day)', len(df),
+           *measure(mc_solar.valleys_radiation, df['DNI'], by_day=True))
+
+
+def bench_finish_log(freq, size, num_samples):
+    lines = mc_core.log.lines()
+
+    def finish_log():
+        mc_core.log.clear()
+        mc_core.log.extend(lines)
+        mc_core.finish_log()
+
+    report('-', freq, size, 'finish_log ({} lines)'.format(len(lines)), num_samples, *measure(finish_log))
+    mc_core.log.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', default=['1D', '1M', '1Y'], choices=list(SIZES))
+    parser.add_argument('--freqs', nargs='+', default=['1min', '1s'])
+    parser.add_argument('--stations', nargs='+', default=list(CHECKS), choices=list(CHECKS))
+    parser.add_argument('--max-samples', type=int, default=10_000_000,
+                        help='larger sizes are skipped (default: 10,000,000)')
+    parser.add_argument('--max-file-days', type=int, default=30,
+                        help='maximum number of files written to time open_meteo_file (default: 30)')
+    args = parser.parse_args()
+
+    mc_core.log_sinks.clear()
+    mc_email.email_config.IS_SENDING_EMAIL = False
+
+    with tempfile.TemporaryDirectory() as path:
+        os.chdir(path) # logs and cache of finish_log() and open_meteo_file()
+        stations_config = mc_meteo.stations_config
+        stations_config.DATA_PATH_HELIOS = stations_config.DATA_PATH_GEONICA = \
+            stations_config.DATA_PATH_METEO = Path(path, 'data')
+
+        print('{:8} {:5} {:3} {:46} {:>10} {:>10} {:>14} {:>10}'.format(
+            'station', 'freq', 'size', 'benchmark', 'samples', 'seconds', 'samples/s', 'peak MiB'))
+
+        for freq in args.freqs:
+            samples_per_hour = pd.Timedelta('1H') / pd.Timedelta(freq)
+
+            for size in args.sizes:
+                days = SIZES[size]
+                num_samples = int(days * 24 * samples_per_hour)
+                if num_samples > args.max_samples:
+                    print('{:8} {:5} {:3} skipped: {:,} samples'.format('-', freq, size, num_samples))
+                    continue
+
+                geonica = synthetic.station_frame('geonica', DATE_START, days=days, freq=freq, seed=1)
+                other_radiation = geonica['DNI']
+
+                bench_solar(freq, size, geonica)
+
+                for station in args.stations:
+                    df = geonica if station == 'geonica' else synthetic.station_frame(
+                        station, DATE_START, days=days, freq=freq)
+
+                    bench_checks(station, freq, size, df, other_radiation, samples_per_hour)
+                    bench_files(station, freq, size, min(days, args.max_file_days),
+                                Path(path, 'data'), samples_per_hour)
+
+                bench_finish_log(freq, size, num_samples)
+
+        os.chdir(Path(path).parent)
+
+
+if __name__ == '__main__':
+    main()
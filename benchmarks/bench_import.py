@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the time to import meteocheck.
+
+Each module is imported in a fresh interpreter, started from an empty
+temporary directory (so no '.ini' file can be read), and the best time of
+several runs is reported:
+
+    python benchmarks/bench_import.py [--runs 5] [--budget 1.0]
+
+With --budget, it exits with an error if any import takes longer than
+'budget' seconds or if it loads matplotlib or keyring, which are only
+needed to render figures and to send emails. tests/test_import.py asserts
+the budget of each module automatically.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+MODULES = ['meteocheck', 'meteocheck.core', 'meteocheck.batch', 'meteocheck.multiday']
+
+# Heavy modules that importing meteocheck must not load
+LAZY_MODULES = ['matplotlib', 'keyring']
+
+_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, [name for name in {lazy_modules!r} if name in sys.modules]]))
+"""
+
+
+def time_import(module, cwd):
+    """
+    Returns the seconds to import 'module' in a fresh interpreter and the
+    heavy modules it loaded
+    """
+    root = str(Path(__file__).resolve().parents[1])
+    output = subprocess.run([sys.executable, '-c', _SCRIPT.format(module=module, lazy_modules=LAZY_MODULES)],
+                            cwd=cwd, env={'PYTHONPATH': root}, capture_output=True, text=True, check=True)
+    elapsed, loaded = json.loads(output.stdout)
+    return elapsed, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=None, help='seconds')
+    args = parser.parse_args()
+
+    is_failing = False
+
+    with tempfile.TemporaryDirectory() as cwd:
+        print('{:22} {:>10}  {}'.format('module', 'best (s)', 'heavy modules loaded'))
+
+        for module in MODULES:
+            results = [time_import(module, cwd) for _ in range(args.runs)]
+            best = min(elapsed for elapsed, _ in results)
+            loaded = sorted(set(name for _, names in results for name in names))
+
+            print('{:22} {:10.3f}  {}'.format(module, best, ', '.join(loaded) or '-'))
+
+            if args.budget is not None and (best > args.budget or loaded):
+                is_failing = True
+
+    if is_failing:
+        sys.exit('Import budget of {} s exceeded'.format(args.budget))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of MultiDayChecking against a single-day Checking of every day.
+
+Checks synthetic archives (see synthetic.py) of several lengths, where a
+fraction of the days has defects (gaps, spikes, repeated moments and valleys)
+and the others are clean:
+
+    python benchmarks/bench_multiday.py [--days 30 365] [--defective 0 0.1 1]
+
+Each line gives the seconds of the checks of every station (CHECKS) in both
+ways, the speed-up and the lines of the log, that are the same in both (see
+tests/test_multiday.py). The messages and figures of the failing days are
+built in both ways, so the speed-up is lower when most days fail.
+
+No '.ini' file is needed.
+"""
+import argparse
+import contextlib
+import io
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# synthetic.py, and meteocheck from this tree if it is not installed
+sys.path.insert(0, str(Path(__file__).parent))
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import synthetic # noqa: E402
+
+import meteocheck.core as mc_core # noqa: E402
+from meteocheck.multiday import MultiDayChecking # noqa: E402
+
+DATE_START = '2019-01-01'
+
+SAMPLES_PER_HOUR = 60
+
+# Checks of each station, with thresholds that the clean days pass.
+# 'other_radiation' is the DNI of a clean geonica station under the same sky
+CHECKS = {
+    'helios': [
+        ('check_format', {'num_columns': 7}),
+        ('check_time_index', {}),
+        ('check_null', {'column': 'B'}),
+        ('check_range', {'column': 'B', 'minimum': 0, 'maximum': 1200}),
+        ('check_abs_change', {'column': 'B', 'window': [5, 60], 'threshold': [800, 1100]}),
+        ('check_differential', {'column': 'B', 'threshold': 800}),
+        ('check_total_irradiation', {'column': 'B', 'total_irradiation_threshold': 12}),
+        ('check_coherence_radiation', {'threshold_pct': 10, 'dni': 'B', 'ghi': 'G(0)', 'dhi': 'D(0)'}),
+        ('check_radiation_other_source', {'column': 'B', 'threshold_pct': 5}),
+        ('check_total_irradiation_other_source', {'column': 'B', 'threshold_pct': 5}),
+        ('check_num_radiation_transitions_other_source', {'column': 'B',
+                                                          'num_diff_radiation_transitions_thresold': 5}),
+        ('check_same_magnitude_total_irradiation', {'column': 'G(41)', 'column_other': 'G(0)',
+                                                    'threshold_pct': 50}),
+    ],
+    'geonica': [
+        ('check_format', {'num_columns': 7}),
+        ('check_null', {'column': 'DNI'}),
+        ('check_misalignment_geonica', {'column': 'DNI'}),
+        ('check_coherence_isotypes', {'dni': 'DNI', 'top': 'Top', 'mid': 'Mid', 'bot': 'Bot', 'threshold_pct': 5}),
+        ('check_abs_change', {'column': 'DNI', 'window': [5, 60, 600], 'threshold': [800, 1100, 1200]}),
+    ],
+}
+
+
+def archive(type_data_station, days, fraction_defective):
+    """
+    Synthetic frame of 'days' days, with the defects of synthetic.py in
+    'fraction_defective' of them, evenly spread
+    """
+    df = synthetic.station_frame(type_data_station, DATE_START, days=days, gaps=False, spikes=False,
+                                 valleys=False)
+    df_defective = synthetic.station_frame(type_data_station, DATE_START, days=days)
+
+    codes_day = np.arange(days)
+    is_defective = np.floor((codes_day + 1) * fraction_defective) > np.floor(codes_day * fraction_defective)
+    is_defective = np.repeat(is_defective, len(df) // days)
+
+    df[is_defective] = df_defective[is_defective]
+
+    return df
+
+
+def arguments_of(name_check, kwargs, other_radiation):
+    if name_check.endswith('other_source'):
+        return dict(kwargs, other_radiation=other_radiation)
+    return kwargs
+
+
+def check_days(type_data_station, df, other_radiation):
+    for day, df_day in df.groupby(df.index.normalize()):
+        other_day = other_radiation[(other_radiation.index >= day) & (other_radiation.index < day + pd.Timedelta('1D'))]
+        checking = mc_core.Checking.from_frame(df_day, type_data_station, SAMPLES_PER_HOUR, date=day.date())
+
+        for name_check, kwargs in CHECKS[type_data_station]:
+            getattr(checking, name_check)(**arguments_of(name_check, kwargs, other_day))
+
+
+def check_multiday(type_data_station, df, other_radiation):
+    checking = MultiDayChecking(type_data_station, df, samples_per_hour=SAMPLES_PER_HOUR)
+
+    for name_check, kwargs in CHECKS[type_data_station]:
+        getattr(checking, name_check)(**arguments_of(name_check, kwargs, other_radiation))
+
+
+def measure(function, *args):
+    """
+    Returns the seconds of 'function(*args)' and the lines it adds to the log
+    """
+    mc_core.log.clear()
+    with contextlib.redirect_stdout(io.StringIO()): # checks may print
+        start = time.perf_counter()
+        function(*args)
+        seconds = time.perf_counter() - start
+
+    return seconds, len(mc_core.log)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, nargs='+', default=[30, 365])
+    parser.add_argument('--defective', type=float, nargs='+', default=[0, 0.1, 1],
+                        help='fractions of days with defects (default: 0 0.1 1)')
+    args = parser.parse_args()
+
+    mc_core.log_sinks.clear()
+
+    print('{:8} {:>5} {:>9} {:>10} {:>10} {:>8} {:>7}'.format(
+        'station', 'days', 'defective', 'days s', 'multiday s', 'speed-up', 'lines'))
+
+    for days in args.days:
+        other_radiation = synthetic.station_frame('geonica', DATE_START, days=days, gaps=False, spikes=False,
+                                                  valleys=False)['DNI']
+
+        for fraction_defective in args.defective:
+            for type_data_station in CHECKS:
+                df = archive(type_data_station, days, fraction_defective)
+
+                seconds_days, _ = measure(check_days, type_data_station, df, other_radiation)
+                seconds_multiday, num_lines = measure(check_multiday, type_data_station, df, other_radiation)
+
+                print('{:8} {:5d} {:9.0%} {:10.3f} {:10.3f} {:8.1f} {:7d}'.format(
+                    type_data_station, days, fraction_defective, seconds_days, seconds_multiday,
+                    seconds_days / seconds_multiday, num_lines - 1)) # without the line of the opening
+
+    mc_core.log.clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the parsers of meteo files: generic pandas parsing vs. the
+schema fast path of config_meteo_stations.read_meteo_file().
+
+Writes a year of helios-like daily files (1-minute data by default) to a
+temporary directory and reads them with both parsers:
+
+    python benchmarks/bench_parser.py [--days 365] [--samples-per-day 1440]
+
+The fast path uses pyarrow's CSV reader if it is installed.
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# meteocheck from this tree if it is not installed
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import meteocheck.config_meteo_stations as mc_meteo # noqa: E402
+
+
+def write_helios_files(path, days, samples_per_day):
+    rng = np.random.default_rng(0)
+    file_paths = []
+
+    for date in pd.date_range('2019-01-01', periods=days, freq='D'):
+        index = pd.date_range(date, periods=samples_per_day, freq=pd.Timedelta('1D') / samples_per_day)
+        df = pd.DataFrame(rng.uniform(0, 1000, (samples_per_day, 12)).round(2),
+                          columns=['G(0)', 'G(41)', 'D(0)', 'B', 'Wvel', 'Wdir', 'Tamb',
+                                   'Top', 'Mid', 'Bot', 'Vbat', 'Tint'])
+        df.insert(0, 'hh:mm', index.strftime('%H:%M' if samples_per_day <= 1440 else '%H:%M:%S'))
+        df.insert(0, 'yyyy/mm/dd', index.strftime('%Y/%m/%d'))
+
+        file_path = Path(path, 'data' + date.strftime('%Y_%m_%d') + '.txt')
+        df.to_csv(file_path, sep='\t', index=False)
+        file_paths.append(file_path)
+
+    return file_paths
+
+
+def time_parser(parser, file_paths):
+    start = time.perf_counter()
+    for file_path in file_paths:
+        parser(file_path, 'helios')
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--samples-per-day', type=int, default=1440)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as path:
+        file_paths = write_helios_files(path, args.days, args.samples_per_day)
+
+        # both parsers give the same frame
+        pd.testing.assert_frame_equal(mc_meteo._read_meteo_file_generic(file_paths[0], 'helios'),
+                                      mc_meteo.read_meteo_file(file_paths[0], 'helios'))
+
+        time_generic = time_parser(mc_meteo._read_meteo_file_generic, file_paths)
+        time_schema = time_parser(mc_meteo.read_meteo_file, file_paths)
+
+    print('{} helios files of {} rows'.format(args.days, args.samples_per_day))
+    print('generic parser: {:8.3f} s'.format(time_generic))
+    print('schema parser:  {:8.3f} s'.format(time_schema))
+    print('speed-up:       {:8.2f}x'.format(time_generic / time_schema))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the read-ahead of batch.run_batch() on a slow share.
+
+Writes synthetic daily files (see synthetic.py) to a local directory and
+reads them with a simulated latency per file (prefetch.with_latency()),
+reading each file when it is checked (--prefetch 0) and ahead of the
+checking:
+
+    python benchmarks/bench_prefetch.py [--days 30] [--latency 0.2] [--prefetch 0 2 4 8]
+
+Each line gives the wall time of the batch and the counters of
+prefetch.PrefetchStats: time waiting for the files, reading them (in the
+threads) and parsing and checking them. The cache of parsed files is not
+used, so every file is read.
+
+No '.ini' file is needed. Files and logs are written to a temporary
+directory.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# synthetic.py, and meteocheck from this tree if it is not installed
+sys.path.insert(0, str(Path(__file__).parent))
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import synthetic # noqa: E402
+
+import meteocheck.core as mc_core # noqa: E402
+import meteocheck.batch as mc_batch # noqa: E402
+import meteocheck.prefetch as mc_prefetch # noqa: E402
+import meteocheck.config_meteo_stations as mc_meteo # noqa: E402
+import meteocheck.config_email as mc_email # noqa: E402
+
+DATE_START = '2019-01-01'
+
+CHECK_PLAN = {
+    'helios': [
+        ('check_time_index', {}),
+        ('check_range', {'column': 'B', 'minimum': 0, 'maximum': 1200}),
+        ('check_abs_change', {'column': 'B', 'window': 5, 'threshold': 400}),
+        ('check_misalignment_geonica', {'column': 'B'}),
+        ('check_coherence_radiation', {'threshold_pct': 10, 'dni': 'B', 'ghi': 'G(0)', 'dhi': 'D(0)'}),
+    ],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds per file (default: 0.2)')
+    parser.add_argument('--prefetch', type=int, nargs='+', default=[0, 2, 4, 8])
+    parser.add_argument('--processes', type=int, default=1)
+    args = parser.parse_args()
+
+    mc_core.log_sinks.clear()
+    mc_email.email_config.IS_SENDING_EMAIL = False
+
+    def fetch(type_data_station, date):
+        return mc_meteo.fetch_meteo_file(date, type_data_station, use_cache=False)
+
+    with tempfile.TemporaryDirectory() as path:
+        os.chdir(path) # logs of finish_log()
+        stations_config = mc_meteo.stations_config
+        stations_config.DATA_PATH_HELIOS = stations_config.DATA_PATH_GEONICA = \
+            stations_config.DATA_PATH_METEO = Path(path, 'data')
+
+        synthetic.write_station_files(Path(path, 'data'), 'helios', DATE_START, days=args.days)
+        date_end = pd.Timestamp(DATE_START) + pd.Timedelta(days=args.days - 1)
+
+        print('{:>8} {:>10} {:>10} {:>10} {:>10} {:>10}'.format(
+            'prefetch', 'wall s', 'io_wait s', 'fetch s', 'compute s', 'max MiB'))
+
+        for prefetch in args.prefetch:
+            stats = mc_prefetch.PrefetchStats()
+
+            start = time.perf_counter()
+            mc_batch.run_batch(DATE_START, date_end, CHECK_PLAN, processes=args.processes,
+                               is_finishing_log=False, prefetch=prefetch,
+                               fetch=mc_prefetch.with_latency(fetch, args.latency), stats=stats)
+            wall_time = time.perf_counter() - start
+            mc_core.log.clear()
+            mc_core.profile.clear()
+
+            print('{:8d} {:10.2f} {:10.2f} {:10.2f} {:10.2f} {:10.1f}'.format(
+                prefetch, wall_time, stats.io_wait, stats.fetch_time, stats.compute_time,
+                stats.max_buffered_bytes / 2**20))
+
+        os.chdir(Path(path).parent)
+
+
+if __name__ == '__main__':
+    main()
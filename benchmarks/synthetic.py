@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Deterministic synthetic data of the supported meteo stations.
+
+Frames are built from a clear-sky model at the default site of
+solar_functions.solpos() plus clouds, and optionally with the defects the
+checks look for: gaps (NaN), spikes, duplicated timestamps and valleys of
+a misaligned tracker in the direct radiation. The same arguments (and
+'seed') always give the same frame.
+
+    >>> df = station_frame('helios', '2019-06-01', days=1, freq='1min')
+    >>> write_station_files(path, 'geonica', '2019-06-01', days=30)
+
+Columns of each station:
+    - 'helios': G(0), G(41), D(0), B, Wvel, Wdir, Tamb, as in its files
+    - 'geonica': DNI, GHI, DHI, Top, Mid, Bot, T (Top/Mid/Bot are isotypes)
+    - 'meteo': T, HR, P, Wvel
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import meteocheck.solar_functions as mc_solar
+import meteocheck.config_meteo_stations as mc_meteo
+
+STATION_COLUMNS = {
+    'helios': ['G(0)', 'G(41)', 'D(0)', 'B', 'Wvel', 'Wdir', 'Tamb'],
+    'geonica': ['DNI', 'GHI', 'DHI', 'Top', 'Mid', 'Bot', 'T'],
+    'meteo': ['T', 'HR', 'P', 'Wvel'],
+}
+
+# Number of defects of each kind per day
+DEFECTS_PER_DAY = {'gaps': 2, 'spikes': 3, 'duplicates': 1, 'valleys': 6}
+
+
+def clear_sky(index):
+    """
+    Direct normal, global horizontal and diffuse radiation [W/m2] of a clear
+    sky (Meinel model for DNI), and cosine of the zenith angle
+    """
+    _, zz = mc_solar.solpos(index)
+    cos_zenith = np.clip(np.cos(np.atleast_1d(zz)), 0, None)
+
+    with np.errstate(divide='ignore', over='ignore'):
+        air_mass = np.where(cos_zenith > 0.01, 1 / np.maximum(cos_zenith, 0.01), np.inf)
+    dni = 1353 * 0.7 ** (air_mass ** 0.678)
+    dhi = 0.1 * dni * cos_zenith + 20 * (cos_zenith > 0)
+    ghi = dhi + dni * cos_zenith
+
+    return dni, ghi, dhi, cos_zenith
+
+
+def _cloudiness(rng, num_samples, samples_per_day):
+    """
+    Fraction of direct radiation that passes through clouds, in [0, 1].
+    Each day is clear, partly cloudy or overcast
+    """
+    num_days = -(-num_samples // samples_per_day)
+    kind_day = rng.choice(3, size=num_days, p=[0.6, 0.3, 0.1])
+
+    # clouds of a few minutes, independent of the resolution
+    length_cloud = max(1, samples_per_day // 1440 * 5)
+    num_clouds = -(-num_samples // length_cloud)
+    clouds = np.repeat(rng.uniform(0, 1, num_clouds) < 0.3, length_cloud)[:num_samples]
+
+    kind_sample = np.repeat(kind_day, samples_per_day)[:num_samples]
+    transmittance = np.ones(num_samples)
+    transmittance[(kind_sample == 1) & clouds] = 0.3
+    transmittance[kind_sample == 2] = 0.1
+
+    return transmittance
+
+
+def station_frame(type_data_station, date_start, days=1, freq='1min', seed=0,
+                  gaps=True, spikes=True, duplicates=False, valleys=True):
+    """
+    Synthetic frame of a supported meteo station
+
+    Parameters
+    ----------
+    type_data_station : String
+        'helios', 'geonica' or 'meteo'
+    date_start : String or datetime.date
+        First day
+    days : int
+        Number of days
+    freq : String
+        Resolution, e.g. '1min' or '1s'
+    seed : int
+        Seed of the random generator
+    gaps, spikes, duplicates, valleys : bool
+        Defects added to every day (see DEFECTS_PER_DAY). Duplicated timestamps
+        make the index irregular, so they are disabled by default
+
+    Returns
+    -------
+    df : pandas.DataFrame
+    """
+    if type_data_station not in STATION_COLUMNS:
+        raise ValueError("The 'type_data_station'='{}' is not supported".format(type_data_station))
+
+    rng = np.random.default_rng(seed)
+
+    step = pd.Timedelta(freq)
+    samples_per_day = int(pd.Timedelta('1D') / step)
+    num_samples = samples_per_day * days
+    index = pd.date_range(pd.Timestamp(date_start), periods=num_samples, freq=step)
+
+    dni, ghi, dhi, cos_zenith = clear_sky(index)
+    transmittance = _cloudiness(rng, num_samples, samples_per_day)
+
+    dni = dni * transmittance
+    dhi = dhi * (2 - transmittance)
+    ghi = dhi + dni * cos_zenith
+
+    is_day = cos_zenith > 0
+    hour = (index.asi8 % (24 * 3600 * 10**9)) / (3600 * 10**9)
+    temperature = 15 + 8 * np.sin((hour - 9) / 24 * 2 * np.pi) + rng.normal(0, 0.2, num_samples)
+    wind_speed = np.abs(rng.normal(3, 1.5, num_samples))
+
+    if valleys:
+        _add_valleys(rng, dni, is_day, samples_per_day)
+        ghi = dhi + dni * cos_zenith
+
+    def noise(scale):
+        return rng.normal(0, scale, num_samples) * is_day
+
+    if type_data_station == 'helios':
+        columns = {'G(0)': ghi + noise(2), 'G(41)': ghi * 1.1 + noise(2), 'D(0)': dhi + noise(1),
+                   'B': dni + noise(2), 'Wvel': wind_speed, 'Wdir': rng.uniform(0, 360, num_samples),
+                   'Tamb': temperature}
+    elif type_data_station == 'geonica':
+        columns = {'DNI': dni + noise(2), 'GHI': ghi + noise(2), 'DHI': dhi + noise(1),
+                   'Top': dni * 1.02 + noise(3), 'Mid': dni + noise(3), 'Bot': dni * 0.97 + noise(3),
+                   'T': temperature}
+    else:
+        columns = {'T': temperature, 'HR': np.clip(60 - temperature + rng.normal(0, 2, num_samples), 0, 100),
+                   'P': 1013 + rng.normal(0, 0.5, num_samples), 'Wvel': wind_speed}
+
+    df = pd.DataFrame({column: np.clip(values, 0, None) if column not in ('T', 'Tamb') else values
+                       for column, values in columns.items()}, index=index)
+
+    if spikes:
+        positions = rng.integers(0, num_samples, DEFECTS_PER_DAY['spikes'] * days)
+        columns_spikes = rng.integers(0, df.shape[1], len(positions))
+        values = df.to_numpy()
+        values[positions, columns_spikes] = 5000
+        df = pd.DataFrame(values, index=index, columns=df.columns)
+
+    if gaps:
+        length_gap = max(1, samples_per_day // 1440 * 10)
+        values = df.to_numpy()
+        for position in rng.integers(0, num_samples, DEFECTS_PER_DAY['gaps'] * days):
+            values[position:position + length_gap, rng.integers(0, df.shape[1])] = np.nan
+        df = pd.DataFrame(values, index=index, columns=df.columns)
+
+    if duplicates:
+        positions = np.sort(rng.integers(0, num_samples, DEFECTS_PER_DAY['duplicates'] * days))
+        df = pd.concat([df, df.iloc[positions]]).sort_index(kind='mergesort')
+
+    return df
+
+
+def _add_valleys(rng, dni, is_day, samples_per_day):
+    """
+    Adds in place the valleys of radiation of a misaligned tracker (see
+    solar_functions.valleys_radiation()) at random daylight moments
+    """
+    moments_day = np.flatnonzero(is_day)
+    if len(moments_day) == 0:
+        return
+
+    num_days = -(-len(dni) // samples_per_day)
+    for position in rng.choice(moments_day, DEFECTS_PER_DAY['valleys'] * num_days):
+        length = rng.integers(4, 7)
+        profile = np.sin(np.linspace(0, np.pi, length + 2))[1:-1]
+        dni[position + 1:position + 1 + length] -= profile[:len(dni) - position - 1] * 0.25 * dni[position]
+
+
+def write_station_files(path, type_data_station, date_start, days=1, freq='1min', seed=0, **defects):
+    """
+    Writes daily files of a supported meteo station in 'path', with the names,
+    directories and layout of the real ones. They can be opened with
+    config_meteo_stations.open_meteo_file() if 'path' is the data path of the
+    station (see station_data_paths())
+
+    Returns
+    -------
+    file_paths : list
+    """
+    df = station_frame(type_data_station, date_start, days=days, freq=freq, seed=seed, **defects)
+
+    format_time = '%H:%M' if pd.Timedelta(freq) >= pd.Timedelta('1min') else '%H:%M:%S'
+
+    file_paths = []
+    for day, df_day in df.groupby(df.index.normalize()):
+        df_file = df_day.reset_index(drop=True)
+
+        if type_data_station == 'meteo':
+            df_file.insert(0, 'date', df_day.index.strftime('%Y/%m/%d ' + format_time))
+        else:
+            df_file.insert(0, 'hh:mm', df_day.index.strftime(format_time))
+            df_file.insert(0, 'yyyy/mm/dd', df_day.index.strftime('%Y/%m/%d'))
+
+        file_path = Path(path, mc_meteo.meteo_file_path(day, type_data_station).relative_to(
+            station_data_paths()[type_data_station]))
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        df_file.to_csv(file_path, sep='\t', index=False, float_format='%.2f')
+        file_paths.append(file_path)
+
+    return file_paths
+
+
+def station_data_paths():
+    """
+    Data path of each supported station, as configured in config_meteo_stations
+    """
+    return {type_data_station: mc_meteo.data_path(type_data_station)
+            for type_data_station in STATION_COLUMNS}
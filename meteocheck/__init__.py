@@ -3,6 +3,36 @@
 Created on Thu Aug 11 12:27:25 2016
 
 @author: Ruben
+
+The public names are imported on first use, so 'import meteocheck' does not
+load pandas, matplotlib or the configuration files.
 """
-from meteocheck.core import Checking, finish_log
-from meteocheck.solar_functions import change_datetimeindex
\ No newline at end of file
+import importlib
+
+# Public name: module where it is defined
+_EXPORTS = {
+    'Checking': 'meteocheck.core',
+    'finish_log': 'meteocheck.core',
+    'change_datetimeindex': 'meteocheck.solar_functions',
+    'run_batch': 'meteocheck.batch',
+    'MultiDayChecking': 'meteocheck.multiday',
+    'StationPanel': 'meteocheck.panel',
+    'LiveDay': 'meteocheck.live',
+    'Watcher': 'meteocheck.watch',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError("module 'meteocheck' has no attribute '{}'".format(name))
+
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
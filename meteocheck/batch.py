@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+Batch checking of several meteo stations over a range of dates.
+
+Every (station, date) is checked in a pool of processes. The incidences of
+each worker are merged, in order, into the session log, so a single email
+and session log are produced. So is the profiling table of the checks. The
+per-sample flags of the days are merged by station.
+
+The files are read ahead in a pool of threads (see prefetch.py), so their
+parsing and checking overlaps with the reading of the next ones. The time
+waiting for the files and computing is logged at the end.
+
+The check plan maps each type of meteo station to the list of checks
+(methods of 'Checking') and their arguments:
+
+    {'helios': [('check_time_index', {}),
+                ('check_range', {'column': 'B', 'minimum': 0, 'maximum': 1200})],
+     'geonica': [('check_misalignment_geonica', {'column': 'DNI'})]}
+
+From CLI, the same plan is given as a JSON file:
+
+    python -m meteocheck.batch 2019-01-01 2019-12-31 --stations helios geonica --plan plan.json
+"""
+import argparse
+import collections
+import datetime as dt
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+import meteocheck.core as mc_core
+import meteocheck.figures as mc_fig
+import meteocheck.flags as mc_flags
+import meteocheck.prefetch as mc_prefetch
+from meteocheck.settings import PREFETCH_NUM_FILES, PREFETCH_MAX_BYTES
+
+
+def check_station_day(type_data_station, date, checks, fetched=None):
+    """
+    Runs the 'checks' of one station and date in its own log.
+
+    Parameters
+    ----------
+    type_data_station : String
+        One of the supported meteo stations
+    date : datetime.date
+        Day of the file
+    checks : list
+        List of (name of the 'Checking' method, dict of arguments)
+    fetched : tuple, optional
+        The file already read (see config_meteo_stations.fetch_meteo_file())
+
+    Returns
+    -------
+    lines : list
+        Raw lines of the log (see core.LogBuffer.lines())
+    profile_lines : list
+        Raw lines of the profiling table of the checks (see core.ProfileTable)
+    flags : flags.QCFlags
+        Per-sample flags of the checks. None if the file cannot be opened
+    """
+    session_log, session_profile = mc_core.log, mc_core.profile
+    mc_core.log, mc_core.profile = mc_core.LogBuffer(), mc_core.ProfileTable()
+
+    try:
+        try:
+            checking = mc_core.Checking(type_data_station, date, finish_log_on_error=False, fetched=fetched)
+        except (OSError, ValueError):
+            # the CRITICAL error is already in the log. Only this station and day are skipped
+            return mc_core.log.lines(), mc_core.profile.lines(), None
+
+        checks_available = mc_core.registered_checks(mc_core.Checking)
+
+        for name_check, kwargs in checks:
+            if name_check not in checks_available:
+                mc_core.add_line_log('ERROR', check_type=name_check,
+                                     error_message='Unknown check. Available checks: {}'.format(sorted(checks_available)),
+                                     type_data_station=type_data_station,
+                                     file_path=checking.file_path)
+                continue
+            try:
+                getattr(checking, name_check)(**kwargs)
+            except Exception as e:
+                mc_core.add_line_log('ERROR', check_type=name_check,
+                                     error_message='Check failed to run: {!r}'.format(e),
+                                     type_data_station=type_data_station,
+                                     file_path=checking.file_path)
+
+        lines = mc_core.log.lines()
+        # the figures go with the lines, maybe to another process, where they are
+        # counted in its memory budget (see merge())
+        mc_fig.release_figures(line[6] for line in lines)
+
+        return lines, mc_core.profile.lines(), checking.flags
+    finally:
+        mc_core.log, mc_core.profile = session_log, session_profile
+
+
+def _check_station_day_task(task):
+    # with the time parsing and checking
+    start = time.perf_counter()
+    result = check_station_day(*task)
+    return result, time.perf_counter() - start
+
+
+def _map_ahead(executor, function, iterable, num_ahead, is_full=None, on_done=None):
+    """
+    executor.map() that only takes the next items of 'iterable' while less
+    than 'num_ahead' results are pending and 'is_full()' is False.
+    'on_done(item)' is called when the result of an item is taken
+    """
+    futures = collections.deque()
+
+    def take():
+        item, future = futures.popleft()
+        result = future.result()
+        if on_done is not None:
+            on_done(item)
+        return result
+
+    for item in iterable:
+        futures.append((item, executor.submit(function, item)))
+        while len(futures) > num_ahead or (futures and is_full is not None and is_full()):
+            yield take()
+
+    while futures:
+        yield take()
+
+
+def run_batch(date_start, date_end, check_plan, stations=None, processes=None,
+              is_finishing_log=True, prefetch=PREFETCH_NUM_FILES, prefetch_bytes=PREFETCH_MAX_BYTES,
+              fetch=None, stats=None):
+    """
+    Checks every station of 'check_plan' for every day in [date_start, date_end]
+
+    Parameters
+    ----------
+    date_start, date_end : datetime.date or String
+        First and last day (both included)
+    check_plan : dict
+        {type_data_station: [(name of the check, dict of arguments), ...]}
+    stations : list, optional
+        Subset of the stations of 'check_plan' to check
+    processes : int, optional
+        Number of worker processes. Defaults to the number of CPUs. If 1, runs
+        in the current process
+    is_finishing_log : bool, default=True
+        Calls finish_log() at the end, so one email and session log are sent/written
+    prefetch : int, optional
+        Files read ahead of the ones being checked, using at most
+        'prefetch_bytes' (see prefetch.Prefetcher). If None, each worker reads
+        its own files
+    fetch : function, optional
+        Reads the file of a (type_data_station, date), e.g. with a simulated
+        latency (see prefetch.with_latency()). Defaults to prefetch.fetch_station_day()
+    stats : prefetch.PrefetchStats, optional
+        Counters of the time waiting for the files and computing, updated by the batch
+
+    Returns
+    -------
+    flags : dict
+        {type_data_station: flags.QCFlags of all the days checked}
+    """
+    if stations is None:
+        stations = list(check_plan)
+
+    dates = pd.date_range(date_start, date_end, freq='D').date
+
+    tasks = [(station, date, check_plan[station]) for date in dates for station in stations]
+
+    mc_core.add_line_log('INFO', error_message='Batch of {} days and stations {}'.format(len(dates), stations))
+
+    if processes is None:
+        processes = os.cpu_count()
+
+    flags_days = {station: [] for station in stations}
+
+    if stats is None:
+        stats = mc_prefetch.PrefetchStats()
+
+    def merge(tasks, results):
+        for (station, _, _), ((lines, profile_lines, flags), compute_time) in zip(tasks, results):
+            stats.compute_time += compute_time
+            mc_fig.adopt_figures(line[6] for line in lines)
+            mc_core.log.extend(lines)
+            mc_core.profile.extend(profile_lines)
+            if flags is not None:
+                flags_days[station].append(flags)
+
+    is_sequential = processes == 1 or len(tasks) <= 1
+
+    if prefetch is None:
+        tasks_run = tasks
+    else:
+        # the files sent to the processes are counted until they are checked
+        prefetcher = mc_prefetch.Prefetcher([(station, date) for station, date, _ in tasks], fetch=fetch,
+                                            num_ahead=prefetch, max_bytes=prefetch_bytes, stats=stats,
+                                            hold=not is_sequential)
+        tasks_run = (task + (fetched,) for task, (_, fetched) in zip(tasks, prefetcher))
+
+    if is_sequential:
+        merge(tasks, map(_check_station_day_task, tasks_run))
+    elif prefetch is None:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            chunksize = max(1, len(tasks) // (4 * processes))
+            # map() keeps the order of the tasks, so the session log is chronological
+            merge(tasks, executor.map(_check_station_day_task, tasks_run, chunksize=chunksize))
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            # the files read ahead are not taken all at once, nor beyond 'prefetch_bytes'
+            merge(tasks, _map_ahead(executor, _check_station_day_task, tasks_run, 2 * processes,
+                                    is_full=prefetcher.is_full, on_done=lambda task: prefetcher.release(task[-1])))
+
+    if prefetch is not None:
+        mc_core.add_line_log('INFO', error_message='Files: {} ({:.1f} MB). Waiting for files: {:.2f} s. '
+                             'Reading: {:.2f} s. Parsing and checking: {:.2f} s'.format(
+                                 stats.num_files, stats.num_bytes / 2**20, stats.io_wait, stats.fetch_time,
+                                 stats.compute_time))
+
+    if is_finishing_log:
+        mc_core.finish_log()
+
+    return {station: mc_flags.combine(flags) for station, flags in flags_days.items() if flags}
+
+
+def read_check_plan(file_path):
+    """
+    Check plan of a JSON file with {type_data_station: [[check, {arguments}], ...]}
+    """
+    with open(file_path) as file_plan:
+        return {station: [tuple(check) for check in checks]
+                for station, checks in json.load(file_plan).items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='meteocheck.batch',
+                                     description='Checks meteo stations over a range of dates')
+    parser.add_argument('date_start', type=dt.date.fromisoformat, help='first day, YYYY-MM-DD')
+    parser.add_argument('date_end', type=dt.date.fromisoformat, help='last day, YYYY-MM-DD')
+    parser.add_argument('--plan', required=True,
+                        help='JSON file with {type_data_station: [[check, {arguments}], ...]}')
+    parser.add_argument('--stations', nargs='+', help='stations of the plan to check (default: all)')
+    parser.add_argument('--processes', type=int, help='number of worker processes (default: CPUs)')
+    prefetch = parser.add_mutually_exclusive_group()
+    prefetch.add_argument('--prefetch', type=int, default=PREFETCH_NUM_FILES,
+                          help='files read ahead of the ones being checked (default: {})'.format(PREFETCH_NUM_FILES))
+    prefetch.add_argument('--no-prefetch', dest='prefetch', action='store_const', const=None,
+                          help='each worker process reads its own files')
+    parser.add_argument('--flags-path',
+                        help='directory where the per-sample flags of each station are saved (.npz)')
+
+    args = parser.parse_args(argv)
+
+    check_plan = read_check_plan(args.plan)
+
+    flags = run_batch(args.date_start, args.date_end, check_plan, stations=args.stations,
+                      processes=args.processes, prefetch=args.prefetch)
+
+    if args.flags_path is not None:
+        Path(args.flags_path).mkdir(parents=True, exist_ok=True)
+        for station, flags_station in flags.items():
+            flags_station.save(Path(args.flags_path, '{}_{}_{}.npz'.format(
+                station, args.date_start, args.date_end)))
+
+
+if __name__ == '__main__':
+    main()
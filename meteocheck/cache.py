@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+On-disk cache of parsed meteo files.
+
+Each parsed daily pandas.DataFrame is stored as a numpy '.npz' file with its
+int64 index (nanoseconds) and one array per column. Entries are keyed by the
+source path plus its modification time and size, so a modified file (e.g.
+today's file, still growing) is parsed again and its previous entry removed.
+They are also keyed by the format of the entries (CACHE_FORMAT) and the version
+of the parsing given by the caller (e.g. a hash of the schema of the station),
+so entries written by other versions are not read.
+Least recently used entries are evicted beyond a maximum size.
+"""
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from meteocheck.settings import CACHE_PATH, CACHE_MAX_BYTES
+
+# Format of the '.npz' entries. Changing it invalidates every entry
+CACHE_FORMAT = 1
+
+
+class FileCache:
+    """
+    Parameters
+    ----------
+    cache_path : Path
+        Directory of the cache. Created if needed
+    max_bytes : int
+        Maximum size of the cache. Least recently used entries are evicted beyond it
+    """
+
+    def __init__(self, cache_path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES):
+        self.cache_path = Path(cache_path)
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def stats(self):
+        """
+        Returns a dict with the counters of this session and the current size of the cache
+        """
+        entries = self._entries()
+
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'writes': self.writes,
+                'evictions': self.evictions,
+                'entries': len(entries),
+                'bytes': sum(size for _, size, _ in entries)}
+
+    @staticmethod
+    def _path_key(file_path):
+        return hashlib.sha1(str(Path(file_path).resolve()).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _version_key(version):
+        return hashlib.sha1('{}:{}'.format(CACHE_FORMAT, version).encode('utf-8')).hexdigest()[:12]
+
+    @staticmethod
+    def signature(file_path):
+        """
+        (modification time [ns], size) of 'file_path', that keys its entry
+        """
+        stat = os.stat(file_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _entry_path(self, file_path, signature=None, version=''):
+        if signature is None:
+            signature = self.signature(file_path)
+        return self.cache_path.joinpath('{}_{}_{}_{}.npz'.format(self._path_key(file_path),
+                                                                 self._version_key(version), *signature))
+
+    def get(self, file_path, version=''):
+        """
+        Returns the cached pandas.DataFrame of 'file_path', or None if it is
+        not cached, the file has changed since or does not exist, or it was
+        cached with another 'version' of the parsing
+        """
+        try:
+            entry_path = self._entry_path(file_path, version=version)
+
+            with np.load(entry_path, allow_pickle=False) as data:
+                index = pd.DatetimeIndex(data['index'].view('datetime64[ns]'),
+                                         name=_from_name(data['index_name']))
+                columns = [_from_name(name) for name in data['columns']]
+                df = pd.DataFrame({column: data['column_{}'.format(i)]
+                                   for i, column in enumerate(columns)}, index=index)
+                df.columns = columns
+        except (OSError, KeyError, ValueError):
+            self.misses += 1
+            return None
+
+        os.utime(entry_path) # recently used
+        self.hits += 1
+
+        return df
+
+    def put(self, file_path, df, signature=None, version=''):
+        """
+        Stores 'df', parsed from 'file_path'. Only frames with a DatetimeIndex
+        and numerical columns are cached.
+
+        'signature' is the one of the file (see signature()) taken before
+        reading it, so if the file grew while it was read and parsed, the
+        entry does not match its new version. Taken now by default.
+
+        'version' of the parsing of 'df', e.g. a hash of the schema of the
+        station. Only get() with the same version reads the entry
+
+        Returns
+        -------
+        is_cached : bool
+        """
+        if (not isinstance(df.index, pd.DatetimeIndex) or df.index.tz is not None or
+                not all(isinstance(column, str) for column in df.columns) or
+                not all(np.issubdtype(dtype, np.number) for dtype in df.dtypes)):
+            return False
+
+        self.cache_path.mkdir(parents=True, exist_ok=True)
+
+        # previous versions of the same file, or of its parsing, are not valid anymore
+        for old_entry in self.cache_path.glob(self._path_key(file_path) + '_*.npz'):
+            _remove(old_entry)
+
+        entry_path = self._entry_path(file_path, signature, version)
+        arrays = {'column_{}'.format(i): df[column].to_numpy()
+                  for i, column in enumerate(df.columns)}
+
+        # written to a temporary file first, so other processes never read half an entry
+        temp_path = entry_path.with_name('{}.{}.tmp'.format(entry_path.stem, os.getpid()))
+        with open(temp_path, 'wb') as file_temp:
+            np.savez(file_temp,
+                     index=df.index.asi8,
+                     index_name=_to_name(df.index.name),
+                     columns=np.array([_to_name(column) for column in df.columns], dtype=str),
+                     **arrays)
+        os.replace(temp_path, entry_path)
+
+        self.writes += 1
+        self.evict()
+
+        return True
+
+    def evict(self):
+        """
+        Removes least recently used entries while the cache is larger than 'max_bytes'
+        """
+        entries = self._entries()
+        size_cache = sum(size for _, size, _ in entries)
+
+        for entry_path, size, _ in sorted(entries, key=lambda entry: entry[2]):
+            if size_cache <= self.max_bytes:
+                break
+            _remove(entry_path)
+            size_cache -= size
+            self.evictions += 1
+
+    def clear(self):
+        for entry_path, _, _ in self._entries():
+            _remove(entry_path)
+
+    def _entries(self):
+        """
+        List of (path, size, last use) of the entries
+        """
+        entries = []
+        if self.cache_path.is_dir():
+            for entry_path in self.cache_path.glob('*.npz'):
+                try:
+                    stat = entry_path.stat()
+                except OSError: # removed by another process
+                    continue
+                entries.append((entry_path, stat.st_size, stat.st_mtime))
+
+        return entries
+
+
+def _to_name(name):
+    # column and index names are stored as strings. None is stored as ''
+    return np.array('' if name is None else str(name))
+
+
+def _from_name(name):
+    name = str(name)
+    return None if name == '' else name
+
+
+def _remove(file_path):
+    try:
+        os.remove(file_path)
+    except OSError:
+        pass
+
+
+_file_cache = None
+
+
+def get_file_cache():
+    """
+    Returns the FileCache configured in settings
+    """
+    global _file_cache
+
+    if _file_cache is None:
+        _file_cache = FileCache()
+
+    return _file_cache
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Configuration read from '.ini' files on first use.
+
+Importing meteocheck does not read any file: each configuration object
+reads its file from the Current Working Directory where meteocheck is
+invoked (or from an explicit path) the first time one of its values is
+used. Values can also be set before, e.g. in scripts or tests, and they
+are kept when the file is read.
+"""
+import abc
+import configparser
+import os
+from pathlib import Path
+
+
+class LazyConfig(abc.ABC):
+    """
+    Values of a section of an '.ini' file, read the first time one is used.
+
+    Subclasses define FILE_NAME, SECTION and _values(section), that returns
+    the dict of values of the section.
+
+    Parameters
+    ----------
+    file_path : Path, optional
+        The '.ini' file. Defaults to FILE_NAME in the Current Working Directory
+    """
+    FILE_NAME = None
+    SECTION = None
+
+    def __init__(self, file_path=None):
+        self.__dict__['file_path'] = file_path
+        self.__dict__['_read_names'] = None
+
+    def __getattr__(self, name):
+        # only called for values that are not set yet
+        if name.startswith('_') or self._read_names is not None:
+            raise AttributeError(name)
+
+        self.load()
+
+        try:
+            return self.__dict__[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        self.__dict__[name] = value
+
+        if self._read_names is not None and name in self._read_names:
+            self._read_names.remove(name) # set by hand
+
+    def load(self):
+        """
+        Reads the file. Values already set are kept
+        """
+        file_path = self.file_path
+        if file_path is None:
+            file_path = Path(os.getcwd(), self.FILE_NAME)
+
+        if not Path(file_path).is_file():
+            raise FileNotFoundError("Configuration file '{}' not found".format(file_path))
+
+        config = configparser.ConfigParser(interpolation=None, inline_comment_prefixes='#')
+        config.read(str(file_path))
+
+        values = self._values(config[self.SECTION])
+
+        self.__dict__['_read_names'] = [name for name in values if name not in self.__dict__]
+        for name in self._read_names:
+            self.__dict__[name] = values[name]
+
+    def reload(self):
+        """
+        Reads the file again, e.g. if it has changed. Values set by hand are kept
+        """
+        for name in self._read_names or []:
+            del self.__dict__[name]
+        self.__dict__['_read_names'] = None
+
+        self.load()
+
+    @abc.abstractmethod
+    def _values(self, section):
+        pass
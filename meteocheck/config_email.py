@@ -9,38 +9,129 @@ import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.image import MIMEImage
-import configparser
-import os
-from pathlib import Path
-import keyring
 
-# Configuration files
-config = configparser.ConfigParser(interpolation=None, inline_comment_prefixes='#')
+from meteocheck.config import LazyConfig
 
-working_path = os.getcwd() # tries to read config file from the Current Working Directory where meteocheck is invoked
-config.read(str(Path(working_path, 'meteocheck_email.ini')))
 
-IS_SENDING_EMAIL = config.getboolean('email_configuration', 'IS_SENDING_EMAIL')
-RECIPIENTS_EMAIL = config.get('email_configuration', 'RECIPIENTS_EMAIL').split(',') # It can be a list of several
-SENDER_EMAIL = config.get('email_configuration', 'SENDER_EMAIL')
-SMTP_SERVER = config.get('email_configuration', 'SMTP_SERVER')
-SMTP_PORT = config.getint('email_configuration', 'SMTP_PORT')
-LOGIN_EMAIL = config.get('email_configuration', 'LOGIN_EMAIL')
-PASSWORD_EMAIL = keyring.get_password("Email", SENDER_EMAIL) # password should be added previously in the "Windows Credential Locker" using the command in CLI: "keyring set Email 'email address'"
+class EmailConfig(LazyConfig):
+    """
+    Email configuration, from 'meteocheck_email.ini':
+        - IS_SENDING_EMAIL
+        - RECIPIENTS_EMAIL: list of addresses
+        - SENDER_EMAIL, SMTP_SERVER, SMTP_PORT, LOGIN_EMAIL
+
+    The password is not in the file: it is queried to keyring only when an
+    email is sent (see password())
+    """
+    FILE_NAME = 'meteocheck_email.ini'
+    SECTION = 'email_configuration'
+
+    def _values(self, section):
+        return {'IS_SENDING_EMAIL': section.getboolean('IS_SENDING_EMAIL'),
+                'RECIPIENTS_EMAIL': section.get('RECIPIENTS_EMAIL').split(','), # It can be a list of several
+                'SENDER_EMAIL': section.get('SENDER_EMAIL'),
+                'SMTP_SERVER': section.get('SMTP_SERVER'),
+                'SMTP_PORT': section.getint('SMTP_PORT'),
+                'LOGIN_EMAIL': section.get('LOGIN_EMAIL')}
+
+    def password(self):
+        # password should be added previously in the "Windows Credential Locker" using the command in CLI: "keyring set Email 'email address'"
+        import keyring
+
+        return keyring.get_password("Email", self.SENDER_EMAIL)
+
+
+# Read on first use (see config.py)
+email_config = EmailConfig()
+
+# Default of the arguments taken from 'email_config'
+FROM_CONFIG = object()
+
+
+def __getattr__(name):
+    # Values of older versions, e.g. 'config_email.IS_SENDING_EMAIL'
+    if name in ('IS_SENDING_EMAIL', 'RECIPIENTS_EMAIL', 'SENDER_EMAIL', 'SMTP_SERVER', 'SMTP_PORT', 'LOGIN_EMAIL'):
+        return getattr(email_config, name)
+    if name == 'PASSWORD_EMAIL':
+        return email_config.password()
+    raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+
+
+def from_config(value, name):
+    """
+    Returns the value 'name' of email_config if 'value' is FROM_CONFIG
+    """
+    if value is FROM_CONFIG:
+        return getattr(email_config, name)
+    return value
+
+
+def build_message(body, subject, figures, receivers=FROM_CONFIG, sender=FROM_CONFIG):
+    """
+    Returns the email (MIMEMultipart) with an html 'body' and the PNG
+    'figures', a list of (Content-ID, bytes) shown after it
+    """
+    receivers = from_config(receivers, 'RECIPIENTS_EMAIL')
+    sender = from_config(sender, 'SENDER_EMAIL')
+
+    msg = MIMEMultipart()
+    msg['To'] = ', '.join(receivers)
+    msg['From'] = sender
+    msg['Subject'] = subject
+
+    msgText = MIMEText(body, 'html')
+    msg.attach(msgText)
+
+    for index, png in figures:
+        msgText = MIMEText(
+            '<br><img src="cid:{}"><br>'.format(index), 'html')
+        msg.attach(msgText)   # Added, and edited the previous line
+
+        img = MIMEImage(png)
+
+        img.add_header('Content-ID', '<{}>'.format(index))
+        msg.attach(img)
+
+    return msg
+
+
+def connect_smtp(smtp_server=FROM_CONFIG, smtp_port=FROM_CONFIG, login=FROM_CONFIG,
+                 password=FROM_CONFIG, use_starttls=True):
+    """
+    Returns an open smtplib.SMTP connection, authenticated if 'login' is not None.
+    Local test servers (e.g. 'python -m aiosmtpd -n') need use_starttls=False and login=None
+    """
+    smtp_server = from_config(smtp_server, 'SMTP_SERVER')
+    smtp_port = from_config(smtp_port, 'SMTP_PORT')
+    login = from_config(login, 'LOGIN_EMAIL')
+
+    smtp = smtplib.SMTP(smtp_server, smtp_port)
+    smtp.ehlo()
+    if use_starttls:
+        smtp.starttls()
+        smtp.ehlo()
+
+    if login is not None:
+        if password is FROM_CONFIG:
+            password = email_config.password()
+        smtp.login(login, password)
+
+    return smtp
 
 
 def send_email(
                 body,
                 subject,
                 list_figures,
-                receivers=RECIPIENTS_EMAIL,
-                sender=SENDER_EMAIL,
-                smtp_server=SMTP_SERVER,
-                smtp_port=SMTP_PORT,
-                login=LOGIN_EMAIL,
-                password=PASSWORD_EMAIL):
+                receivers=FROM_CONFIG,
+                sender=FROM_CONFIG,
+                smtp_server=FROM_CONFIG,
+                smtp_port=FROM_CONFIG,
+                login=FROM_CONFIG,
+                password=FROM_CONFIG):
     """
-    Sends an email with the log content.
+    Sends an email with the log content, in its own connection. See
+    email_dispatcher.py to send it in the background.
 
     Parameters
     ----------
@@ -48,44 +139,29 @@ def send_email(
         Email body text
     subject : String
         Email subject text
+    list_figures : iterable
+        (index, io.BytesIO or None) of the figures
     receivers : list
         list of email addresses (Strings)
     sender : String
-        Path of the analyzed file
-    figure : plt.figure()
-        MPL's figure describing the error
+        Email address of the sender
+
+    Arguments not given (FROM_CONFIG) are taken from 'email_config'.
 
     Returns
     -------
     None
     """
-    msg = MIMEMultipart()
-    msg['To'] = ', '.join(receivers)
-    msg['From'] = sender
-    msg['Subject'] = subject
+    receivers = from_config(receivers, 'RECIPIENTS_EMAIL')
+    sender = from_config(sender, 'SENDER_EMAIL')
 
-    msgText = MIMEText(body, 'html')
-    msg.attach(msgText)
-
-    for index, buffer in list_figures:
-        if buffer is not None:
-            msgText = MIMEText(
-                '<br><img src="cid:{}"><br>'.format(index), 'html')
-            msg.attach(msgText)   # Added, and edited the previous line
-
-            img = MIMEImage(buffer.read())
+    figures = [(index, buffer.read()) for index, buffer in list_figures if buffer is not None]
 
-            img.add_header('Content-ID', '<{}>'.format(index))
-            msg.attach(img)
-
-#    msg.as_string()
-    # Send the message via local SMTP server.
-    smtp = smtplib.SMTP(smtp_server, smtp_port)
-    smtp.ehlo()
-    smtp.starttls()
+    msg = build_message(body, subject, figures, receivers=receivers, sender=sender)
 
-    smtp.login(login, password)
+    # Send the message via SMTP server.
+    smtp = connect_smtp(smtp_server, smtp_port, login, password)
     # sendmail function takes 3 arguments: sender's address, recipient's address
     # and message to send - here it is sent as one string.
     smtp.sendmail(sender, receivers, msg.as_string())
-    smtp.quit()
\ No newline at end of file
+    smtp.quit()
@@ -4,69 +4,441 @@ Created on Fri Jan 13 17:39:10 2017
 
 @author: Ruben
 """
-import configparser
 from pathlib import Path
 import datetime as dt
+import hashlib
+import io
 import os
+import re
 
+import numpy as np
 import pandas as pd
 
+import meteocheck.cache as mc_cache
+from meteocheck.config import LazyConfig
+from meteocheck.settings import IS_CACHING_FILES
+
 # List of supported meteo stations.
 # It affects 'open_meteo_file()' to automate file opening
 SUPPORTED_STATIONS = ['helios', 'geonica', 'meteo']
 
-config = configparser.ConfigParser(interpolation=None, inline_comment_prefixes='#')
+# Names of the daily files of each supported station (datetime.strftime format)
+FILE_NAME_FORMATS = {
+    'helios': 'data%Y_%m_%d.txt',
+    'geonica': 'geonica%Y_%m_%d.txt',
+    'meteo': 'meteo%Y_%m_%d.txt',
+}
+
+# Schema of the files of each supported station, used by read_meteo_file():
+#   - 'date_columns': columns with the date and time, joined with a space
+#   - 'index_name': name of the resulting DatetimeIndex
+#   - 'usecols': data columns to read, all of them float64. None reads every column
+STATION_SCHEMAS = {
+    'helios': {'date_columns': ['yyyy/mm/dd', 'hh:mm'],
+               'index_name': 'yyyy/mm/dd_hh:mm',
+               'usecols': ['G(0)', 'G(41)', 'D(0)', 'B', 'Wvel', 'Wdir', 'Tamb']},
+    'geonica': {'date_columns': ['yyyy/mm/dd', 'hh:mm'],
+                'index_name': 'yyyy/mm/dd_hh:mm',
+                'usecols': None},
+    'meteo': {'date_columns': [0],
+              'index_name': None, # name of the first column
+              'usecols': None},
+}
+
+
+class StationsConfig(LazyConfig):
+    """
+    Paths of the files of the supported meteo stations, from
+    'meteocheck_meteo_stations.ini':
+        - UNIT: root of the paths
+        - DATA_PATH_HELIOS, DATA_PATH_GEONICA, DATA_PATH_METEO
+    """
+    FILE_NAME = 'meteocheck_meteo_stations.ini'
+    SECTION = 'stations_configuration'
+
+    def _values(self, section):
+        unit = section.get('UNIT')
+
+        return {'UNIT': unit,
+                'DATA_PATH_HELIOS': Path(unit, section.get('PATH_HELIOS')),
+                'DATA_PATH_GEONICA': Path(unit, section.get('PATH_GEONICA')),
+                'DATA_PATH_METEO': Path(unit, section.get('PATH_METEO'))}
+
 
-working_path = os.getcwd() # tries to read config file from the Current Working Directory where meteocheck is invoked
-config.read(str(Path(working_path, 'meteocheck_meteo_stations.ini')))
+# Read on first use (see config.py)
+stations_config = StationsConfig()
 
-UNIT = config.get('stations_configuration', 'UNIT')
 
-DATA_PATH_HELIOS = Path(UNIT, config.get('stations_configuration', 'PATH_HELIOS'))
-DATA_PATH_GEONICA = Path(UNIT, config.get('stations_configuration', 'PATH_GEONICA'))
-DATA_PATH_METEO = Path(UNIT, config.get('stations_configuration', 'PATH_METEO'))
+def __getattr__(name):
+    # Values of older versions, e.g. 'config_meteo_stations.DATA_PATH_HELIOS'
+    if name in ('UNIT', 'DATA_PATH_HELIOS', 'DATA_PATH_GEONICA', 'DATA_PATH_METEO'):
+        return getattr(stations_config, name)
+    raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
 
-def open_meteo_file(date, type_data_station):
+
+def data_path(type_data_station):
     """
-    Tries to automatically open a meteo file of the supported meteo stations.
-    Extended it to support extra types.
+    Directory of the files of a supported meteo station
     """
     if type_data_station == 'helios':
-        file_name = 'data' + dt.datetime.strftime(date, '%Y_%m_%d') + '.txt'
+        return stations_config.DATA_PATH_HELIOS
+    elif type_data_station == 'geonica':
+        return stations_config.DATA_PATH_GEONICA
+    elif type_data_station == 'meteo':
+        return stations_config.DATA_PATH_METEO
+
+    raise ValueError("The 'type_data_station'='{}' is not supported".format(type_data_station))
+
+
+def meteo_file_path(date, type_data_station):
+    """
+    Returns the path of the file of a supported meteo station for a given date.
+    Files of the current year are in the main directory of the station.
+    """
+    if type_data_station == 'helios':
+        file_name = dt.datetime.strftime(date, FILE_NAME_FORMATS['helios'])
     
         if date.year == dt.date.today().year:
-            file_path = DATA_PATH_HELIOS.joinpath(Path(file_name))
+            file_path = stations_config.DATA_PATH_HELIOS.joinpath(Path(file_name))
         else:
-            file_path = DATA_PATH_HELIOS.joinpath(
+            file_path = stations_config.DATA_PATH_HELIOS.joinpath(
                 Path('Data' + str(date.year), file_name))
-        
-        df = pd.read_csv(file_path, parse_dates=[
-                              ['yyyy/mm/dd', 'hh:mm']], index_col=0, delimiter='\t')
-        
-        # only takes valuable variables
-        df = df[['G(0)', 'G(41)', 'D(0)', 'B', 'Wvel', 'Wdir', 'Tamb']]
     
     elif type_data_station == 'geonica':
-        file_name = 'geonica' +  dt.datetime.strftime(date, '%Y_%m_%d') + '.txt'
+        file_name = dt.datetime.strftime(date, FILE_NAME_FORMATS['geonica'])
         
         if date.year == dt.date.today().year:
-            file_path = DATA_PATH_GEONICA.joinpath(Path(file_name))
+            file_path = stations_config.DATA_PATH_GEONICA.joinpath(Path(file_name))
         else:
-            file_path = DATA_PATH_GEONICA.joinpath(
+            file_path = stations_config.DATA_PATH_GEONICA.joinpath(
                 Path(str(date.year), file_name))
-
-        df = pd.read_csv(file_path, parse_dates=[
-                                  ['yyyy/mm/dd', 'hh:mm']], index_col=0, delimiter='\t')
                                   
     elif type_data_station == 'meteo':
-        file_name = 'meteo' +  dt.datetime.strftime(date, '%Y_%m_%d') + '.txt'
+        file_name = dt.datetime.strftime(date, FILE_NAME_FORMATS['meteo'])
         
         if date.year == dt.date.today().year:
-            file_path = DATA_PATH_METEO.joinpath(Path(file_name))
+            file_path = stations_config.DATA_PATH_METEO.joinpath(Path(file_name))
         else:
-            file_path = DATA_PATH_METEO.joinpath(
+            file_path = stations_config.DATA_PATH_METEO.joinpath(
                 Path(str(date.year), file_name))
 
+    else:
+        raise ValueError("The 'type_data_station'='{}' is not supported".format(type_data_station))
+
+    return file_path
+
+
+def meteo_file_date(file_path, type_data_station):
+    """
+    Date of a file of a supported meteo station from its name. None if the
+    name is not the one of a daily file of the station
+    """
+    try:
+        return dt.datetime.strptime(Path(file_path).name, FILE_NAME_FORMATS[type_data_station]).date()
+    except ValueError:
+        return None
+
+
+def read_meteo_file(file_path, type_data_station):
+    """
+    Parses a file of a supported meteo station.
+
+    The fast path reads only the columns of STATION_SCHEMAS with explicit
+    float64 dtypes in pandas' C engine, and builds the timestamps from their
+    integer components. Files that do not follow the schema are read with the
+    generic (slower) parser.
+
+    'file_path' can also be a binary file-like object with the header and
+    some lines of a file, e.g. the lines appended to it (see live.py).
+    """
+    if type_data_station not in STATION_SCHEMAS:
+        raise ValueError("The 'type_data_station'='{}' is not supported".format(type_data_station))
+
+    try:
+        return _read_meteo_file_schema(file_path, STATION_SCHEMAS[type_data_station])
+    except (ValueError, KeyError, IndexError):
+        if hasattr(file_path, 'seek'):
+            file_path.seek(0)
+        return _read_meteo_file_generic(file_path, type_data_station)
+
+
+def _read_header(file_path):
+
+    if hasattr(file_path, 'read'):
+        header = file_path.readline().decode()
+        file_path.seek(0)
+    else:
+        with open(file_path) as file_meteo:
+            header = file_meteo.readline()
+
+    return header.rstrip('\r\n').split('\t')
+
+
+def _read_meteo_file_schema(file_path, schema):
+
+    header = _read_header(file_path)
+
+    date_columns = [header[column] if isinstance(column, int) else column
+                    for column in schema['date_columns']]
+    if schema['usecols'] is None:
+        data_columns = [column for column in header if column not in date_columns]
+    else:
+        data_columns = schema['usecols']
+
+    try: # pyarrow's CSV reader is optional, but much faster
+        import pyarrow
+        import pyarrow.csv as pa_csv
+    except ImportError:
+        pa_csv = None
+
+    if pa_csv is not None:
+        column_types = {column: pyarrow.binary() for column in date_columns}
+        column_types.update({column: pyarrow.float64() for column in data_columns})
+
+        table = pa_csv.read_csv(
+            file_path,
+            parse_options=pa_csv.ParseOptions(delimiter='\t'),
+            convert_options=pa_csv.ConvertOptions(include_columns=date_columns + data_columns,
+                                                  column_types=column_types))
+
+        chars = [_chars_from_arrow(table.column(column)) for column in date_columns]
+        df = table.select(data_columns).to_pandas()
+
+    else:
+        dtype = {column: str for column in date_columns}
+        dtype.update({column: np.float64 for column in data_columns})
+
+        df = pd.read_csv(file_path, delimiter='\t', usecols=date_columns + data_columns,
+                         dtype=dtype, engine='c')
+
+        # pop() keeps the block of float64 columns without copying it
+        chars = [_chars_from_strings(df.pop(column).to_numpy(dtype='S')) for column in date_columns]
+
+        if list(df.columns) != data_columns:
+            df = df[data_columns]
+
+    index_name = schema['index_name']
+    if index_name is None:
+        index_name = date_columns[0]
+
+    df.index = pd.DatetimeIndex(_datetime_from_chars(chars), name=index_name)
+
+    return df
+
+
+def _read_meteo_file_generic(file_path, type_data_station):
+
+    if type_data_station == 'helios':
+        df = pd.read_csv(file_path, parse_dates=[
+                              ['yyyy/mm/dd', 'hh:mm']], index_col=0, delimiter='\t')
+        
+        # only takes valuable variables
+        df = df[['G(0)', 'G(41)', 'D(0)', 'B', 'Wvel', 'Wdir', 'Tamb']]
+    
+    elif type_data_station == 'geonica':
+        df = pd.read_csv(file_path, parse_dates=[
+                                  ['yyyy/mm/dd', 'hh:mm']], index_col=0, delimiter='\t')
+                                  
+    elif type_data_station == 'meteo':
         df = pd.read_csv(file_path, parse_dates=[0], index_col=0, delimiter='\t')
     
-    return df, file_path
\ No newline at end of file
+    return df
+
+
+# Digits of year, month, day, hour, minute and optionally second, in this order,
+# with any non-digit separators. E.g. '2019/06/01 12:30' or '2019-06-01T12:30:00'
+_DATETIME_LAYOUT = re.compile(rb'^(\d{4})\D(\d{2})\D(\d{2})\D(\d{2})\D(\d{2})(?:\D(\d{2}))?$')
+
+
+def datetime_from_strings(*moments):
+    """
+    Converts fixed-width strings of dates to numpy.datetime64[ns] from their
+    integer components, without parsing each string.
+
+    Several arrays (e.g. date and time columns) are joined with a space. The
+    layout is taken from the first element (see _DATETIME_LAYOUT) and every
+    element must share it, otherwise a ValueError is raised.
+
+    Parameters
+    ----------
+    *moments : numpy.array of bytes (dtype 'S') or str
+
+    Returns
+    -------
+    numpy.array of datetime64[ns]
+    """
+    chars = []
+    for moments_column in moments:
+        moments_column = np.asarray(moments_column)
+        if moments_column.dtype.kind != 'S':
+            moments_column = np.char.encode(moments_column.astype(str), 'ascii')
+        chars.append(_chars_from_strings(moments_column))
+
+    return _datetime_from_chars(chars)
+
+
+def _chars_from_strings(moments):
+    """
+    Matrix of characters (uint8), one row per element of an array of bytes.
+    Shorter elements are padded with zeros, that are rejected later.
+    """
+    return moments.view(np.uint8).reshape(len(moments), moments.dtype.itemsize)
+
+
+def _chars_from_arrow(column):
+    """
+    Matrix of characters (uint8) of a pyarrow binary column, without copying
+    if every element has the same length.
+    """
+    array = column.combine_chunks() if column.num_chunks != 1 else column.chunk(0)
+
+    if array.null_count > 0:
+        raise ValueError('Null dates')
+
+    _, offsets, data = array.buffers()
+    offsets = np.frombuffer(offsets, dtype=np.int32)[array.offset:array.offset + len(array) + 1]
+    data = np.frombuffer(data, dtype=np.uint8) if data is not None else np.zeros(0, dtype=np.uint8)
+
+    widths = np.diff(offsets)
+    if len(widths) == 0:
+        return np.zeros((0, 0), dtype=np.uint8)
+    if (widths != widths[0]).any():
+        raise ValueError('Dates with different layouts')
+
+    return data[offsets[0]:offsets[-1]].reshape(len(array), widths[0])
+
+
+def _datetime_from_chars(chars):
+    """
+    numpy.datetime64[ns] from matrices of characters, joined with a space
+    """
+    num_moments = len(chars[0])
+    if num_moments == 0:
+        return np.array([], dtype='datetime64[ns]')
+
+    separator = np.full((num_moments, 1), ord(' '), dtype=np.uint8)
+    chars = np.hstack([part for chars_column in chars for part in (separator, chars_column)][1:])
+
+    match = _DATETIME_LAYOUT.match(chars[0].tobytes())
+    if match is None:
+        raise ValueError('Unknown layout of dates: {}'.format(chars[0].tobytes()))
+
+    positions_digits = [position for group in range(1, 7) if match.group(group) is not None
+                        for position in range(match.start(group), match.end(group))]
+    positions_separators = [position for position in range(chars.shape[1]) if position not in positions_digits]
+
+    digits = chars[:, positions_digits].astype(np.int64) - ord('0')
+
+    # every element must have digits and the same separators in the same positions
+    if (((digits < 0) | (digits > 9)).any() or
+            (chars[:, positions_separators] != chars[0, positions_separators]).any()):
+        raise ValueError('Dates with different layouts')
+
+    components = []
+    first_digit = 0
+    for group in range(1, 7):
+        if match.group(group) is None:
+            components.append(0)
+            continue
+        value = 0
+        for position in range(first_digit, first_digit + len(match.group(group))):
+            value = value * 10 + digits[:, position]
+        components.append(value)
+        first_digit += len(match.group(group))
+
+    year, month, day, hour, minute, second = components
+
+    if ((month < 1) | (month > 12) | (day < 1) | (day > 31) | (hour > 23) |
+            (minute > 59) | (second > 59)).any():
+        raise ValueError('Dates out of range')
+
+    months = ((year - 1970).astype('datetime64[Y]').astype('datetime64[M]') +
+              (month - 1).astype('timedelta64[M]'))
+    days = months.astype('datetime64[D]') + (day - 1).astype('timedelta64[D]')
+
+    # e.g. 2019/02/30 would be moved to March. The generic parser keeps it as a wrong date
+    if (days.astype('datetime64[M]') != months).any():
+        raise ValueError('Days out of the month')
+
+    seconds = hour * 3600 + minute * 60 + second
+
+    return days.astype('datetime64[ns]') + np.asarray(seconds).astype('timedelta64[s]')
+
+
+def cache_version(type_data_station):
+    """
+    Version of the parsing of the files of 'type_data_station' in the cache:
+    a hash of its schema (STATION_SCHEMAS), so the entries parsed with another
+    schema are not read (see cache.FileCache.get())
+    """
+    schema = STATION_SCHEMAS.get(type_data_station)
+    return hashlib.sha1(repr((type_data_station, schema)).encode('utf-8')).hexdigest()
+
+
+def fetch_meteo_file(date, type_data_station, use_cache=IS_CACHING_FILES):
+    """
+    Reads a meteo file of the supported meteo stations without parsing it,
+    e.g. in advance (see prefetch.py), for open_meteo_file().
+
+    Returns
+    -------
+    file_path : Path
+    df : pandas.DataFrame
+        The file parsed, if it is in the cache. Otherwise None
+    content : bytes or OSError
+        The content of the file if it is not in the cache, or the error
+        reading it
+    signature : tuple
+        Key of the content in the cache (see cache.FileCache.signature()),
+        taken before reading it. None if it is not read
+    """
+    file_path = meteo_file_path(date, type_data_station)
+
+    try:
+        if use_cache:
+            df = mc_cache.get_file_cache().get(file_path, version=cache_version(type_data_station))
+            if df is not None:
+                return file_path, df, None, None
+
+        with open(file_path, 'rb') as file_meteo:
+            # the content may be parsed and cached much later, while the file grows
+            stat = os.fstat(file_meteo.fileno())
+            return file_path, None, file_meteo.read(), (stat.st_mtime_ns, stat.st_size)
+    except OSError as e:
+        return file_path, None, e, None
+
+
+def open_meteo_file(date, type_data_station, use_cache=IS_CACHING_FILES, fetched=None):
+    """
+    Tries to automatically open a meteo file of the supported meteo stations.
+    Extended it to support extra types.
+
+    If 'use_cache', parsed files are kept in the on-disk cache (see cache.py)
+    and only parsed again if they change.
+
+    'fetched' is the result of fetch_meteo_file() for the same file, if it
+    was already read.
+    """
+    if fetched is None:
+        file_path = meteo_file_path(date, type_data_station)
+
+        df, content, signature = None, None, None
+        if use_cache:
+            df = mc_cache.get_file_cache().get(file_path, version=cache_version(type_data_station))
+    else:
+        file_path, df, content, signature = fetched
+        if isinstance(content, OSError):
+            raise content
+
+    if df is None:
+        # before reading, as the file may be growing (see cache.FileCache.put())
+        if use_cache and content is None:
+            signature = mc_cache.FileCache.signature(file_path)
+
+        df = read_meteo_file(file_path if content is None else io.BytesIO(content), type_data_station)
+
+        if use_cache:
+            mc_cache.get_file_cache().put(file_path, df, signature=signature,
+                                          version=cache_version(type_data_station))
+    
+    return df, file_path
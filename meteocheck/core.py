@@ -4,37 +4,171 @@ Created on Fri Sep  2 10:35:37 2016
 
 @author: ruben
 """
-import io
 import datetime as dt
+import functools
 import os
+import threading
+import time
 from pathlib import Path
-import inspect
 
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 
 #from meteocheck.solar_functions import (solpos, num_radiation_transitions,
 #                                        daily_irradiation)
 import meteocheck.solar_functions as mc_solar
+import meteocheck.figures as mc_fig
+import meteocheck.flags as mc_flags
 import meteocheck.config_meteo_stations as mc_meteo
 import meteocheck.config_email as mc_email
+import meteocheck.email_dispatcher as mc_dispatcher
+import meteocheck.history as mc_history
 from meteocheck.settings import (MINIMUM_ERROR_LEVEL_TO_SEND_EMAIL, FILENAME_SESSION_LOG,
-                                 FILENAME_HISTORY_LOG, NUM_RADIATION_TRANSITIONS_THRESHOLD,
+                                 FILENAME_SESSION_PROFILE, NUM_RADIATION_TRANSITIONS_THRESHOLD,
                                  DNI_RADIATION_THRESHOLD, GHI_RADIATION_THRESHOLD,
                                  DAILY_IRRADIATION_THRESHOLD, DRADIATION_DT,
-                                 NUM_VALLEYS_THRESHOLD)
+                                 NUM_VALLEYS_THRESHOLD, IS_PRINTING_LOG, MAX_MESSAGE_VALUES,
+                                 MAX_ERROR_MESSAGE_LENGTH)
 
 #%% Log object
-log = pd.DataFrame(
-    columns=[
-        'time_stamp',
-        'error_level',
-        'type_data_station',
-        'check_type',
-        'error_message',
-        'file',
-        'figure'])
+LOG_COLUMNS = [
+    'time_stamp',
+    'error_level',
+    'type_data_station',
+    'check_type',
+    'error_message',
+    'file',
+    'figure']
+
+# Ordered levels. Their position is the code stored in the log
+ERROR_LEVELS = ['INFO', 'WARNING', 'ERROR', 'CRITICAL']
+_ERROR_LEVEL_CODES = {level: code for code, level in enumerate(ERROR_LEVELS)}
+
+
+class LogBuffer:
+    """
+    Append-only log of incidences.
+
+    Lines are stored as tuples with the error level interned as an integer
+    code, so adding a line does not copy previous ones. The pandas.DataFrame
+    is only built when it is requested, and kept until a new line is added.
+    """
+
+    def __init__(self):
+        self._lines = []
+        self._max_level_code = -1
+        self._frame = None
+
+    def __len__(self):
+        return len(self._lines)
+
+    def append(self, error_level, check_type=None, error_message=None,
+               type_data_station=None, file_path=None, figure=None):
+
+        try:
+            level_code = _ERROR_LEVEL_CODES[error_level]
+        except KeyError:
+            raise ValueError("Unknown error_level '{}'. It should be one of {}".format(error_level, ERROR_LEVELS))
+
+        line = (dt.datetime.now(), level_code, str(type_data_station), check_type,
+                error_message, file_path, figure)
+
+        self._lines.append(line)
+        self._max_level_code = max(self._max_level_code, level_code)
+        self._frame = None
+
+        return line
+
+    def lines(self):
+        """
+        Returns the raw lines (tuples), e.g. to merge them in another log
+        """
+        return list(self._lines)
+
+    def extend(self, lines):
+        """
+        Adds raw lines from another log
+        """
+        for line in lines:
+            self._lines.append(line)
+            self._max_level_code = max(self._max_level_code, line[1])
+        self._frame = None
+
+    def clear(self):
+        # the rendered figures are not needed anymore (see figures.py)
+        mc_fig.discard_figures(line[6] for line in self._lines)
+
+        self._lines = []
+        self._max_level_code = -1
+        self._frame = None
+
+    def max_error_level(self):
+        """
+        Highest error level logged, or None if the log is empty
+        """
+        if self._max_level_code < 0:
+            return None
+        return ERROR_LEVELS[self._max_level_code]
+
+    def is_error_level_reached(self, error_level):
+        return self._max_level_code >= _ERROR_LEVEL_CODES[error_level]
+
+    def to_frame(self):
+        """
+        Returns the log as a pandas.DataFrame with an ordered 'Categorical' error_level
+        """
+        if self._frame is None:
+            frame = pd.DataFrame.from_records(self._lines, columns=LOG_COLUMNS)
+
+            frame['time_stamp'] = [moment.strftime('%Y-%m-%d %X.%f')[:-5] for moment in frame['time_stamp']]
+            # sets 'Catergorial' type so it can be ordered
+            frame['error_level'] = pd.Categorical.from_codes(
+                frame['error_level'].astype(np.int64), categories=ERROR_LEVELS, ordered=True)
+
+            self._frame = frame
+
+        return self._frame
+
+    def to_html(self, **kwargs):
+        return self.to_frame().to_html(**kwargs)
+
+    def rendered_figures(self):
+        """
+        Returns [(index, io.BytesIO)] with the figure of every line, rendering
+        FigureSpec's at this moment. Lines without figure give None, as do
+        figures that cannot be rendered, which are logged as ERROR
+        """
+        figures, errors = [], []
+
+        for index, line in enumerate(self._lines):
+            try:
+                figures.append((index, mc_fig.render_figure(line[6])))
+            except Exception as e:
+                figures.append((index, None))
+                errors.append((line, e))
+
+        for line, e in errors:
+            add_line_log('ERROR', check_type=line[3], error_message='Figure not rendered: {!r}'.format(e),
+                         type_data_station=line[2], file_path=line[5])
+
+        return figures
+
+
+def print_line_log(line):
+    """
+    Log sink that prints each new line
+    """
+    new_line = pd.Series(dict(zip(LOG_COLUMNS, line)))
+    new_line['time_stamp'] = line[0].strftime('%Y-%m-%d %X.%f')[:-5]
+    new_line['error_level'] = ERROR_LEVELS[line[1]]
+
+    print(new_line.to_frame())
+
+
+log = LogBuffer()
+
+# Functions called with every new line of the log, e.g. print_line_log()
+log_sinks = [print_line_log] if IS_PRINTING_LOG else []
 
 
 def add_line_log(error_level,
@@ -61,71 +195,218 @@ def add_line_log(error_level,
             - User defined. Requires a pandas.Dataframe previously read/created.
     file_path : Path
         Path of the analyzed file
-    figure : plt.figure()
-        MPL's figure describing the error
+    figure : figures.FigureSpec or io.BytesIO
+        Figure describing the error. FigureSpec is rendered only when needed
 
     Returns
     -------
     None
     """
-    new_line = pd.Series({'time_stamp': pd.Timestamp.now().strftime('%Y-%m-%d %X.%f')[:-5],
-                          'error_level': error_level,
-                          'type_data_station': str(type_data_station),
-                          'check_type': check_type,
-                          'error_message': error_message,
-                          'file': file_path,
-                          'figure': figure})
-
-    global log
-    log = log.append(new_line, ignore_index=True)
-
-    # sets 'Catergorial' type so it can be ordered
-    log['error_level'] = pd.Categorical(log['error_level'],
-                            categories=[
-                                'INFO',
-                                'WARNING',
-                                'ERROR',
-                                'CRITICAL'],
-                            ordered=True)
-    
-    print(new_line.to_frame())
+    line = log.append(error_level, check_type=check_type, error_message=error_message,
+                      type_data_station=type_data_station, file_path=file_path, figure=figure)
+
+    for sink in log_sinks:
+        sink(line)
+
+
+def format_values(series, max_values=MAX_MESSAGE_VALUES):
+    """
+    'List of values' of the error messages: the first 'max_values' samples
+    of 'series' separated by ' - '. Only these samples are formatted
+    """
+    text = series.iloc[:max_values].to_string().replace('\n', ' - ')
+
+    if len(series) > max_values:
+        text += ' - ... ({} more)'.format(len(series) - max_values)
 
-def finish_log():
-    global log
+    return text
 
+
+#%% Profiling of checks
+PROFILE_COLUMNS = [
+    'time_stamp',
+    'type_data_station',
+    'check_type',
+    'file',
+    'wall_time',
+    'cpu_time',
+    'rows',
+    'flagged',
+    'depth']
+
+
+class ProfileTable:
+    """
+    Append-only table with one line per invocation of a check: wall and CPU
+    time [s], rows of the checked frame and number of flagged samples.
+
+    Checks run inside another check (e.g. the days of an unsorted frame
+    checked one by one by a MultiDayChecking) have depth > 0, and their time and flagged samples
+    are also included in the outer one.
+    """
+
+    def __init__(self):
+        self._lines = []
+
+    def __len__(self):
+        return len(self._lines)
+
+    def append(self, line):
+        self._lines.append(line)
+
+    def lines(self):
+        return list(self._lines)
+
+    def extend(self, lines):
+        self._lines.extend(lines)
+
+    def clear(self):
+        self._lines = []
+
+    def to_frame(self):
+        frame = pd.DataFrame.from_records(self._lines, columns=PROFILE_COLUMNS)
+        frame['time_stamp'] = [moment.strftime('%Y-%m-%d %X.%f')[:-5] for moment in frame['time_stamp']]
+
+        return frame
+
+    def summary(self):
+        """
+        Number of calls and totals of the outermost invocations of each
+        check, the slowest first
+        """
+        frame = self.to_frame()
+        frame = frame[frame['depth'] == 0]
+
+        grouped = frame.groupby('check_type')
+        summary = grouped[['wall_time', 'cpu_time', 'rows', 'flagged']].sum()
+        summary.insert(0, 'calls', grouped.size())
+
+        return summary.sort_values('wall_time', ascending=False)
+
+
+profile = ProfileTable()
+
+# Samples flagged by the checks that are running in each thread, the innermost last
+_running = threading.local()
+
+
+def _flagged_running():
+    try:
+        return _running.flagged
+    except AttributeError:
+        _running.flagged = []
+        return _running.flagged
+
+
+def check(function):
+    """
+    Decorator of the checks of Checking.
+
+    While the check runs, its name is 'self.current_check'. Every invocation
+    is recorded in 'profile', also if it raises. Each check has a bit in the
+    per-sample flags (see flags.py).
+    """
+    name_check = function.__name__
+    mc_flags.register_check(name_check)
+
+    @functools.wraps(function)
+    def wrapper(self, *args, **kwargs):
+        previous_check = getattr(self, 'current_check', None)
+        self.current_check = name_check
+
+        flagged_running = _flagged_running()
+        flagged_running.append(0)
+        start_wall = time.perf_counter()
+        start_cpu = time.thread_time()
+        try:
+            return function(self, *args, **kwargs)
+        finally:
+            wall_time = time.perf_counter() - start_wall
+            cpu_time = time.thread_time() - start_cpu
+
+            num_flagged = flagged_running.pop()
+            if flagged_running:
+                flagged_running[-1] += num_flagged
+
+            self.current_check = previous_check
+
+            profile.append((dt.datetime.now(), str(self.type_data_station), name_check,
+                            getattr(self, 'file_path', None), wall_time, cpu_time,
+                            len(self.df), num_flagged, len(flagged_running)))
+
+    wrapper.check_name = name_check
+
+    return wrapper
+
+
+def count_flagged(num_flagged):
+    """
+    Adds 'num_flagged' samples to the profile of the innermost check running in this thread
+    """
+    flagged_running = _flagged_running()
+    if flagged_running:
+        flagged_running[-1] += int(num_flagged)
+
+
+def registered_checks(cls):
+    """
+    Returns {name: method} of the checks of 'cls' (decorated with check())
+    """
+    return {name: getattr(cls, name) for name in dir(cls)
+            if hasattr(getattr(cls, name), 'check_name')}
+
+
+def finish_log(date=None):
+    """
+    Sends the email (if the log reached MINIMUM_ERROR_LEVEL_TO_SEND_EMAIL) and
+    writes the session log. 'date' is the checked day in the subject of the
+    email, yesterday by default
+    """
     pd.set_option('display.max_colwidth', 1000)
 
+    # the emails of previous sessions dropped in the background
+    mc_dispatcher.log_email_failures()
+
     add_line_log('INFO', error_message='Finishing logging session')
 
-    if (log.error_level >= MINIMUM_ERROR_LEVEL_TO_SEND_EMAIL).any() and mc_email.IS_SENDING_EMAIL:
-        date_yesterday = (
-            dt.datetime.now() -
-            dt.timedelta(
-                days=1)).strftime('%Y-%m-%d')
+    figures = None
+
+    if log.is_error_level_reached(MINIMUM_ERROR_LEVEL_TO_SEND_EMAIL) and mc_email.email_config.IS_SENDING_EMAIL:
+        if date is None:
+            date = dt.datetime.now() - dt.timedelta(days=1)
 
-        mc_email.send_email(
+        # figures are only rendered here, when they are going to be seen.
+        # The email is sent in the background (see email_dispatcher.py)
+        figures = log.rendered_figures()
+        mc_dispatcher.get_email_dispatcher().submit(
             body=log.to_html(),
-            subject='Failure in meteo station : {}'.format(date_yesterday),
-            list_figures=log.figure.iteritems())
+            subject='Failure in meteo station : {}'.format(date.strftime('%Y-%m-%d')),
+            list_figures=figures)
 
-        add_line_log('INFO', error_message='E-mail sent to: {}'.format(mc_email.RECIPIENTS_EMAIL))
+        add_line_log('INFO', error_message='E-mail queued to: {}'.format(mc_email.email_config.RECIPIENTS_EMAIL))
     else:
         add_line_log('INFO', error_message='E-mail not sent')
     
-    if (log.error_level == 'INFO').all():
+    if log.max_error_level() == 'INFO':
         print('\n>> ALL THE LOG ISSUES ARE INFORMATIONAL - NO WARNING EMAIL SHOULD BE SENT')
 
     working_path = os.getcwd() # tries to read config file from the Current Working Directory where meteocheck is invoked
 
-    log.to_csv(str(Path(working_path, FILENAME_SESSION_LOG)), sep='\t', index=False, header=False, mode='w')
-    log.to_csv(str(Path(working_path, FILENAME_HISTORY_LOG)), sep='\t', index=False, header=False, mode='a')
-    
+    log_frame = log.to_frame()
+    log_frame.to_csv(str(Path(working_path, FILENAME_SESSION_LOG)), sep='\t', index=False, header=False, mode='w')
+
+    # only the figures of the email are stored, by reference (see history.py)
+    mc_history.get_history_store().add_session(log.lines(), figures=figures)
+
+    if len(profile) > 0:
+        profile.to_frame().to_csv(str(Path(working_path, FILENAME_SESSION_PROFILE)), sep='\t', index=False, mode='w')
+
     pd.reset_option('display.max_colwidth')
 
 
 class Checking:
 
-    def __init__(self, type_data_station=None, date=None, df=None):
+    def __init__(self, type_data_station=None, date=None, df=None, finish_log_on_error=True, fetched=None):
         self.type_data_station = type_data_station
         self.date = date
         self.df = df
@@ -135,10 +416,16 @@ class Checking:
         self.samples_per_hour = None
         
         self.file_path = None
+
+        # If False, CRITICAL errors raise without finishing the log, e.g. in batch workers
+        self.finish_log_on_error = finish_log_on_error
+
+        # panel.StationPanel of the other sources, if any (see panel.StationPanel.checking())
+        self.panel = None
         
         if self.type_data_station is None:
             add_line_log('CRITICAL', error_message='Undefined type of meteo station', type_data_station=self.type_data_station)
-            finish_log()
+            self._finish_log_on_error()
             raise ValueError("The 'type_data_station' parameter is mandatory")
 
         add_line_log('INFO', error_message="Analyzing meteo data of type '{}' from {}".format(self.type_data_station, self.date), type_data_station=self.type_data_station)
@@ -148,33 +435,201 @@ class Checking:
             try:
                 add_line_log('INFO', error_message='Opening file...', type_data_station=self.type_data_station, file_path=self.file_path)
                 
-                self.df, self.file_path = mc_meteo.open_meteo_file(self.date, self.type_data_station)
+                # the file may be already read (see config_meteo_stations.fetch_meteo_file())
+                self.df, self.file_path = mc_meteo.open_meteo_file(self.date, self.type_data_station,
+                                                                   fetched=fetched)
     
             except OSError as e:
                 add_line_log('CRITICAL', error_message=e, type_data_station=self.type_data_station, file_path=self.file_path)
-                finish_log()
+                self._finish_log_on_error()
                 raise OSError('The file of type={} of {} cannot be opened'.format(self.type_data_station, self.date), self.file_path)
         # open_meteo_file() fills self.df If it was not read or supported, is an error!
         elif self.df is None or not isinstance(self.df, pd.DataFrame):
             add_line_log('CRITICAL', error_message='No dataframe given for unsupported type of meteo station', type_data_station=self.type_data_station)
-            finish_log()
+            self._finish_log_on_error()
             raise ValueError("The 'type_data_station'='{}' is not supported, therefore a "
                              "Pandas 'df' with meteo data is mandatory".format(self.type_data_station))
-        # 'self.samples_per_hour' should be obtained for some assertions.
-        # If the infer process throws an Exception, is an error!
+        # 'self.samples_per_hour' should be obtained for some assertions. Missing
+        # or repeated moments are reported by check_time_index(), but if most of
+        # the index is irregular, is an error!
         try:
-            freq_df = pd.Timedelta(pd.tseries.frequencies.to_offset(pd.infer_freq(self.df.index)))
-            self.samples_per_hour = pd.Timedelta('1H') / freq_df
-        except:
-            add_line_log('CRITICAL', error_message="The 'Samples per hour' of the 'df' cannot be infered", type_data_station=self.type_data_station)
-            finish_log() 
-            raise ValueError("The 'Samples per hour' of the 'df' cannot be infered")
-        # If the infer process return 'None', is an error!
-        if self.samples_per_hour is None:
+            sampling = self.sampling()
+        except TypeError:
+            sampling = None
+
+        if sampling is None or not sampling.is_inferred:
             add_line_log('CRITICAL', error_message="The 'Samples per hour' of the 'df' cannot be infered", type_data_station=self.type_data_station)
-            finish_log() 
+            self._finish_log_on_error()
             raise ValueError("The 'Samples per hour' of the 'df' cannot be infered")
 
+        self.samples_per_hour = sampling.samples_per_hour
+
+        if sampling.regularity < 1:
+            add_line_log('INFO', error_message='Sampling step of {} inferred from {:.1%} of the index'.format(
+                sampling.step, sampling.regularity), type_data_station=self.type_data_station,
+                file_path=self.file_path)
+
+    def _finish_log_on_error(self):
+        if self.finish_log_on_error:
+            finish_log()
+
+    @classmethod
+    def from_frame(cls, df, type_data_station, samples_per_hour, file_path=None, date=None):
+        """
+        Returns a Checking of an already opened 'df' with a known resolution,
+        without logging its opening (e.g. one day of a MultiDayChecking)
+        """
+        checking = cls.__new__(cls)
+
+        checking.type_data_station = type_data_station
+        checking.date = date
+        checking.df = df
+        checking.samples_per_hour = samples_per_hour
+        checking.file_path = file_path
+        checking.finish_log_on_error = False
+        checking.panel = None
+
+        return checking
+
+    #%% Shared intermediate results
+    # Quantities derived from 'self.df' are computed once and shared by every
+    # check. They are dropped when 'self.df' is replaced (not if it is modified in place)
+    @property
+    def df(self):
+        return self._df
+
+    @df.setter
+    def df(self, df):
+        self._df = df
+        self._features = {}
+        self._flags = None
+
+    @property
+    def flags(self):
+        """
+        flags.QCFlags with the samples of 'self.df' that failed every check
+        """
+        if self._flags is None:
+            self._flags = mc_flags.QCFlags(self.df.index, self.df.columns)
+        return self._flags
+
+    def feature(self, key, compute):
+        """
+        Returns the value memoized under 'key' (a tuple with the name of the
+        quantity and its parameters), calling 'compute()' only the first time
+        """
+        try:
+            return self._features[key]
+        except KeyError:
+            value = self._features[key] = compute()
+            return value
+
+    def irradiation(self, column):
+        return self.feature(
+            ('irradiation', column, self.samples_per_hour),
+            lambda: mc_solar.daily_irradiation(self.df[column], samples_per_hour=self.samples_per_hour))
+
+    def mask_above(self, column, threshold):
+        return self.feature(
+            ('mask_above', column, threshold),
+            lambda: self.df[column] > threshold)
+
+    def filtered_above(self, column, threshold):
+        """
+        Values of 'column' higher than 'threshold'
+        """
+        return self.feature(
+            ('filtered_above', column, threshold),
+            lambda: self.df[column][self.mask_above(column, threshold)])
+
+    def radiation_transitions(self, column, radiation_threshold=None):
+        """
+        Number of radiation transitions of 'column', only considering values
+        higher than 'radiation_threshold' if given
+        """
+        def compute():
+            if radiation_threshold is None:
+                return mc_solar.num_radiation_transitions(self.df[column])
+            return mc_solar.num_radiation_transitions(self.filtered_above(column, radiation_threshold))
+
+        return self.feature(('radiation_transitions', column, radiation_threshold), compute)
+
+    def differential(self, column):
+        """
+        Difference between consecutive samples. The first one takes the second value
+        """
+        def compute():
+            differential = self.df[column].diff()
+            if len(differential) > 1:
+                differential.iloc[0] = differential.iloc[1]
+            return differential
+
+        return self.feature(('differential', column), compute)
+
+    def pct_change(self, column, window):
+        return self.feature(
+            ('pct_change', column, window),
+            lambda: self.df[column].pct_change(window).abs() * 100)
+
+    def rolling_range(self, column, window):
+        """
+        Maximum minus minimum in a rolling window
+        """
+        return self.rolling_ranges(column, [window])[0]
+
+    def rolling_ranges(self, column, windows):
+        """
+        Maximum minus minimum in rolling windows of several lengths. Those not
+        computed yet are computed in one call, one linear pass per window
+        (see solar_functions.rolling_ranges())
+        """
+        missing = [window for window in windows if ('rolling_range', column, window) not in self._features]
+
+        if missing:
+            for window, rolling_range in mc_solar.rolling_ranges(self.df[column], missing).items():
+                self._features[('rolling_range', column, window)] = pd.Series(
+                    rolling_range, index=self.df.index, name=column)
+
+        return [self._features[('rolling_range', column, window)] for window in windows]
+
+    def other_source(self, other_radiation):
+        """
+        Other source of radiation: a pandas.Series or the key
+        (type_data_station, column) of a column of 'self.panel'
+        """
+        if isinstance(other_radiation, tuple):
+            return self.panel.series(*other_radiation)
+        return other_radiation
+
+    def joined_other_source(self, column, other_radiation, label_other):
+        """
+        pandas.DataFrame with 'column' and the other source (renamed with
+        'label_other') on their common moments. From a panel, the alignment is
+        shared by every check, while 'self.df' is the frame of the panel
+        """
+        if isinstance(other_radiation, tuple):
+            if self.df is self.panel.frames.get(self.type_data_station):
+                return self.panel.aligned((self.type_data_station, column), other_radiation, label_other)
+            other_radiation = self.panel.series(*other_radiation)
+
+        return self.df[[column]].join(other_radiation.rename(other_radiation.name + label_other),
+                                      how='inner')
+
+    def sampling(self):
+        """
+        solar_functions.Sampling of the index: step, gaps and repeated moments
+        """
+        return self.feature(('sampling',), lambda: mc_solar.infer_sampling(self.df.index))
+
+    def solar_angles(self):
+        """
+        Azimuth and zenith (radians) of every moment of the index
+        """
+        def compute():
+            az, zz = mc_solar.solar_position(self.df.index)
+            return np.atleast_1d(az), np.atleast_1d(zz)
+
+        return self.feature(('solar_angles',), compute)
 
     def assertion_base(
             self,
@@ -182,27 +637,53 @@ class Checking:
             error_message,
             check_type=None,
             error_level='WARNING',
-            figure=None):
-        try:
-            assert condition, error_message
-        except AssertionError:
-            add_line_log(
-                error_level=error_level,
-                check_type=check_type,
-                error_message=error_message,
-                type_data_station=self.type_data_station,
-                file_path=self.file_path,
-                figure=figure)
-
+            figure=None,
+            num_flagged=None,
+            flagged=None,
+            flagged_columns=None):
+        """
+        Adds a line to the log if 'condition' is False. 'num_flagged' is the
+        number of samples that fail the check, for the profiling table
+        (1 if None).
+
+        The bit of 'check_type' is set in the 'flagged' samples (see
+        flags.QCFlags.set()) of 'flagged_columns' (all if None).
+
+        'error_message' can be a callable that returns the message, so it is
+        only built if the check fails. Messages longer than
+        MAX_ERROR_MESSAGE_LENGTH are cut.
+        """
+        if condition:
+            return
+
+        count_flagged(1 if num_flagged is None else num_flagged)
+
+        if flagged is not None:
+            self.flags.set(check_type, flagged, flagged_columns)
+
+        if callable(error_message):
+            error_message = error_message()
+        if len(error_message) > MAX_ERROR_MESSAGE_LENGTH:
+            error_message = error_message[:MAX_ERROR_MESSAGE_LENGTH] + ' [...]'
+
+        add_line_log(
+            error_level=error_level,
+            check_type=check_type,
+            error_message=error_message,
+            type_data_station=self.type_data_station,
+            file_path=self.file_path,
+            figure=figure)
+
+    @check
     def check_total_irradiation(self, column, total_irradiation_threshold):
 
-        name_check_function = inspect.getframeinfo(inspect.currentframe()).function
+        name_check_function = self.current_check
 
-        irradiation = mc_solar.daily_irradiation(
-            self.df[column], samples_per_hour=self.samples_per_hour)
+        irradiation = self.irradiation(column)
 
         self.assertion_base(
             condition=irradiation < total_irradiation_threshold,
+            flagged=True, flagged_columns=column,
             error_message='Total irradiation (daily) from "' +
             column +
             '" is {:.2f}. '.format(irradiation) +
@@ -210,16 +691,26 @@ class Checking:
             str(total_irradiation_threshold),
             check_type=name_check_function)
 
+    @check
     def check_format(self, num_columns):
 
-        name_check_function = inspect.getframeinfo(inspect.currentframe()).function
+        name_check_function = self.current_check
 
         num_moments = self.samples_per_hour * 24
 
         # Check dimensions
         condition_shape = (self.df.shape == (num_moments, num_columns))
-        error_message_shape = 'Wrong dimensions: ' + \
-            str(self.df.shape) + '. It should be: ' + str((num_moments, num_columns))
+
+        def error_message_shape():
+            error_message = 'Wrong dimensions: ' + \
+                str(self.df.shape) + '. It should be: ' + str((num_moments, num_columns))
+
+            if len(self.df) != num_moments and isinstance(self.df.index, pd.DatetimeIndex):
+                sampling = self.sampling()
+                error_message += '. Missing moments: {} in {} gaps. Repeated moments: {}'.format(
+                    sampling.num_missing, len(sampling.gaps), sampling.duplicated.sum())
+
+            return error_message
 
         self.assertion_base(
             condition=condition_shape,
@@ -231,28 +722,52 @@ class Checking:
         for column in self.df.columns:
             self.assertion_base(
                 condition=self.df.dtypes[column] == np.float64,
+                flagged=True, flagged_columns=column,
                 error_message='Column "' +
                 column +
                 '" is not numerical [np.float64]',
                 check_type=name_check_function,
                 error_level='ERROR')
 
+    @check
     def check_time_index(self):
         # Check index duplicated
     
-        name_check_function = inspect.getframeinfo(inspect.currentframe()).function
+        name_check_function = self.current_check
 
-        error_message_index_unique = 'Index not unique. Duplicates: ' + \
-            str(self.df.index[self.df.index.duplicated()])
+        # Repeated and missing moments were found when inferring the sampling
+        sampling = None
+        if isinstance(self.df.index, pd.DatetimeIndex):
+            sampling = self.sampling()
+            duplicated, is_monotonic = sampling.duplicated, sampling.is_monotonic
+        else:
+            duplicated, is_monotonic = self.df.index.duplicated(), self.df.index.is_monotonic_increasing
 
         self.assertion_base(
-            condition=self.df.index.is_unique,
-            error_message=error_message_index_unique,
+            condition=not duplicated.any(),
+            flagged=duplicated,
+            num_flagged=duplicated.sum(),
+            error_message=lambda: 'Index not unique. Duplicates: ' +
+            str(self.df.index[duplicated]),
             check_type=name_check_function,)
 
+        # Check missing moments
+        if sampling is not None and sampling.is_inferred:
+            is_after_gap = np.zeros(len(self.df), dtype=bool)
+            is_after_gap[sampling.gaps] = True
+
+            self.assertion_base(
+                condition=len(sampling.gaps) == 0,
+                flagged=is_after_gap,
+                num_flagged=sampling.num_missing,
+                error_message=lambda: 'Index has {} missing moments in {} gaps of the sampling step {}. '
+                'Moments after the gaps: {}'.format(
+                    sampling.num_missing, len(sampling.gaps), sampling.step, self.df.index[sampling.gaps]),
+                check_type=name_check_function)
+
         # Check index monotonic increasing
         self.assertion_base(
-            condition=self.df.index.is_monotonic_increasing,
+            condition=is_monotonic,
             error_message='Index not monotonic',
             check_type=name_check_function,
             error_level='ERROR')
@@ -264,41 +779,42 @@ class Checking:
             check_type=name_check_function,
             error_level='ERROR')
 
+    @check
     def check_null(self, column):
         # Check content of NaN's
-        name_check_function = inspect.getframeinfo(inspect.currentframe()).function
+        name_check_function = self.current_check
+
+        is_null = self.df[column].isnull().to_numpy()
+        num_null = int(is_null.sum())
 
         self.assertion_base(
-            condition=self.df[column].notnull().all(),
-            error_message='Column "' +
-            column +
-            '" has some NaN values: ' +
-            str(
-                self.df[
-                    self.df[column].isnull()].index),
+            condition=num_null == 0,
+            flagged=is_null, flagged_columns=column,
+            num_flagged=num_null,
+            # taken as the rows of the frame would be, with the same 'freq' in the message
+            error_message=lambda: 'Column "' + column + '" has some NaN values: ' +
+            str(self.df.index.take(np.flatnonzero(is_null))),
             check_type=name_check_function,)
 
+    @check
     def check_range(self, column, minimum, maximum):
         
-        name_check_function = inspect.getframeinfo(inspect.currentframe()).function
+        name_check_function = self.current_check
 
-        condition_list = self.df[column].dropna().between(minimum, maximum)
+        # over the whole column, so it is aligned with it in the figure and the flags
+        condition_list = self.df[column].between(minimum, maximum) | self.df[column].isna()
 
-        buffer = None
+        figure = None
         if not condition_list.all():
-            plt.figure()
-            self.df[column].plot(style='.')
-            self.df[column][~condition_list].plot(style='rP')
-            plt.title(name_check_function + ':' + column)
-            plt.suptitle(self.type_data_station, fontsize=18)
-
-            buffer = io.BytesIO()
-            plt.savefig(buffer)
-            buffer.seek(0)
+            figure = mc_fig.FigureSpec(title=name_check_function + ':' + column, suptitle=self.type_data_station)
+            figure.plot(self.df[column], style='.')
+            figure.plot(self.df[column], mask=~condition_list, style='rP')
 
         # Check columns range
         self.assertion_base(
             condition=condition_list.all(),
+            flagged=~condition_list, flagged_columns=column,
+            num_flagged=(~condition_list).sum(),
             error_message='Column "' +
             column +
             '" is not in range [' +
@@ -307,198 +823,188 @@ class Checking:
             str(maximum) +
             ']',
             check_type=name_check_function,
-            figure=buffer)
+            figure=figure)
 
+    @check
     def check_pct_change(self, column, window, threshold_pct):
 
-        name_check_function = inspect.getframeinfo(inspect.currentframe()).function
+        name_check_function = self.current_check
 
         # Check percentage change in a window
-        pct_change = self.df[column].pct_change(window).abs() * 100
+        pct_change = self.pct_change(column, window)
 
         # fills NA values, including those generated at the begining by the
         # method 'pct_change' to avoid false values
         condition_list = pct_change.fillna(method='bfill') < threshold_pct
 
-        buffer = None
+        figure = None
         if not condition_list.all():
-            plt.figure()
-            self.df[column].plot(style='.')
-            self.df[column][~condition_list].plot(style='rP')
-            plt.title(name_check_function + ':' + column)
-            plt.suptitle(self.type_data_station, fontsize=18)
-
-            buffer = io.BytesIO()
-            plt.savefig(buffer)
-            buffer.seek(0)
+            figure = mc_fig.FigureSpec(title=name_check_function + ':' + column, suptitle=self.type_data_station)
+            figure.plot(self.df[column], style='.')
+            figure.plot(self.df[column], mask=~condition_list, style='rP')
 
         self.assertion_base(
             condition=(condition_list).all(),
-            error_message='Percent change [%] of column ' +
+            flagged=~condition_list, flagged_columns=column,
+            num_flagged=(~condition_list).sum(),
+            error_message=lambda: 'Percent change [%] of column ' +
             column +
             ' is not in window of ' +
             str(window) +
             ' samples and threshold ' +
             str(threshold_pct) +
             '%. List of values: ' +
-            (
-                self.df[column][
-                    ~condition_list]).to_string().replace(
-                '\n',
-                ' - '),
+            format_values(self.df[column][~condition_list]),
             check_type=name_check_function,
-            figure=buffer)
+            figure=figure)
 
+    @check
     def check_abs_change(self, column, window, threshold):
+        """
+        'window' and 'threshold' can be lists (e.g. short spikes and slow
+        drifts), checked as many single windows. Each window is one linear
+        pass over the column (see solar_functions.rolling_ranges()).
+
+        Returns {window: boolean pandas.Series of the flagged samples}
+        """
+        name_check_function = self.current_check
 
-        name_check_function = inspect.getframeinfo(inspect.currentframe()).function
+        windows = [window] if np.isscalar(window) else list(window)
+        thresholds = [threshold] * len(windows) if np.isscalar(threshold) else list(threshold)
 
         # Check absolute change in a window
-        rolling = self.df[column].rolling(window)
+        rolling_ranges = self.rolling_ranges(column, windows)
 
-        # fills NA values, including those generated at the begining by the
-        # method 'rolling' to avoid false values
-        condition_list = (
-            rolling.max() -
-            rolling.min()).fillna(
-            method='bfill') < threshold
+        flagged_windows = {}
+        for window, threshold, rolling_range in zip(windows, thresholds, rolling_ranges):
+            # fills NA values, including those generated at the begining by the
+            # method 'rolling' to avoid false values
+            condition_list = rolling_range.fillna(method='bfill') < threshold
+            flagged_windows[window] = ~condition_list
 
-        buffer = None
-        if not condition_list.all():
-            plt.figure()
-            self.df[column].plot(style='.')
-            self.df[column][~condition_list].plot(style='rP')
-            plt.title(name_check_function + ':' + column)
-            plt.suptitle(self.type_data_station, fontsize=18)
+            figure = None
+            if not condition_list.all():
+                figure = mc_fig.FigureSpec(title=name_check_function + ':' + column, suptitle=self.type_data_station)
+                figure.plot(self.df[column], style='.')
+                figure.plot(self.df[column], mask=~condition_list, style='rP')
 
-            buffer = io.BytesIO()
-            plt.savefig(buffer)
-            buffer.seek(0)
+            self.assertion_base(
+                condition=(condition_list).all(),
+                flagged=~condition_list, flagged_columns=column,
+                num_flagged=(~condition_list).sum(),
+                error_message=lambda: 'Absolute change of column ' +
+                column +
+                ' is not in window of ' +
+                str(window) +
+                ' samples and threshold ' +
+                str(threshold) +
+                '. List of values: ' +
+                format_values(self.df[column][~condition_list]),
+                check_type=name_check_function,
+                figure=figure)
 
-        self.assertion_base(
-            condition=(condition_list).all(),
-            error_message='Absolute change of column ' +
-            column +
-            ' is not in window of ' +
-            str(window) +
-            ' samples and threshold ' +
-            str(threshold) +
-            '. List of values: ' +
-            (
-                self.df[column][
-                    ~condition_list]).to_string().replace(
-                '\n',
-                ' - '),
-            check_type=name_check_function,
-            figure=buffer)
+        return flagged_windows
 
+    @check
     def check_differential(self, column, threshold):
         # Check diff between 2 samples
 
-        name_check_function = inspect.getframeinfo(inspect.currentframe()).function
+        name_check_function = self.current_check
 
-        differential = self.df[column].diff()
-        differential[0] = differential[1]
+        differential = self.differential(column)
 
         condition_list = differential.abs() < threshold
 
-        buffer = None
+        figure = None
         if not condition_list.all():
-            plt.figure()
-            self.df[column].plot(style='.')
-            self.df[column][~condition_list].plot(style='rP')
-            plt.title(name_check_function + ':' + column)
-            plt.suptitle(self.type_data_station, fontsize=18)
-
-            buffer = io.BytesIO()
-            plt.savefig(buffer)
-            buffer.seek(0)
+            figure = mc_fig.FigureSpec(title=name_check_function + ':' + column, suptitle=self.type_data_station)
+            figure.plot(self.df[column], style='.')
+            figure.plot(self.df[column], mask=~condition_list, style='rP')
 
         self.assertion_base(
             condition=(condition_list).all(),
-            error_message=('Differential change of column {}'.format(column) +
+            flagged=~condition_list, flagged_columns=column,
+            num_flagged=(~condition_list).sum(),
+            error_message=lambda: ('Differential change of column {}'.format(column) +
                            'larger than threshold {}'.format(str(threshold)) +
-                           '. List of values: {}'.format(self.df[column][~condition_list].to_string().replace('\n', ' - '))),
+                           '. List of values: {}'.format(format_values(self.df[column][~condition_list]))),
                 check_type=name_check_function,
-                figure=buffer)
+                figure=figure)
 
+    @check
     def check_misalignment_geonica(self, column):
         # Check misalignment Geonica station
 
-        name_check_function = inspect.getframeinfo(inspect.currentframe()).function
+        name_check_function = self.current_check
 
-        num_valleys_misalign, moments_misalign = mc_solar.valleys_radiation(self.df[column])
+        num_valleys_misalign, moments_misalign = self.feature(
+            ('valleys_radiation', column), lambda: mc_solar.valleys_radiation(self.df[column]))
         
         print('num_valleys_misalign', num_valleys_misalign)
         
         condition_list = num_valleys_misalign < NUM_VALLEYS_THRESHOLD
 
-        buffer = None
+        figure = None
         if not condition_list:
-            plt.figure()
-            self.df[column].plot(style='.')
-            self.df[column][moments_misalign].plot(style='r-P')
-            plt.title(name_check_function)
-            plt.suptitle(self.type_data_station, fontsize=18)
-
-            buffer = io.BytesIO()
-            plt.savefig(buffer)
-            buffer.seek(0)
+            figure = mc_fig.FigureSpec(title=name_check_function, suptitle=self.type_data_station)
+            figure.plot(self.df[column], style='.')
+            figure.plot(self.df[column], mask=moments_misalign, style='r-P')
 
         self.assertion_base(
             condition=(condition_list),
-            error_message=('Possible misalignment in Geonica direct radiation due to ' +
+            flagged=pd.Index(moments_misalign), flagged_columns=column,
+            num_flagged=len(moments_misalign),
+            error_message=lambda: ('Possible misalignment in Geonica direct radiation due to ' +
                            'the number of suspicious valleys ({})'.format(num_valleys_misalign) +
                            ' larger than threshold, {}'.format(NUM_VALLEYS_THRESHOLD) +
-                           '. List of values: {}'.format(self.df[column][moments_misalign].to_string().replace('\n', ' - '))),
+                           '. List of values: {}'.format(format_values(self.df[column][moments_misalign]))),
                 check_type=name_check_function,
-                figure=buffer)
+                figure=figure)
 
+    @check
     def check_coherence_radiation(self, threshold_pct, dni, ghi, dhi, radiation_threshold=None):
         # Check radiation coherence between GHI and DNI&DHI
         # THRESHOLD is in percentage
 
-        name_check_function = inspect.getframeinfo(inspect.currentframe()).function
+        name_check_function = self.current_check
 
         if radiation_threshold is None:
             radiation_threshold = GHI_RADIATION_THRESHOLD
 
-        df_filt = self.df[self.df[ghi] > GHI_RADIATION_THRESHOLD]
+        is_filt = self.mask_above(ghi, GHI_RADIATION_THRESHOLD).values
+        df_filt = self.df[is_filt]
 
         if len(df_filt) == 0:  # Avoids future errors
             return None
 
-        _, Zz = mc_solar.solpos(df_filt.index)
+        # Solar position of the whole (regular) index is memoized
+        _, Zz = self.solar_angles()
+        Zz = Zz[is_filt]
 
         ghi_model = (df_filt[dhi] + df_filt[dni] * np.cos(Zz))
 
         condition_list = (
             ((df_filt[ghi] - ghi_model).abs()) / df_filt[ghi] * 100 < threshold_pct)
 
-        buffer = None
+        figure = None
         if not condition_list.all():
-            plt.figure()
-            df_filt[ghi].plot(style='.')
-            df_filt[ghi][~condition_list].plot(style='rP')
-#            plt.legend()
-            plt.title(name_check_function)
-            plt.suptitle(self.type_data_station, fontsize=18)
+            figure = mc_fig.FigureSpec(title=name_check_function, suptitle=self.type_data_station)
+            figure.plot(df_filt[ghi], style='.')
+            figure.plot(df_filt[ghi], mask=~condition_list, style='rP')
 
-            buffer = io.BytesIO()
-            plt.savefig(buffer)
-            buffer.seek(0)
-
-        num_radiation_transitions_value = mc_solar.num_radiation_transitions(self.df[ghi])
+        num_radiation_transitions_value = self.radiation_transitions(ghi)
 
         if num_radiation_transitions_value < NUM_RADIATION_TRANSITIONS_THRESHOLD:
             self.assertion_base(
                 condition=condition_list.all(),
-                error_message='No coherence between radiations considering a percentage threshold of GHI {}% in {}'.format(
+                flagged=~condition_list, flagged_columns=[dni, ghi, dhi],
+                num_flagged=(~condition_list).sum(),
+                error_message=lambda: 'No coherence between radiations considering a percentage threshold of GHI {}% in {}'.format(
                     threshold_pct,
                     df_filt[
                         ~condition_list].index),
                 check_type=name_check_function,
-                figure=buffer)
+                figure=figure)
         else:
             self.assertion_base(
                 condition=False,
@@ -507,9 +1013,11 @@ class Checking:
                     DRADIATION_DT,
                     NUM_RADIATION_TRANSITIONS_THRESHOLD),
                 error_level='INFO',
+                num_flagged=0,
                 check_type=name_check_function,
-                figure=buffer)
+                figure=figure)
             
+    @check
     def check_radiation_other_source(
             self,
             column,
@@ -518,17 +1026,13 @@ class Checking:
             radiation_threshold=None,
             label_other='_other'):
 
-        name_check_function = inspect.getframeinfo(inspect.currentframe()).function
+        name_check_function = self.current_check
         
         if radiation_threshold is None:
             radiation_threshold = DNI_RADIATION_THRESHOLD
 
-        other_radiation_copy = other_radiation.copy()
-
-        other_radiation_copy.name += label_other
-        column_other = other_radiation_copy.name
-
-        df_joined = self.df.join(other_radiation_copy, how='inner')
+        df_joined = self.joined_other_source(column, other_radiation, label_other)
+        column_other = df_joined.columns[1]
 
         df_filt = df_joined[df_joined[column] > radiation_threshold]
 
@@ -538,34 +1042,28 @@ class Checking:
         condition_list = (df_filt[column] - df_filt[column_other]
                           ).abs() / df_filt[column_other] * 100 < threshold_pct
 
-        buffer = None
+        figure = None
         if not condition_list.all():
-            plt.figure()
-            df_filt[column].plot(style='.')
-            df_filt[column_other].plot(style='.')
-            df_filt[column][~condition_list].plot(style='rP')
-            plt.legend([column, column_other])
-            plt.title(name_check_function + ':' + column)
-            plt.suptitle(self.type_data_station, fontsize=18)
+            figure = mc_fig.FigureSpec(title=name_check_function + ':' + column, suptitle=self.type_data_station, legend=[column, column_other])
+            figure.plot(df_filt[column], style='.')
+            figure.plot(df_filt[column_other], style='.')
+            figure.plot(df_filt[column], mask=~condition_list, style='rP')
 
-            buffer = io.BytesIO()
-            plt.savefig(buffer)
-            buffer.seek(0)
-
-        irrad_filt = self.df[column][lambda m: m > DNI_RADIATION_THRESHOLD]
-        num_radiation_transitions_value = mc_solar.num_radiation_transitions(irrad_filt)
+        num_radiation_transitions_value = self.radiation_transitions(column, DNI_RADIATION_THRESHOLD)
 
         if num_radiation_transitions_value < NUM_RADIATION_TRANSITIONS_THRESHOLD:
             self.assertion_base(
                 condition=condition_list.all(),
-                error_message='No coherence between {} and {} radiation sources considering a percentage THRESHOLD of {} % in {}'.format(
+                flagged=~condition_list, flagged_columns=column,
+                num_flagged=(~condition_list).sum(),
+                error_message=lambda: 'No coherence between {} and {} radiation sources considering a percentage THRESHOLD of {} % in {}'.format(
                     column,
                     column_other,
                     threshold_pct,
                     df_filt[column][
                         ~condition_list].index),
                 check_type=name_check_function,
-                figure=buffer)
+                figure=figure)
         else:
             self.assertion_base(
                 condition=False,
@@ -576,9 +1074,11 @@ class Checking:
                     DRADIATION_DT,
                     NUM_RADIATION_TRANSITIONS_THRESHOLD),
                 error_level='INFO',
+                num_flagged=0,
                 check_type=name_check_function,
-                figure=buffer)
+                figure=figure)
 
+    @check
     def check_total_irradiation_other_source(
             self,
             column,
@@ -586,14 +1086,10 @@ class Checking:
             threshold_pct,
             label_other='_other'):
 
-        name_check_function = inspect.getframeinfo(inspect.currentframe()).function
-
-        other_radiation_copy = other_radiation.copy()
-
-        other_radiation_copy.name += label_other
-        column_other = other_radiation_copy.name
+        name_check_function = self.current_check
 
-        df_joined = self.df.join(other_radiation_copy, how='inner')
+        df_joined = self.joined_other_source(column, other_radiation, label_other)
+        column_other = df_joined.columns[1]
 
         irradiation = mc_solar.daily_irradiation(
             df_joined[column], samples_per_hour=self.samples_per_hour)
@@ -608,26 +1104,19 @@ class Checking:
 
         condition_list = diff_radiation < threshold_pct
 
-        buffer = None
+        figure = None
         
         if not (condition_list):
-            plt.figure()
-            df_joined[column].plot(style='k.')
-            df_joined[column_other].plot(style='r.')
-            plt.legend([column, column_other])
-            plt.title(name_check_function + ':' + column)
-            plt.suptitle(self.type_data_station, fontsize=18)
-
-            buffer = io.BytesIO()
-            plt.savefig(buffer)
-            buffer.seek(0)
+            figure = mc_fig.FigureSpec(title=name_check_function + ':' + column, suptitle=self.type_data_station, legend=[column, column_other])
+            figure.plot(df_joined[column], style='k.')
+            figure.plot(df_joined[column_other], style='r.')
         
-        irrad_filt = self.df[column][lambda m: m > DNI_RADIATION_THRESHOLD]
-        num_radiation_transitions_value = mc_solar.num_radiation_transitions(irrad_filt)
+        num_radiation_transitions_value = self.radiation_transitions(column, DNI_RADIATION_THRESHOLD)
 
         if num_radiation_transitions_value < NUM_RADIATION_TRANSITIONS_THRESHOLD:
             self.assertion_base(
                 condition=condition_list,
+                flagged=True, flagged_columns=column,
                 error_message='Total irradiation from {} is different to {} in more than {}%. It is {:.1f}% while DAILY_IRRADIATION_THRESHOLD is {:.2} kWh/(m2·day)'.format(
                 column,
                 column_other,
@@ -635,7 +1124,7 @@ class Checking:
                 diff_radiation,
                 DAILY_IRRADIATION_THRESHOLD),
                 check_type=name_check_function,
-                figure=buffer)
+                figure=figure)
         else:
             self.assertion_base(
                 condition=False,
@@ -646,97 +1135,83 @@ class Checking:
                     DRADIATION_DT,
                     NUM_RADIATION_TRANSITIONS_THRESHOLD),
                 error_level='INFO',
+                num_flagged=0,
                 check_type=name_check_function,
-                figure=buffer)
+                figure=figure)
             
+    @check
     def check_same_magnitude_pct_change(
             self,
             column,
             column_other,
             threshold_pct):
 
-        name_check_function = inspect.getframeinfo(inspect.currentframe()).function
+        name_check_function = self.current_check
 
         condition_list = (self.df[column] - self.df[column_other]
                           ).abs() / self.df[column_other] * 100 < threshold_pct
 
-        buffer = None
+        figure = None
         if not condition_list.all():
-            plt.figure()
-            self.df[column].plot(style='.')
-            self.df[column][~condition_list].plot(style='rP')
-            plt.title(name_check_function + ':' + column + '&' + column_other + ' with thresold_pct=' + str(threshold_pct))
-            plt.suptitle(self.type_data_station, fontsize=18)
-
-            buffer = io.BytesIO()
-            plt.savefig(buffer)
-            buffer.seek(0)
+            figure = mc_fig.FigureSpec(title=name_check_function + ':' + column + '&' + column_other + ' with thresold_pct=' + str(threshold_pct), suptitle=self.type_data_station)
+            figure.plot(self.df[column], style='.')
+            figure.plot(self.df[column], mask=~condition_list, style='rP')
 
         self.assertion_base(
             condition=(condition_list).all(),
-            error_message='Percent change [%] of column ' +
+            flagged=~condition_list, flagged_columns=[column, column_other],
+            num_flagged=(~condition_list).sum(),
+            error_message=lambda: 'Percent change [%] of column ' +
             column +
             ' samples and threshold ' +
             str(threshold_pct) +
             '%. List of values: ' +
-            (
-                self.df[column][
-                    ~condition_list]).to_string().replace(
-                '\n',
-                ' - ')[:1000],
+            format_values(self.df[column][~condition_list])[:1000],
             check_type=name_check_function,
-            figure=buffer)
+            figure=figure)
                         
+    @check
     def check_same_irradiance_pct_change(
             self,
             column,
             column_other,
             threshold_pct):
 
-        name_check_function = inspect.getframeinfo(inspect.currentframe()).function
+        name_check_function = self.current_check
 
         condition_list = ((self.df[column] - self.df[column_other]
                           ).abs() / self.df[column_other] * 100 < threshold_pct) & self.df[column] < 100
 
-        buffer = None
+        figure = None
         if not condition_list.all():
-            plt.figure()
-            self.df[column].plot(style='.')
-            self.df[column][~condition_list].plot(style='rP')
-            plt.title(name_check_function + ':' + column + '&' + column_other + ' with thresold_pct=' + str(threshold_pct))
-            plt.suptitle(self.type_data_station, fontsize=18)
-
-            buffer = io.BytesIO()
-            plt.savefig(buffer)
-            buffer.seek(0)
+            figure = mc_fig.FigureSpec(title=name_check_function + ':' + column + '&' + column_other + ' with thresold_pct=' + str(threshold_pct), suptitle=self.type_data_station)
+            figure.plot(self.df[column], style='.')
+            figure.plot(self.df[column], mask=~condition_list, style='rP')
 
         self.assertion_base(
             condition=(condition_list).all(),
-            error_message='Percent change [%] of column ' +
+            flagged=~condition_list, flagged_columns=[column, column_other],
+            num_flagged=(~condition_list).sum(),
+            error_message=lambda: 'Percent change [%] of column ' +
             column +
             ' samples and threshold ' +
             str(threshold_pct) +
             '%. List of values: ' +
-            (
-                self.df[column][
-                    ~condition_list]).to_string().replace(
-                '\n',
-                ' - ')[:1000],
+            format_values(self.df[column][~condition_list])[:1000],
             check_type=name_check_function,
-            figure=buffer)
+            figure=figure)
 
+    @check
     def check_same_magnitude_total_irradiation(
             self,
             column,
             column_other,
             threshold_pct):
 
-        name_check_function = inspect.getframeinfo(inspect.currentframe()).function
+        name_check_function = self.current_check
 
-        irradiation = mc_solar.daily_irradiation(
-            self.df[column], samples_per_hour=self.samples_per_hour)
-        irradiation_other = mc_solar.daily_irradiation(
-            self.df[column_other], samples_per_hour=self.samples_per_hour)
+        irradiation = self.irradiation(column)
+        irradiation_other = self.irradiation(column_other)
 
         if irradiation < DAILY_IRRADIATION_THRESHOLD:  # Avoids future errors
             return None
@@ -746,26 +1221,19 @@ class Checking:
 
         condition_list = diff_radiation < threshold_pct
 
-        buffer = None
+        figure = None
         
         if not (condition_list):
-            plt.figure()
-            self.df[column].plot(style='k.')
-            self.df[column_other].plot(style='r.')
-            plt.legend([column, column_other])
-            plt.title(name_check_function + ':' + column + '&' + column_other + ' with thresold_pct=' + str(threshold_pct))
-            plt.suptitle(self.type_data_station, fontsize=18)
-
-            buffer = io.BytesIO()
-            plt.savefig(buffer)
-            buffer.seek(0)
+            figure = mc_fig.FigureSpec(title=name_check_function + ':' + column + '&' + column_other + ' with thresold_pct=' + str(threshold_pct), suptitle=self.type_data_station, legend=[column, column_other])
+            figure.plot(self.df[column], style='k.')
+            figure.plot(self.df[column_other], style='r.')
         
-        irrad_filt = self.df[column][lambda m: m > DNI_RADIATION_THRESHOLD]
-        num_radiation_transitions_value = mc_solar.num_radiation_transitions(irrad_filt)
+        num_radiation_transitions_value = self.radiation_transitions(column, DNI_RADIATION_THRESHOLD)
 
         if num_radiation_transitions_value < NUM_RADIATION_TRANSITIONS_THRESHOLD:
             self.assertion_base(
                 condition=condition_list,
+                flagged=True, flagged_columns=[column, column_other],
                 error_message='Total irradiation from {} is different to {} in more than {}%. It is {:.1f}% while DAILY_IRRADIATION_THRESHOLD is {:.2} kWh/(m2·day)'.format(
                 column,
                 column_other,
@@ -773,7 +1241,7 @@ class Checking:
                 diff_radiation,
                 DAILY_IRRADIATION_THRESHOLD),
                 check_type=name_check_function,
-                figure=buffer)
+                figure=figure)
         else:
             self.assertion_base(
                 condition=False,
@@ -784,9 +1252,11 @@ class Checking:
                     DRADIATION_DT,
                     NUM_RADIATION_TRANSITIONS_THRESHOLD),
                 error_level='INFO',
+                num_flagged=0,
                 check_type=name_check_function,
-                figure=buffer)
+                figure=figure)
 
+    @check
     def check_num_radiation_transitions_other_source(
             self,
             column,
@@ -795,42 +1265,37 @@ class Checking:
             radiation_threshold=None,
             label_other='_other'):
 
-        name_check_function = inspect.getframeinfo(inspect.currentframe()).function
+        name_check_function = self.current_check
         
         if radiation_threshold is None:
             radiation_threshold = DNI_RADIATION_THRESHOLD
 
+        other_radiation = self.other_source(other_radiation)
         column_other = other_radiation.name + label_other
         
-        other_radiation_filt = other_radiation.copy()[lambda x: x > radiation_threshold]
-        radiation_filt = self.df[column][lambda x: x > radiation_threshold]
+        other_radiation_filt = other_radiation[other_radiation > radiation_threshold]
+        radiation_filt = self.filtered_above(column, radiation_threshold)
         
         if len(radiation_filt) == 0:  # Avoids future errors
             return None
 
-        num_radiation_transitions_value = mc_solar.num_radiation_transitions(radiation_filt)
+        num_radiation_transitions_value = self.radiation_transitions(column, radiation_threshold)
         num_radiation_transitions_value_other = mc_solar.num_radiation_transitions(other_radiation_filt)
 
         condition_list = abs(
             num_radiation_transitions_value -
             num_radiation_transitions_value_other) < num_diff_radiation_transitions_thresold
         
-        buffer = None
+        figure = None
         
         if not condition_list:
-            plt.figure()
-            radiation_filt.plot(style='.-')
-            other_radiation_filt.plot(style='.-')
-            plt.legend([column, column_other])
-            plt.title(name_check_function + ':' + column)
-            plt.suptitle(self.type_data_station, fontsize=18)
-
-            buffer = io.BytesIO()
-            plt.savefig(buffer)
-            buffer.seek(0)
+            figure = mc_fig.FigureSpec(title=name_check_function + ':' + column, suptitle=self.type_data_station, legend=[column, column_other])
+            figure.plot(radiation_filt, style='.-')
+            figure.plot(other_radiation_filt, style='.-')
         
         self.assertion_base(
             condition=condition_list,
+            flagged=True, flagged_columns=column,
             error_message='No coherence of cloudy moments between {} and {} radiation sources with {} and {} respectively. Maximum allowed difference: {}'.format(
             column,
             column_other,
@@ -838,17 +1303,18 @@ class Checking:
             num_radiation_transitions_value_other,
             num_diff_radiation_transitions_thresold),
             check_type=name_check_function,
-            figure=buffer)
+            figure=figure)
 
+    @check
     def check_coherence_isotypes(self, dni, top, mid, bot, threshold_pct, radiation_threshold=None):
         #         Check radiation coherence between DNI and isotypes
         #         THRESHOLD is in percentage
-        name_check_function = inspect.getframeinfo(inspect.currentframe()).function
+        name_check_function = self.current_check
         
         if radiation_threshold is None:
             radiation_threshold = DNI_RADIATION_THRESHOLD
 
-        df_filt = self.df[self.df[dni] > DNI_RADIATION_THRESHOLD]
+        df_filt = self.df[self.mask_above(dni, DNI_RADIATION_THRESHOLD)]
 
         if len(df_filt) == 0:  # Avoids future errors
             return None
@@ -864,40 +1330,35 @@ class Checking:
         condition_list = (
             ((df_filt[dni] - dni_model).abs()) / df_filt[dni] * 100 < threshold_pct)
 
-        buffer = None
+        figure = None
         if not condition_list.all():
-            plt.figure()
-            df_filt[dni].plot(style='k.')
-            df_filt[top].plot(style='.')
-            df_filt[mid].plot(style='.')
-            df_filt[bot].plot(style='.')
-            df_filt[dni][
-                ~condition_list].plot(
+            figure = mc_fig.FigureSpec(title=name_check_function, suptitle=self.type_data_station, legend=[top, mid, bot])
+            figure.plot(df_filt[dni], style='k.')
+            figure.plot(df_filt[top], style='.')
+            figure.plot(df_filt[mid], style='.')
+            figure.plot(df_filt[bot], style='.')
+            figure.plot(
+                df_filt[dni],
+                mask=~condition_list,
                 marker='P',
                 markersize=8,
                 color='darkred',
                 markeredgecolor='yellow',
                 markeredgewidth=2)
-            plt.legend([top, mid, bot])
-            plt.title(name_check_function)
-            plt.suptitle(self.type_data_station, fontsize=18)
-
-            buffer = io.BytesIO()
-            plt.savefig(buffer)
-            buffer.seek(0)
 
-        irrad_filt = self.df[dni][lambda m: m > DNI_RADIATION_THRESHOLD]
-        num_radiation_transitions_value = mc_solar.num_radiation_transitions(irrad_filt)
+        num_radiation_transitions_value = self.radiation_transitions(dni, DNI_RADIATION_THRESHOLD)
 
         if num_radiation_transitions_value < NUM_RADIATION_TRANSITIONS_THRESHOLD:
             self.assertion_base(
                 condition=condition_list.all(),
-                error_message='No coherence between DNI radiation and isotypes considering a percentage threshold of {} % in {}'.format(
+                flagged=~condition_list, flagged_columns=[dni, top, mid, bot],
+                num_flagged=(~condition_list).sum(),
+                error_message=lambda: 'No coherence between DNI radiation and isotypes considering a percentage threshold of {} % in {}'.format(
                     threshold_pct,
                     df_filt[dni][
                         ~condition_list].index),
                 check_type=name_check_function,
-                figure=buffer)
+                figure=figure)
         else:
             self.assertion_base(
                 condition=False,
@@ -906,5 +1367,6 @@ class Checking:
                     DRADIATION_DT,
                     NUM_RADIATION_TRANSITIONS_THRESHOLD),
                 error_level='INFO',
+                num_flagged=0,
                 check_type=name_check_function,
-                figure=buffer)
+                figure=figure)
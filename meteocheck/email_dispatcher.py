@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+"""
+Non-blocking sending of the emails of the sessions.
+
+Reports are queued and sent by a background thread, that keeps its
+authenticated SMTP connection open between emails and closes it after
+EMAIL_IDLE_TIMEOUT seconds without use. Reports queued within
+EMAIL_COALESCE_WINDOW seconds of the first one are sent in one digest.
+Failed sendings are retried with exponential backoff, reconnecting first.
+Emails dropped after the retries are logged as ERROR (so they reach the log
+sinks) from the thread of the log, not from the background one: in the next
+session finished (see core.finish_log()) or when the dispatcher is closed.
+
+Pending emails are sent when the program exits (or with flush()). To test
+it with a local debugging server:
+
+    python -m aiosmtpd -n -l localhost:8025
+
+    >>> dispatcher = EmailDispatcher(smtp_server='localhost', smtp_port=8025,
+    ...                              login=None, use_starttls=False)
+    >>> dispatcher.submit(body='<p>Test</p>', subject='Test', list_figures=[])
+    >>> dispatcher.close()
+
+tests/test_email_dispatcher.py does the same with aiosmtpd's Controller
+(python -m pytest tests).
+"""
+import atexit
+import collections
+import queue
+import smtplib
+import threading
+import time
+
+import meteocheck.config_email as mc_email
+from meteocheck.settings import (EMAIL_COALESCE_WINDOW, EMAIL_MAX_RETRIES, EMAIL_RETRY_BACKOFF,
+                                 EMAIL_IDLE_TIMEOUT)
+
+# Items of the queue that are not reports
+_FLUSH = object()
+_STOP = object()
+
+
+class EmailDispatcher:
+    """
+    Arguments of the email account that are not given are taken from
+    'config_email.email_config' when the first report is submitted.
+
+    Parameters
+    ----------
+    receivers : list
+        Email addresses of the receivers
+    sender : String
+        Email address of the sender
+    smtp_server, smtp_port : String, int
+        SMTP server
+    login, password : String
+        Credentials. No login if 'login' is None. The password is only
+        queried to keyring when connecting
+    use_starttls : bool, default=True
+        Encrypts the connection with STARTTLS
+    coalesce_window : float
+        Seconds to wait for more reports to send in the same digest
+    max_retries : int
+        Retries of a failed sending before it is dropped
+    retry_backoff : float
+        Seconds before the first retry. They are doubled in every retry
+    idle_timeout : float
+        Seconds without emails before closing the connection
+    """
+
+    def __init__(self,
+                 receivers=mc_email.FROM_CONFIG,
+                 sender=mc_email.FROM_CONFIG,
+                 smtp_server=mc_email.FROM_CONFIG,
+                 smtp_port=mc_email.FROM_CONFIG,
+                 login=mc_email.FROM_CONFIG,
+                 password=mc_email.FROM_CONFIG,
+                 use_starttls=True,
+                 coalesce_window=EMAIL_COALESCE_WINDOW,
+                 max_retries=EMAIL_MAX_RETRIES,
+                 retry_backoff=EMAIL_RETRY_BACKOFF,
+                 idle_timeout=EMAIL_IDLE_TIMEOUT):
+        self.receivers = receivers
+        self.sender = sender
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.login = login
+        self.password = password
+        self.use_starttls = use_starttls
+        self.coalesce_window = coalesce_window
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.idle_timeout = idle_timeout
+
+        self.num_sent = 0 # emails, a digest is one
+        self.num_reports_sent = 0
+        self.num_retries = 0
+        self.num_connections = 0
+        # (subjects, exception) of the emails dropped after all the retries
+        self.failures = []
+        # error messages of the dropped emails not logged yet (see log_failures())
+        self._failures_to_log = collections.deque()
+
+        self._smtp = None
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, body, subject, list_figures):
+        """
+        Queues a report and returns immediately. Figures ((index, io.BytesIO
+        or None), as in config_email.send_email()) are read at this moment
+        """
+        figures = [(index, buffer.read()) for index, buffer in list_figures if buffer is not None]
+
+        self.receivers = mc_email.from_config(self.receivers, 'RECIPIENTS_EMAIL')
+        self.sender = mc_email.from_config(self.sender, 'SENDER_EMAIL')
+
+        self._start()
+        self._queue.put((subject, body, figures))
+
+    def flush(self):
+        """
+        Sends the queued reports without waiting for the coalescing window,
+        and blocks until they are sent (or dropped)
+        """
+        if self._thread is None:
+            return
+
+        self._queue.put(_FLUSH)
+        self._queue.join()
+
+    def close(self):
+        """
+        Sends the queued reports, stops the worker and closes the connection
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+
+        if thread is None:
+            return
+
+        self._queue.put(_STOP)
+        thread.join()
+
+        self.log_failures()
+
+    def log_failures(self):
+        """
+        Logs as ERROR the emails dropped since the last call. Called from the
+        thread of the log (e.g. by core.finish_log()), that is not thread-safe
+        """
+        # core imports this module
+        import meteocheck.core as mc_core
+
+        while self._failures_to_log:
+            mc_core.add_line_log('ERROR', error_message=self._failures_to_log.popleft())
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='meteocheck-email', daemon=True)
+                self._thread.start()
+
+    #%% Worker
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                self._disconnect()
+                continue
+
+            if item is _FLUSH:
+                self._queue.task_done()
+                continue
+            if item is _STOP:
+                self._queue.task_done()
+                break
+
+            reports, is_stopping = self._coalesce(item)
+
+            try:
+                self._send(reports)
+            except Exception as e: # e.g. a wrong message. The worker goes on
+                self._drop(reports, e)
+            finally:
+                for _ in reports:
+                    self._queue.task_done()
+
+            if is_stopping:
+                break
+
+        self._disconnect()
+
+    def _coalesce(self, first_report):
+        """
+        Collects the reports queued within the coalescing window
+        """
+        reports = [first_report]
+        deadline = time.monotonic() + self.coalesce_window
+
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return reports, False
+
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                return reports, False
+
+            if item is _FLUSH or item is _STOP:
+                self._queue.task_done()
+                return reports, item is _STOP
+
+            reports.append(item)
+
+    def _send(self, reports):
+        msg = self._build_message(reports)
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._connect().sendmail(self.sender, self.receivers, msg.as_string())
+            except (smtplib.SMTPException, OSError) as e:
+                self._disconnect()
+
+                if attempt == self.max_retries or _is_permanent(e):
+                    self._drop(reports, e)
+                    return
+
+                self.num_retries += 1
+                time.sleep(self.retry_backoff * 2**attempt)
+            else:
+                self.num_sent += 1
+                self.num_reports_sent += len(reports)
+                return
+
+    def _drop(self, reports, error):
+        subjects = [subject for subject, _, _ in reports]
+        self.failures.append((subjects, error))
+
+        # logged from the thread of the log (see log_failures())
+        self._failures_to_log.append('E-mail not sent: {!r}. Subjects: {}'.format(error, subjects))
+
+    def _build_message(self, reports):
+        if len(reports) == 1:
+            subject, body, figures = reports[0]
+            return mc_email.build_message(body, subject, figures, receivers=self.receivers, sender=self.sender)
+
+        # Digest. Content-IDs of the figures are prefixed with the number of the report
+        subject = 'Digest of {} meteocheck reports: {}'.format(
+            len(reports), ' | '.join(dict.fromkeys(subject for subject, _, _ in reports)))
+
+        bodies, figures = [], []
+        for number, (subject_report, body, figures_report) in enumerate(reports):
+            bodies.append('<h3>{}</h3>\n{}'.format(subject_report, body))
+            figures.extend(('{}_{}'.format(number, index), png) for index, png in figures_report)
+
+        return mc_email.build_message('\n<hr>\n'.join(bodies), subject, figures,
+                                      receivers=self.receivers, sender=self.sender)
+
+    def _connect(self):
+        if self._smtp is None:
+            self._smtp = mc_email.connect_smtp(self.smtp_server, self.smtp_port, self.login,
+                                               self.password, use_starttls=self.use_starttls)
+            self.num_connections += 1
+
+        return self._smtp
+
+    def _disconnect(self):
+        if self._smtp is None:
+            return
+
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self._smtp.close()
+        self._smtp = None
+
+
+def _is_permanent(error):
+    # 5xx replies and refused recipients will fail again
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+
+_email_dispatcher = None
+
+
+def get_email_dispatcher():
+    """
+    Returns the EmailDispatcher configured in 'meteocheck_email.ini'. Its
+    pending emails are sent when the program exits
+    """
+    global _email_dispatcher
+
+    if _email_dispatcher is None:
+        _email_dispatcher = EmailDispatcher()
+        atexit.register(_email_dispatcher.close)
+
+    return _email_dispatcher
+
+
+def log_email_failures():
+    """
+    Logs the emails dropped by the EmailDispatcher of get_email_dispatcher(),
+    if any (see EmailDispatcher.log_failures())
+    """
+    if _email_dispatcher is not None:
+        _email_dispatcher.log_failures()
+
+
+def reset_email_dispatcher():
+    """
+    Closes the EmailDispatcher of get_email_dispatcher(), sending its pending
+    emails, so the next one reads the configuration again (e.g. after
+    'config_email.email_config.reload()')
+    """
+    global _email_dispatcher
+
+    dispatcher, _email_dispatcher = _email_dispatcher, None
+
+    if dispatcher is not None:
+        atexit.unregister(dispatcher.close)
+        dispatcher.close()
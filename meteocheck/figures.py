@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+"""
+Diagnostic figures of the checks.
+
+Checks only describe the figure (series, flagged samples, title and style) with
+a FigureSpec. The figure is rendered when it is really needed, e.g. when the
+log is sent by email. A FigureSpec keeps a copy of the data to plot only, not
+the frame checked, so it is cheap to keep and to send to another process.
+
+Rendering does not use pyplot: a FigureManager draws on a single reusable
+figure with the non-interactive Agg canvas, so no figure is left open, and
+keeps the rendered PNGs within a memory budget, spilling the older ones to disk.
+The data of the figures not rendered yet is counted in the same budget: beyond
+it, the oldest figures are rendered. matplotlib is only imported when the first figure is rendered.
+
+The PNGs of a log are discarded (and the spilled ones removed) when the log
+is cleared, and the temporary directory of the spilled PNGs when the program
+exits. Figures can be rendered from several threads, one at a time.
+"""
+import atexit
+import io
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from meteocheck.settings import FIGURES_MEMORY_BUDGET, FIGURES_SPILL_PATH
+
+
+class FigureSpec:
+    """
+    Lightweight description of a diagnostic figure.
+
+    Parameters
+    ----------
+    title : String
+        Title of the axes, usually the check and the column
+    suptitle : String
+        Title of the figure, usually the type of meteo station
+    legend : list
+        Labels of the legend, if any
+    """
+
+    def __init__(self, title, suptitle=None, legend=None):
+        self.title = title
+        self.suptitle = suptitle
+        self.legend = legend
+        self.lines = []
+        # of the data in 'lines', counted in the memory budget until rendered
+        self.num_bytes = 0
+        # PNG once rendered: bytes in memory or Path if spilled to disk
+        self.png = None
+
+    def __repr__(self):
+        return '<FigureSpec {}>'.format(self.title)
+
+    def plot(self, series, mask=None, **style):
+        """
+        Adds a series to the figure. Only a copy of the selection to plot is kept.
+
+        Parameters
+        ----------
+        series : pandas.Series
+            Data to plot
+        mask : boolean pandas.Series or list of labels, optional
+            Selection of 'series' to plot, e.g. the flagged samples
+        **style
+            Arguments passed to 'pandas.Series.plot()'
+        """
+        series = (series if mask is None else series[mask]).copy()
+
+        num_bytes = series.memory_usage(index=True)
+
+        self.lines.append((series, style))
+        self.num_bytes += num_bytes
+        get_figure_manager().hold(self, num_bytes)
+
+        return self
+
+    def draw(self, axes):
+        for series, style in self.lines:
+            series.plot(ax=axes, **style)
+
+        if self.legend is not None:
+            axes.legend(self.legend)
+        axes.set_title(self.title)
+        axes.figure.suptitle(self.suptitle, fontsize=18)
+
+    def render(self):
+        """
+        Returns the figure as a PNG in a io.BytesIO
+        """
+        return get_figure_manager().render(self)
+
+
+class FigureManager:
+    """
+    Renders FigureSpec's and keeps their PNGs.
+
+    Parameters
+    ----------
+    memory_budget : int
+        Maximum bytes of PNGs and data of figures not rendered yet kept in
+        memory. Beyond it, the oldest figures not rendered are rendered and
+        the oldest PNGs are written to 'spill_path' and read back when needed
+    spill_path : Path, optional
+        Directory for spilled PNGs. Defaults to a temporary directory
+    """
+
+    def __init__(self, memory_budget=FIGURES_MEMORY_BUDGET, spill_path=FIGURES_SPILL_PATH):
+        self.memory_budget = memory_budget
+        self.spill_path = spill_path
+        self.bytes_in_memory = 0
+        self.bytes_unrendered = 0
+        self.num_spilled = 0
+
+        self._figure = None
+        self._in_memory = OrderedDict() # FigureSpec's with PNG in memory, oldest first
+        self._unrendered = OrderedDict() # FigureSpec's not rendered yet, oldest first
+        self._temp_path = None # created for the spilled PNGs, removed by close()
+        # the single figure and the PNGs are shared by the threads
+        self._lock = threading.Lock()
+
+    def render(self, figure_spec):
+        """
+        Returns the PNG of 'figure_spec' in a io.BytesIO, rendering it only
+        the first time
+        """
+        with self._lock:
+            if figure_spec.png is None:
+                self._keep(figure_spec, self._draw(figure_spec))
+
+            if isinstance(figure_spec.png, Path):
+                return io.BytesIO(figure_spec.png.read_bytes())
+
+            return io.BytesIO(figure_spec.png)
+
+    def hold(self, figure_spec, num_bytes):
+        """
+        Counts 'num_bytes' more of data of 'figure_spec', not rendered yet, in
+        the memory budget. Beyond it, the oldest figures not rendered are
+        rendered, but not 'figure_spec', that may still be being described
+        """
+        with self._lock:
+            self._unrendered[id(figure_spec)] = figure_spec
+            self._unrendered.move_to_end(id(figure_spec))
+            self.bytes_unrendered += num_bytes
+
+            while self.bytes_in_memory + self.bytes_unrendered > self.memory_budget and len(self._unrendered) > 1:
+                oldest = next(iter(self._unrendered.values()))
+                try:
+                    self._keep(oldest, self._draw(oldest))
+                except Exception:
+                    # not counted. Its error is logged if it is rendered when needed
+                    self._unhold(oldest)
+
+    def release(self, figure_spec):
+        """
+        Stops counting 'figure_spec' in the memory budget, reading its PNG
+        back if it was spilled, e.g. to send it to another process (see adopt())
+        """
+        with self._lock:
+            self._unhold(figure_spec)
+
+            if self._in_memory.pop(id(figure_spec), None) is not None:
+                self.bytes_in_memory -= len(figure_spec.png)
+            elif isinstance(figure_spec.png, Path):
+                file_path = figure_spec.png
+                figure_spec.png = file_path.read_bytes()
+                _remove(file_path)
+
+    def adopt(self, figure_spec):
+        """
+        Counts 'figure_spec' in the memory budget, e.g. when it comes from
+        another process (see release())
+        """
+        if figure_spec.png is None:
+            self.hold(figure_spec, figure_spec.num_bytes)
+        elif not isinstance(figure_spec.png, Path):
+            with self._lock:
+                self._keep(figure_spec, figure_spec.png)
+
+    def discard(self, figure_spec):
+        """
+        Forgets the PNG of 'figure_spec', removing it if it was spilled. It
+        cannot be rendered again
+        """
+        with self._lock:
+            self._unhold(figure_spec)
+
+            if self._in_memory.pop(id(figure_spec), None) is not None:
+                self.bytes_in_memory -= len(figure_spec.png)
+            elif isinstance(figure_spec.png, Path):
+                _remove(figure_spec.png)
+            figure_spec.png = None
+
+    def close(self):
+        """
+        Forgets the PNGs in memory and removes the temporary directory of the spilled ones
+        """
+        with self._lock:
+            for figure_spec in self._in_memory.values():
+                figure_spec.png = None
+            self._in_memory.clear()
+            self.bytes_in_memory = 0
+            self._unrendered.clear()
+            self.bytes_unrendered = 0
+
+            if self._temp_path is not None:
+                shutil.rmtree(self._temp_path, ignore_errors=True)
+                self._temp_path = self.spill_path = None
+
+    def _draw(self, figure_spec):
+        # A single figure is reused and cleared after each save
+        if self._figure is None:
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+            self._figure = Figure()
+            FigureCanvasAgg(self._figure)
+
+        try:
+            figure_spec.draw(self._figure.add_subplot())
+
+            buffer = io.BytesIO()
+            self._figure.savefig(buffer, format='png')
+        finally:
+            self._figure.clear()
+
+        return buffer.getvalue()
+
+    def _keep(self, figure_spec, png):
+        self._unhold(figure_spec)
+
+        figure_spec.png = png
+        figure_spec.lines = [] # data is not needed anymore
+        figure_spec.num_bytes = 0
+
+        self._in_memory[id(figure_spec)] = figure_spec
+        self.bytes_in_memory += len(png)
+
+        while self.bytes_in_memory + self.bytes_unrendered > self.memory_budget and len(self._in_memory) > 1:
+            _, oldest = self._in_memory.popitem(last=False)
+            self._spill(oldest)
+
+    def _unhold(self, figure_spec):
+        if self._unrendered.pop(id(figure_spec), None) is not None:
+            self.bytes_unrendered -= figure_spec.num_bytes
+
+    def _spill(self, figure_spec):
+        if self.spill_path is None:
+            self.spill_path = self._temp_path = Path(tempfile.mkdtemp(prefix='meteocheck_figures_'))
+        Path(self.spill_path).mkdir(parents=True, exist_ok=True)
+
+        file_path = Path(self.spill_path, 'figure_{}_{}.png'.format(os.getpid(), self.num_spilled))
+        file_path.write_bytes(figure_spec.png)
+
+        self.bytes_in_memory -= len(figure_spec.png)
+        self.num_spilled += 1
+        figure_spec.png = file_path
+
+
+_figure_manager = None
+
+
+def get_figure_manager():
+    """
+    Returns the FigureManager of this process. Its temporary files are
+    removed when the program exits
+    """
+    global _figure_manager
+
+    if _figure_manager is None:
+        _figure_manager = FigureManager()
+        atexit.register(_figure_manager.close)
+
+    return _figure_manager
+
+
+def discard_figures(figures):
+    """
+    Forgets the PNGs of the FigureSpec's in 'figures', e.g. of a log being
+    cleared (see FigureManager.discard())
+    """
+    if _figure_manager is None: # nothing rendered
+        return
+
+    for figure in figures:
+        if isinstance(figure, FigureSpec):
+            _figure_manager.discard(figure)
+
+
+def release_figures(figures):
+    """
+    Stops counting the FigureSpec's in 'figures' in the memory budget of this
+    process, e.g. of a log sent to another process (see FigureManager.release())
+    """
+    if _figure_manager is None: # nothing described
+        return
+
+    for figure in figures:
+        if isinstance(figure, FigureSpec):
+            _figure_manager.release(figure)
+
+
+def adopt_figures(figures):
+    """
+    Counts the FigureSpec's in 'figures' in the memory budget of this process,
+    e.g. of a log received from another process (see FigureManager.adopt())
+    """
+    for figure in figures:
+        if isinstance(figure, FigureSpec):
+            get_figure_manager().adopt(figure)
+
+
+def render_figure(figure):
+    """
+    Returns a io.BytesIO with the PNG of 'figure', that can be a FigureSpec,
+    an already rendered io.BytesIO or None
+    """
+    if isinstance(figure, FigureSpec):
+        return figure.render()
+
+    return figure
+
+
+def _remove(file_path):
+    try:
+        os.remove(file_path)
+    except OSError:
+        pass
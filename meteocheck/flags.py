@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Per-sample quality flags of the checks.
+
+Every check registered with core.check() has a bit of a uint32. A QCFlags
+holds one uint32 per sample and column of the checked frame, where the bit
+of a check is set if the sample failed it. So the samples that passed a set
+of checks are selected with a single AND:
+
+    >>> flags = checking.flags
+    >>> is_bad = (flags.to_frame() & flags.bitmask(['check_range', 'check_null'])) != 0
+    >>> df_clean = checking.df.mask(is_bad)
+
+(the same as flags.mask(['check_range', 'check_null'])).
+
+Flags are saved as numpy '.npz' files with the names of the checks of every
+bit, and flags of several days (or sessions) are merged with combine().
+"""
+import numpy as np
+import pandas as pd
+
+# {name of the check: bit}, in order of registration
+CHECK_BITS = {}
+
+NUM_BITS = 32
+
+
+def register_check(name_check):
+    """
+    Returns the bit of 'name_check', giving it the next free one if it is new
+    """
+    if name_check not in CHECK_BITS:
+        if len(CHECK_BITS) == NUM_BITS:
+            raise ValueError('No free bit for the check {}: there are already {} checks'.format(
+                name_check, NUM_BITS))
+        CHECK_BITS[name_check] = len(CHECK_BITS)
+
+    return CHECK_BITS[name_check]
+
+
+class QCFlags:
+    """
+    Parameters
+    ----------
+    index : pandas.Index
+        Index of the checked frame
+    columns : list
+        Columns of the checked frame
+    values : numpy.ndarray, optional
+        uint32 array of shape (len(index), len(columns)). Zeros by default
+    names : list, optional
+        Names of the checks of every bit. Defaults to the registered checks
+    """
+
+    def __init__(self, index, columns, values=None, names=None):
+        self.index = index
+        self.columns = list(columns)
+
+        if values is None:
+            values = np.zeros((len(index), len(self.columns)), dtype=np.uint32)
+        self.values = values
+
+        self.names = list(CHECK_BITS) if names is None else list(names)
+
+    def __len__(self):
+        return len(self.values)
+
+    def bitmask(self, checks=None):
+        """
+        uint32 with the bits of 'checks' (names). All the checks if None
+        """
+        if checks is None:
+            checks = self.names
+        elif isinstance(checks, str):
+            checks = [checks]
+
+        bits = 0
+        for name_check in checks:
+            bits |= 1 << self._bit(name_check)
+
+        return np.uint32(bits)
+
+    def _bit(self, name_check):
+        try:
+            return self.names.index(name_check)
+        except ValueError:
+            raise KeyError('No bit for the check {}'.format(name_check)) from None
+
+    def set(self, name_check, flagged=True, columns=None):
+        """
+        Sets the bit of 'name_check' in the flagged samples of 'columns'
+
+        Parameters
+        ----------
+        name_check : String
+        flagged : bool, numpy.ndarray, pandas.Series or pandas.Index
+            True for every sample, a boolean array aligned with the index, a
+            boolean Series indexed by some of its moments (e.g. filtered values)
+            or the flagged moments
+        columns : String or list, optional
+            Columns of the flagged samples. All if None
+        """
+        if columns is None:
+            positions_columns = slice(None)
+        else:
+            if isinstance(columns, str):
+                columns = [columns]
+            positions_columns = [self.columns.index(column) for column in columns]
+
+        if isinstance(flagged, pd.Series):
+            flagged = flagged.index[flagged.to_numpy(dtype=bool)]
+        if isinstance(flagged, pd.Index):
+            flagged = self.index.isin(flagged)
+        elif flagged is True:
+            flagged = slice(None)
+        else:
+            flagged = np.asarray(flagged, dtype=bool)
+
+        rows = self.values[flagged]
+        rows[:, positions_columns] |= self.bitmask(name_check)
+        self.values[flagged] = rows
+
+    def update(self, rows, other):
+        """
+        Adds the flags of 'other', that flags the rows 'rows' (slice or
+        positions) of these ones with the same columns and checks
+        """
+        self.values[rows] |= other.values
+
+    def to_frame(self):
+        return pd.DataFrame(self.values, index=self.index, columns=self.columns)
+
+    def mask(self, checks=None, columns=None):
+        """
+        Boolean pandas.DataFrame with the samples that failed any of 'checks'
+        """
+        frame = self.to_frame()
+        if columns is not None:
+            frame = frame[columns]
+
+        return (frame & self.bitmask(checks)) != 0
+
+    def counts(self):
+        """
+        Number of flagged samples of every check (rows) and column
+        """
+        return pd.DataFrame({name_check: ((self.values >> np.uint32(bit)) & 1).sum(axis=0)
+                             for bit, name_check in enumerate(self.names)},
+                            index=self.columns).T
+
+    def save(self, file_path):
+        """
+        Writes the flags as a numpy '.npz' file
+        """
+        if not isinstance(self.index, pd.DatetimeIndex):
+            raise TypeError('Only flags of a DatetimeIndex can be saved')
+
+        with open(file_path, 'wb') as file:
+            np.savez_compressed(file,
+                                values=self.values,
+                                index=self.index.asi8,
+                                tz=str(self.index.tz or ''),
+                                columns=np.array(self.columns, dtype=str),
+                                names=np.array(self.names, dtype=str))
+
+    @classmethod
+    def load(cls, file_path):
+        with np.load(file_path, allow_pickle=False) as data:
+            index = pd.DatetimeIndex(data['index'])
+            tz = str(data['tz'])
+            if tz:
+                index = index.tz_localize('UTC').tz_convert(tz)
+
+            return cls(index, data['columns'].tolist(), data['values'],
+                       names=data['names'].tolist())
+
+
+def combine(flags_list):
+    """
+    Merges flags of different days, columns or sessions in one QCFlags sorted
+    by time. Flags of the same sample and column are OR-ed. Bits are matched by
+    the names of the checks
+
+    Parameters
+    ----------
+    flags_list : list of QCFlags
+    """
+    names = list(CHECK_BITS)
+    for flags in flags_list:
+        names.extend(name_check for name_check in flags.names if name_check not in names)
+    if len(names) > NUM_BITS:
+        raise ValueError('The flags have more than {} checks'.format(NUM_BITS))
+
+    columns = list(dict.fromkeys(column for flags in flags_list for column in flags.columns))
+
+    frames = []
+    for flags in flags_list:
+        values = flags.values
+        if flags.names != names[:len(flags.names)]:
+            values = np.zeros_like(flags.values)
+            for bit, name_check in enumerate(flags.names):
+                values |= ((flags.values >> np.uint32(bit)) & 1) << np.uint32(names.index(name_check))
+        frames.append(pd.DataFrame(values, index=flags.index, columns=flags.columns))
+
+    frame = pd.concat(frames).reindex(columns=columns).fillna(0).astype(np.uint32)
+
+    if not frame.index.has_duplicates:
+        frame = frame.sort_index()
+        return QCFlags(frame.index, columns, frame.to_numpy(), names=names)
+
+    codes, index = pd.factorize(frame.index, sort=True)
+    values = np.zeros((len(index), len(columns)), dtype=np.uint32)
+    np.bitwise_or.at(values, codes, frame.to_numpy())
+
+    return QCFlags(pd.Index(index), columns, values, names=names)
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+History of the incidences of every session in a SQLite database.
+
+Each session is inserted at once by finish_log(). Incidences are indexed by
+time stamp, station, check and error level, so trend reports do not read
+the whole history:
+
+    >>> store = get_history_store()
+    >>> store.count(date_start='2020-07-01', date_end='2020-10-01',
+    ...             type_data_station='geonica', check_type='check_range',
+    ...             error_level='WARNING')
+    >>> store.count(period='month', by=['type_data_station'])
+
+Figures of the sessions sent by email are stored as PNG files in
+HISTORY_FIGURES_PATH and the database keeps their path, relative to that
+directory. They are not rendered again: finish_log() gives those of the email.
+"""
+import datetime as dt
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import pandas as pd
+
+from meteocheck.settings import (FILENAME_HISTORY_DB, HISTORY_FIGURES_PATH,
+                                 IS_STORING_HISTORY_FIGURES, FILENAME_HISTORY_LOG)
+
+# Same order as core.ERROR_LEVELS, whose codes are in the raw lines of the log
+ERROR_LEVELS = ['INFO', 'WARNING', 'ERROR', 'CRITICAL']
+
+INCIDENCE_COLUMNS = ['time_stamp', 'error_level', 'type_data_station', 'check_type',
+                     'error_message', 'file', 'figure']
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    time_stamp TEXT NOT NULL,
+    num_incidences INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS incidences (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES sessions(id),
+    time_stamp TEXT NOT NULL,
+    error_level TEXT NOT NULL,
+    type_data_station TEXT,
+    check_type TEXT,
+    error_message TEXT,
+    file TEXT,
+    figure TEXT
+);
+CREATE INDEX IF NOT EXISTS incidences_time_stamp ON incidences (time_stamp);
+CREATE INDEX IF NOT EXISTS incidences_station_check_level
+    ON incidences (type_data_station, check_type, error_level, time_stamp);
+CREATE INDEX IF NOT EXISTS incidences_error_level ON incidences (error_level, time_stamp);
+"""
+
+# Formats of the periods of count(), for SQLite's strftime()
+PERIODS = {'day': '%Y-%m-%d', 'month': '%Y-%m', 'year': '%Y'}
+
+
+class HistoryStore:
+    """
+    Parameters
+    ----------
+    db_path : Path
+        SQLite database. Created if needed
+    figures_path : Path
+        Directory of the PNG files of the figures
+    is_storing_figures : bool
+        If False, figures are not stored
+    """
+
+    def __init__(self, db_path=FILENAME_HISTORY_DB, figures_path=HISTORY_FIGURES_PATH,
+                 is_storing_figures=IS_STORING_HISTORY_FIGURES):
+        self.db_path = Path(db_path)
+        self.figures_path = Path(figures_path)
+        self.is_storing_figures = is_storing_figures
+
+        with closing(self._connect()) as connection, connection:
+            connection.executescript(_SCHEMA)
+
+    def _connect(self):
+        connection = sqlite3.connect(str(self.db_path), timeout=30)
+        # readers do not block the writer of a session (e.g. parallel batches)
+        connection.execute('PRAGMA journal_mode=WAL')
+        return connection
+
+    def add_session(self, lines, figures=None):
+        """
+        Inserts the raw lines of a session log (see core.LogBuffer.lines())
+        in a single transaction
+
+        Parameters
+        ----------
+        lines : list
+            Raw lines of the log
+        figures : list, optional
+            (index of the line, io.BytesIO or None) of the figures already
+            rendered (see core.LogBuffer.rendered_figures()). Only these are
+            stored
+
+        Returns
+        -------
+        session_id : int
+        """
+        figures = dict(figures or [])
+
+        with closing(self._connect()) as connection, connection:
+            session_id = connection.execute(
+                'INSERT INTO sessions (time_stamp, num_incidences) VALUES (?, ?)',
+                (dt.datetime.now().isoformat(' '), len(lines))).lastrowid
+
+            rows = [(session_id, time_stamp.isoformat(' '), ERROR_LEVELS[level_code],
+                     type_data_station, check_type,
+                     None if error_message is None else str(error_message),
+                     None if file_path is None else str(file_path),
+                     self._store_figure(figures.get(index), session_id, index))
+                    for index, (time_stamp, level_code, type_data_station, check_type,
+                                error_message, file_path, _) in enumerate(lines)]
+
+            connection.executemany(
+                'INSERT INTO incidences (session_id, time_stamp, error_level, type_data_station, '
+                'check_type, error_message, file, figure) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+        return session_id
+
+    def _store_figure(self, buffer, session_id, index):
+        """
+        Writes the PNG in 'buffer' and returns its path relative to
+        'figures_path'. None if it is not stored
+        """
+        if buffer is None or not self.is_storing_figures:
+            return None
+
+        file_name = '{}_{}.png'.format(session_id, index)
+        try:
+            self.figures_path.mkdir(parents=True, exist_ok=True)
+            self.figures_path.joinpath(file_name).write_bytes(buffer.getvalue())
+        except OSError: # the session is saved without this figure
+            return None
+
+        return file_name
+
+    def figure_path(self, figure):
+        """
+        Absolute path of a figure referenced in the history
+        """
+        return self.figures_path.joinpath(figure).resolve()
+
+    @staticmethod
+    def _where(date_start=None, date_end=None, type_data_station=None, check_type=None,
+               error_level=None, min_error_level=None):
+        """
+        WHERE clause and its parameters. Dates are [date_start, date_end)
+        """
+        conditions, parameters = [], []
+
+        if date_start is not None:
+            conditions.append('time_stamp >= ?')
+            parameters.append(str(pd.Timestamp(date_start)))
+        if date_end is not None:
+            conditions.append('time_stamp < ?')
+            parameters.append(str(pd.Timestamp(date_end)))
+
+        for column, value in (('type_data_station', type_data_station),
+                              ('check_type', check_type),
+                              ('error_level', error_level)):
+            if value is None:
+                continue
+            values = [value] if isinstance(value, str) else list(value)
+            conditions.append('{} IN ({})'.format(column, ', '.join('?' * len(values))))
+            parameters.extend(values)
+
+        if min_error_level is not None:
+            levels = ERROR_LEVELS[ERROR_LEVELS.index(min_error_level):]
+            conditions.append('error_level IN ({})'.format(', '.join('?' * len(levels))))
+            parameters.extend(levels)
+
+        if not conditions:
+            return '', parameters
+
+        return 'WHERE ' + ' AND '.join(conditions), parameters
+
+    def query(self, **filters):
+        """
+        Returns the incidences as a pandas.DataFrame
+
+        Parameters
+        ----------
+        date_start, date_end : String or datetime, optional
+            Interval [date_start, date_end) of the time stamps
+        type_data_station, check_type, error_level : String or list, optional
+            Only these values
+        min_error_level : String, optional
+            Only this level and higher ones
+        """
+        where, parameters = self._where(**filters)
+
+        with closing(self._connect()) as connection:
+            df = pd.read_sql_query(
+                'SELECT {} FROM incidences {} ORDER BY time_stamp'.format(', '.join(INCIDENCE_COLUMNS), where),
+                connection, params=parameters)
+
+        df['time_stamp'] = pd.to_datetime(df['time_stamp'])
+        df['error_level'] = pd.Categorical(df['error_level'], categories=ERROR_LEVELS, ordered=True)
+
+        return df
+
+    def count(self, by=('type_data_station', 'check_type', 'error_level'), period=None, **filters):
+        """
+        Number of incidences grouped by the columns 'by' and, optionally, by
+        'period' ('day', 'month' or 'year'), computed by SQLite.
+        Filters are those of query()
+
+        Returns
+        -------
+        pandas.DataFrame with the columns of the groups and 'count'
+        """
+        columns = list(by)
+        if period is not None:
+            columns = ["strftime('{}', time_stamp) AS {}".format(PERIODS[period], period)] + columns
+
+        names = ([period] if period is not None else []) + list(by)
+        group = ', '.join(names)
+
+        where, parameters = self._where(**filters)
+
+        sql = 'SELECT {} COUNT(*) AS count FROM incidences {} {} {}'.format(
+            ''.join(column + ', ' for column in columns), where,
+            'GROUP BY ' + group if group else '', 'ORDER BY ' + group if group else '')
+
+        with closing(self._connect()) as connection:
+            return pd.read_sql_query(sql, connection, params=parameters)
+
+    def sessions(self):
+        with closing(self._connect()) as connection:
+            return pd.read_sql_query('SELECT * FROM sessions ORDER BY id', connection)
+
+
+def import_history_log(file_path=FILENAME_HISTORY_LOG, store=None):
+    """
+    Imports the tab-separated history of older versions as one session.
+    Its figures (repr's of io.BytesIO) are not kept
+
+    Returns
+    -------
+    session_id : int
+    """
+    if store is None:
+        store = get_history_store()
+
+    df = pd.read_csv(file_path, sep='\t', header=None, names=INCIDENCE_COLUMNS, dtype=str,
+                     keep_default_na=False)
+
+    lines = [(pd.Timestamp(time_stamp).to_pydatetime(), ERROR_LEVELS.index(error_level),
+              type_data_station, check_type or None, error_message or None, file or None, None)
+             for time_stamp, error_level, type_data_station, check_type, error_message, file, _
+             in df.itertuples(index=False)]
+
+    return store.add_session(lines)
+
+
+_history_store = None
+
+
+def get_history_store():
+    """
+    Returns the HistoryStore configured in settings
+    """
+    global _history_store
+
+    if _history_store is None:
+        _history_store = HistoryStore()
+
+    return _history_store
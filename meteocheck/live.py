@@ -0,0 +1,824 @@
+# -*- coding: utf-8 -*-
+"""
+Live checking of the files of today, while the stations write them.
+
+A LiveDay remembers the byte offset and the last moment checked of a file.
+Every poll parses only the lines appended since the previous one, and each
+check updates its running state (last values, rolling windows, integral,
+number of transitions, valleys in progress) with the new rows, so the cost
+of a poll is proportional to the new rows:
+
+    >>> live = LiveDay('geonica', [('check_range', {'column': 'DNI', 'minimum': 0, 'maximum': 1500}),
+    ...                            ('check_misalignment_geonica', {'column': 'DNI'})])
+    >>> live.poll()   # every minute or so
+    >>> live.finish() # at the end of the day
+
+The incidences have the same messages as the daily checks, listing only the
+samples found in each poll, and the per-sample flags of the day are in
+'flags'. Samples whose result depends on the next ones (e.g. the backfilled
+windows at the beginning of the day) are reported when these arrive, or by
+finish(). Checks that need the whole day, like the format or the
+comparisons with other sources, are left to the daily checking.
+
+run_live() polls the files of several stations, starting a new LiveDay
+every day. From CLI, with the same check plan as batch.py:
+
+    python -m meteocheck.live --plan plan.json --stations helios geonica
+"""
+import abc
+import argparse
+import datetime as dt
+import io
+import os
+import pickle
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import meteocheck.core as mc_core
+import meteocheck.batch as mc_batch
+import meteocheck.flags as mc_flags
+import meteocheck.solar_functions as mc_solar
+import meteocheck.config_meteo_stations as mc_meteo
+from meteocheck.settings import (MAX_ERROR_MESSAGE_LENGTH, NUM_VALLEYS_THRESHOLD, NUM_RADIATION_TRANSITIONS_THRESHOLD,
+                                 GHI_RADIATION_THRESHOLD, DRADIATION_DT, SAMPLING_TOLERANCE,
+                                 LIVE_POLL_INTERVAL, LIVE_STATE_PATH)
+
+
+class LiveDay:
+    """
+    Parameters
+    ----------
+    type_data_station : String
+        One of the supported meteo stations
+    checks : list
+        List of (name of the 'Checking' method, dict of arguments)
+    date : datetime.date, optional
+        Day of the file. Today by default
+    file_path : Path, optional
+        File of the day. Defaults to the one of the station (see
+        config_meteo_stations.meteo_file_path())
+    samples_per_hour : float, optional
+        Time resolution. Inferred from the first rows if None
+    """
+
+    def __init__(self, type_data_station, checks, date=None, file_path=None, samples_per_hour=None):
+        self.type_data_station = type_data_station
+        self.checks = checks
+        self.date = dt.date.today() if date is None else date
+        if file_path is None:
+            file_path = mc_meteo.meteo_file_path(self.date, type_data_station)
+        self.file_path = Path(file_path)
+        self.samples_per_hour = samples_per_hour
+        self.step = None if samples_per_hour is None else pd.Timedelta('1H') / samples_per_hour
+
+        # Bytes of the file already parsed, and its header
+        self.offset = 0
+        self.header = None
+        # Rows up to this moment are checked
+        self.last_moment = None
+        self.columns = None
+        self.is_finished = False
+
+        # Moments checked (int64), one array per poll
+        self._moments = []
+        # (name of the check, flagged moments or True, columns)
+        self._flagged = []
+        self._num_flagged = 0
+        # After a truncation, rows already checked are skipped silently until
+        # a new one is read
+        self._is_reading_again = False
+        # rows file of save(), its bytes and the moments and flagged saved in it
+        self._rows_path = None
+        self._rows_saved = (0, 0, 0)
+
+        checks_available = mc_core.registered_checks(mc_core.Checking)
+
+        self.monitors = []
+        for name_check, kwargs in checks:
+            if name_check not in checks_available:
+                self.report('Unknown check. Available checks: {}'.format(sorted(checks_available)),
+                            name_check, error_level='ERROR')
+            elif name_check not in MONITORS:
+                self.report('Not checked live, only in the daily checking', name_check, error_level='INFO')
+            else:
+                self.monitors.append(MONITORS[name_check](self, **kwargs))
+
+    def __len__(self):
+        return sum(len(moments) for moments in self._moments)
+
+    @property
+    def index(self):
+        """
+        DatetimeIndex of the rows checked
+        """
+        return pd.DatetimeIndex(np.concatenate(self._moments) if self._moments else [],
+                                dtype='datetime64[ns]')
+
+    @property
+    def flags(self):
+        """
+        flags.QCFlags of the rows checked
+        """
+        flags = mc_flags.QCFlags(self.index, self.columns or [])
+        for name_check, flagged, columns in self._flagged:
+            flags.set(name_check, flagged, columns)
+
+        return flags
+
+    #%% Reading
+    def poll(self):
+        """
+        Checks the complete lines appended to the file since the last poll.
+        Returns the number of new rows
+        """
+        if self.is_finished:
+            raise ValueError('The day {} of {} is finished'.format(self.date, self.type_data_station))
+
+        try:
+            size = self.file_path.stat().st_size
+        except FileNotFoundError: # not written yet
+            return 0
+
+        if size < self.offset:
+            self.report('File truncated from {} to {} bytes. Its rows after {} are checked'.format(
+                self.offset, size, self.last_moment), error_level='INFO')
+            self.offset, self.header = 0, None
+            self._is_reading_again = True
+
+        if size == self.offset:
+            return 0
+
+        with open(self.file_path, 'rb') as file_meteo:
+            file_meteo.seek(self.offset)
+            lines = file_meteo.read(size - self.offset)
+
+        # the last line may be being written
+        end = lines.rfind(b'\n') + 1
+        if end == 0:
+            return 0
+        lines = lines[:end]
+        self.offset += end
+
+        if self.header is None:
+            end_header = lines.index(b'\n') + 1
+            self.header, lines = lines[:end_header], lines[end_header:]
+            if not lines:
+                return 0
+
+        df = mc_meteo.read_meteo_file(io.BytesIO(self.header + lines), self.type_data_station)
+
+        return self.update(df)
+
+    def update(self, df):
+        """
+        Checks the rows of 'df' later than the last moment checked. Returns
+        the number of rows checked
+        """
+        moments = df.index.asi8
+        last = np.iinfo(np.int64).min if self.last_moment is None else self.last_moment.value
+
+        # every row must be later than all the previous ones
+        is_new = moments > np.maximum.accumulate(np.insert(moments[:-1], 0, last))
+        if not is_new.all():
+            if not self._is_reading_again:
+                self.report(lambda: 'Rows not later than the previous ones, not checked: {}'.format(
+                    df.index[~is_new]), 'check_time_index')
+            df = df[is_new]
+
+        if len(df) == 0:
+            return 0
+        self._is_reading_again = False
+
+        if self.columns is None:
+            self.columns = list(df.columns)
+        self._moments.append(df.index.asi8)
+        self.last_moment = df.index[-1]
+
+        if self.samples_per_hour is None:
+            sampling = mc_solar.infer_sampling(self.index)
+            if sampling.is_inferred:
+                self.samples_per_hour, self.step = sampling.samples_per_hour, sampling.step
+
+        for monitor in self.monitors:
+            self._run(monitor, monitor.update, df)
+
+        return len(df)
+
+    def finish(self):
+        """
+        Reports the samples whose result was waiting for the next ones. No
+        more rows are checked
+        """
+        if self.is_finished:
+            return
+
+        for monitor in self.monitors:
+            self._run(monitor, monitor.finish, None)
+
+        self.is_finished = True
+
+    def _run(self, monitor, method, df):
+        start_wall = time.perf_counter()
+        start_cpu = time.thread_time()
+        num_flagged = self._num_flagged
+        try:
+            method(df)
+        except Exception as e:
+            self.report('Check failed to run: {!r}'.format(e), monitor.name_check, error_level='ERROR')
+        finally:
+            mc_core.profile.append((dt.datetime.now(), str(self.type_data_station), monitor.name_check,
+                                    self.file_path, time.perf_counter() - start_wall,
+                                    time.thread_time() - start_cpu, 0 if df is None else len(df),
+                                    self._num_flagged - num_flagged, 0))
+
+    def report(self, error_message, check_type=None, error_level='WARNING', flagged=None, flagged_columns=None):
+        """
+        Adds a line to the log, as Checking.assertion_base() of a failed check
+        """
+        if flagged is not None:
+            self._flagged.append((check_type, flagged, flagged_columns))
+            self._num_flagged += 1 if flagged is True else len(flagged)
+
+        if callable(error_message):
+            error_message = error_message()
+        if len(error_message) > MAX_ERROR_MESSAGE_LENGTH:
+            error_message = error_message[:MAX_ERROR_MESSAGE_LENGTH] + ' [...]'
+
+        mc_core.add_line_log(error_level, check_type=check_type, error_message=error_message,
+                             type_data_station=self.type_data_station, file_path=self.file_path)
+
+    #%% State
+    def __getstate__(self):
+        # the moments and flags checked are appended to the rows file by save()
+        state = self.__dict__.copy()
+        state['_moments'], state['_flagged'] = [], []
+        return state
+
+    def save(self, file_path):
+        """
+        Writes the state, so the checking goes on from it (see load()). Only
+        the running state is written again. The moments and flags checked
+        since the last save are appended to a '.rows' file next to it
+        """
+        file_path = Path(file_path)
+        rows_path = file_path.with_suffix('.rows')
+
+        if rows_path != self._rows_path or not rows_path.is_file():
+            self._rows_path, self._rows_saved = rows_path, (0, 0, 0)
+        offset, num_moments, num_flagged = self._rows_saved
+
+        with open(rows_path, 'r+b' if offset else 'wb') as file:
+            # anything after the last state written is dropped
+            file.seek(offset)
+            file.truncate()
+            pickle.dump((self._moments[num_moments:], self._flagged[num_flagged:]), file,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+            self._rows_saved = (file.tell(), len(self._moments), len(self._flagged))
+
+        # replaced at once, so it always matches the rows file
+        temp_path = file_path.with_name(file_path.name + '.tmp')
+        with open(temp_path, 'wb') as file:
+            pickle.dump(self, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, file_path)
+
+    @classmethod
+    def load(cls, file_path):
+        with open(file_path, 'rb') as file:
+            live = pickle.load(file)
+
+        offset = live._rows_saved[0]
+        if offset:
+            live._rows_path = Path(file_path).with_suffix('.rows')
+            with open(live._rows_path, 'rb') as file:
+                while file.tell() < offset:
+                    moments, flagged = pickle.load(file)
+                    live._moments.extend(moments)
+                    live._flagged.extend(flagged)
+
+        return live
+
+
+#%% Running state of the checks
+class Monitor(abc.ABC):
+    """
+    Running state of a check of a LiveDay. update() checks the new rows and
+    finish() the samples still waiting at the end of the day
+    """
+    name_check = None
+
+    def __init__(self, live):
+        self.live = live
+
+    @abc.abstractmethod
+    def update(self, df):
+        pass
+
+    def finish(self, df=None):
+        pass
+
+
+class Backfilled:
+    """
+    Condition 'value < threshold' of a running result filled backwards, as
+    the daily checks do: samples with a NaN result wait for the next valid
+    one. Those still waiting at the end of the day fail
+    """
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        # values of the samples waiting
+        self.waiting = None
+
+    def update(self, values, result):
+        """
+        Values (pandas.Series) of the samples that fail, among the new ones
+        and those that were waiting, given the 'result' of the new ones
+        """
+        if self.waiting is not None:
+            result = np.concatenate([np.full(len(self.waiting), np.nan), result])
+            values = pd.concat([self.waiting, values])
+
+        # samples after the last valid result keep waiting
+        end = len(result) - np.argmax(~np.isnan(result[::-1])) if (~np.isnan(result)).any() else 0
+        self.waiting = values.iloc[end:]
+
+        is_passed = pd.Series(result[:end]).fillna(method='bfill').to_numpy() < self.threshold
+
+        return values.iloc[:end][~is_passed]
+
+    def finish(self):
+        values, self.waiting = self.waiting, None
+        return pd.Series([], dtype=np.float64) if values is None else values
+
+
+class TimeIndexMonitor(Monitor):
+    name_check = 'check_time_index'
+
+    def __init__(self, live):
+        super().__init__(live)
+        # moments (int64) waiting for the sampling step, the last one if it is known
+        self.moments = np.array([], dtype=np.int64)
+
+    def update(self, df):
+        self.moments = np.concatenate([self.moments, df.index.asi8])
+        if self.live.step is None:
+            return
+
+        step_ns = self.live.step.value
+        deltas = np.diff(self.moments)
+        is_gap = deltas > step_ns + int(SAMPLING_TOLERANCE * step_ns)
+        moments_after_gaps = pd.DatetimeIndex(self.moments[1:][is_gap])
+        num_missing = int((np.round(deltas[is_gap] / step_ns) - 1).sum())
+        self.moments = self.moments[-1:]
+
+        if len(moments_after_gaps):
+            self.live.report(
+                lambda: 'Index has {} missing moments in {} gaps of the sampling step {}. '
+                'Moments after the gaps: {}'.format(num_missing, len(moments_after_gaps), self.live.step,
+                                                    moments_after_gaps),
+                self.name_check, flagged=moments_after_gaps)
+
+
+class NullMonitor(Monitor):
+    name_check = 'check_null'
+
+    def __init__(self, live, column):
+        super().__init__(live)
+        self.column = column
+
+    def update(self, df):
+        is_null = df[self.column].isnull()
+
+        if is_null.any():
+            self.live.report(
+                lambda: 'Column "' + self.column + '" has some NaN values: ' + str(df[is_null].index),
+                self.name_check, flagged=df.index[is_null], flagged_columns=self.column)
+
+
+class RangeMonitor(Monitor):
+    name_check = 'check_range'
+
+    def __init__(self, live, column, minimum, maximum):
+        super().__init__(live)
+        self.column, self.minimum, self.maximum = column, minimum, maximum
+
+    def update(self, df):
+        condition_list = df[self.column].dropna().between(self.minimum, self.maximum)
+
+        if not condition_list.all():
+            self.live.report(
+                'Column "' + self.column + '" is not in range [' + str(self.minimum) + ', ' + str(self.maximum) + ']',
+                self.name_check, flagged=condition_list.index[~condition_list], flagged_columns=self.column)
+
+
+class PctChangeMonitor(Monitor):
+    """
+    Keeps the last 'window' values, filled forward as pandas.Series.pct_change()
+    """
+    name_check = 'check_pct_change'
+
+    def __init__(self, live, column, window, threshold_pct):
+        super().__init__(live)
+        self.column, self.window, self.threshold_pct = column, window, threshold_pct
+        self.previous = np.array([])
+        self.backfilled = Backfilled(threshold_pct)
+
+    def update(self, df):
+        values = pd.Series(np.concatenate([self.previous, df[self.column].to_numpy(dtype=np.float64)]))
+        pct_change = values.pct_change(self.window).abs().to_numpy()[len(self.previous):] * 100
+        self.previous = values.fillna(method='ffill').to_numpy()[-self.window:]
+
+        self._report(self.backfilled.update(df[self.column], pct_change))
+
+    def finish(self, df=None):
+        self._report(self.backfilled.finish())
+
+    def _report(self, flagged):
+        if len(flagged):
+            self.live.report(
+                lambda: 'Percent change [%] of column ' + self.column + ' is not in window of ' +
+                str(self.window) + ' samples and threshold ' + str(self.threshold_pct) +
+                '%. List of values: ' + mc_core.format_values(flagged),
+                self.name_check, flagged=flagged.index, flagged_columns=self.column)
+
+
+class AbsChangeMonitor(Monitor):
+    """
+    Keeps the last values of the longest window. Several windows are computed
+    together, as in Checking.check_abs_change()
+    """
+    name_check = 'check_abs_change'
+
+    def __init__(self, live, column, window, threshold):
+        super().__init__(live)
+        self.column = column
+        self.windows = [window] if np.isscalar(window) else list(window)
+        self.thresholds = [threshold] * len(self.windows) if np.isscalar(threshold) else list(threshold)
+        self.previous = np.array([])
+        self.backfilled = [Backfilled(threshold) for threshold in self.thresholds]
+
+    def update(self, df):
+        values = np.concatenate([self.previous, df[self.column].to_numpy(dtype=np.float64)])
+        rolling_ranges = mc_solar.rolling_ranges(values, self.windows)
+        num_previous = len(self.previous)
+        self.previous = values[max(0, len(values) - max(self.windows) + 1):]
+
+        for window, threshold, backfilled in zip(self.windows, self.thresholds, self.backfilled):
+            self._report(window, threshold, backfilled.update(df[self.column], rolling_ranges[window][num_previous:]))
+
+    def finish(self, df=None):
+        for window, threshold, backfilled in zip(self.windows, self.thresholds, self.backfilled):
+            self._report(window, threshold, backfilled.finish())
+
+    def _report(self, window, threshold, flagged):
+        if len(flagged):
+            self.live.report(
+                lambda: 'Absolute change of column ' + self.column + ' is not in window of ' + str(window) +
+                ' samples and threshold ' + str(threshold) + '. List of values: ' + mc_core.format_values(flagged),
+                self.name_check, flagged=flagged.index, flagged_columns=self.column)
+
+
+class DifferentialMonitor(Monitor):
+    """
+    Keeps the last value. The first sample of the day takes the differential
+    of the second one, so it waits for it
+    """
+    name_check = 'check_differential'
+
+    def __init__(self, live, column, threshold):
+        super().__init__(live)
+        self.column, self.threshold = column, threshold
+        self.last = None
+        self.first = None
+
+    def update(self, df):
+        values = df[self.column]
+        differential = np.diff(np.concatenate([[] if self.last is None else [self.last],
+                                               values.to_numpy(dtype=np.float64)]))
+        if self.last is None:
+            self.first, values = values.iloc[:1], values.iloc[1:]
+        self.last = df[self.column].iloc[-1]
+
+        if self.first is not None and len(differential):
+            values = pd.concat([self.first, values])
+            differential = np.concatenate([differential[:1], differential])
+            self.first = None
+
+        with np.errstate(invalid='ignore'):
+            self._report(values[~(np.abs(differential) < self.threshold)])
+
+    def finish(self, df=None):
+        if self.first is not None: # the differential of a single sample is NaN
+            self._report(self.first)
+            self.first = None
+
+    def _report(self, flagged):
+        if len(flagged):
+            self.live.report(
+                lambda: ('Differential change of column {}'.format(self.column) +
+                         'larger than threshold {}'.format(str(self.threshold)) +
+                         '. List of values: {}'.format(mc_core.format_values(flagged))),
+                self.name_check, flagged=flagged.index, flagged_columns=self.column)
+
+
+class TotalIrradiationMonitor(Monitor):
+    """
+    Running integral (trapezoidal rule) of the day, reported once when it
+    reaches the threshold
+    """
+    name_check = 'check_total_irradiation'
+
+    def __init__(self, live, column, total_irradiation_threshold):
+        super().__init__(live)
+        self.column, self.total_irradiation_threshold = column, total_irradiation_threshold
+        self.last = None
+        # sum of the pairs of consecutive samples, the integral in units of half a sample
+        self.sum_pairs = 0.
+        self.is_reported = False
+
+    def update(self, df):
+        values = np.concatenate([[] if self.last is None else [self.last],
+                                 df[self.column].to_numpy(dtype=np.float64)])
+        self.sum_pairs += (values[1:] + values[:-1]).sum()
+        self.last = values[-1]
+
+        if self.is_reported or self.live.samples_per_hour is None:
+            return
+
+        irradiation = self.sum_pairs / self.live.samples_per_hour / 2 / 1000 # [kWh]
+
+        if not irradiation < self.total_irradiation_threshold:
+            self.is_reported = True
+            self.live.report(
+                'Total irradiation (daily) from "' + self.column + '" is {:.2f}. '.format(irradiation) +
+                'This is higher than the threshold: ' + str(self.total_irradiation_threshold),
+                self.name_check, flagged=True, flagged_columns=self.column)
+
+
+class MisalignmentMonitor(Monitor):
+    """
+    Keeps the samples from the last flat one with a known differential,
+    since valleys only start after a flat sample. A valley is counted when
+    the differential of the flat sample that closes it is known (see
+    solar_functions.valleys_radiation())
+    """
+    name_check = 'check_misalignment_geonica'
+
+    def __init__(self, live, column):
+        super().__init__(live)
+        self.column = column
+        self.values = np.array([])
+        self.moments = np.array([], dtype=np.int64)
+        self.num_valleys = 0
+        # moments of the samples of the valleys not reported yet
+        self.moments_misalign = []
+
+    def update(self, df):
+        self.values = np.concatenate([self.values, df[self.column].to_numpy(dtype=np.float64)])
+        self.moments = np.concatenate([self.moments, df.index.asi8])
+
+        if len(self.values) < 3:
+            return
+
+        # the differential of the last sample is not known yet
+        self._count(last_end=len(self.values) - 2)
+
+        with np.errstate(invalid='ignore'):
+            flat = np.flatnonzero(np.abs(np.diff(self.values)) <= DRADIATION_DT)
+        if len(flat):
+            self.values, self.moments = self.values[flat[-1]:], self.moments[flat[-1]:]
+
+    def finish(self, df=None):
+        if len(self.values) >= 2:
+            self._count(last_end=len(self.values) - 1)
+
+    def _count(self, last_end):
+        """
+        Counts the valleys that end up to the position 'last_end'
+        """
+        start, length = mc_solar.find_valleys(self.values, np.zeros(len(self.values), dtype=np.int64))
+
+        is_counted = start + length - 1 <= last_end
+        start, length = start[is_counted], length[is_counted]
+        if len(start) == 0:
+            return
+
+        offsets = np.arange(length.sum()) - np.repeat(np.cumsum(length) - length, length)
+        positions = np.repeat(start, length) + offsets
+        self.num_valleys += len(start)
+        self.moments_misalign.append(pd.Series(self.values[positions], index=pd.DatetimeIndex(self.moments[positions]),
+                                               name=self.column))
+
+        if self.num_valleys < NUM_VALLEYS_THRESHOLD:
+            return
+
+        flagged = pd.concat(self.moments_misalign)
+        self.moments_misalign = []
+
+        self.live.report(
+            lambda: ('Possible misalignment in Geonica direct radiation due to ' +
+                     'the number of suspicious valleys ({})'.format(self.num_valleys) +
+                     ' larger than threshold, {}'.format(NUM_VALLEYS_THRESHOLD) +
+                     '. List of values: {}'.format(mc_core.format_values(flagged))),
+            self.name_check, flagged=flagged.index, flagged_columns=self.column)
+
+
+class CoherenceRadiationMonitor(Monitor):
+    """
+    Counts the radiation transitions of GHI as they arrive. Once they reach
+    NUM_RADIATION_TRANSITIONS_THRESHOLD the day is cloudy and the coherence
+    is not checked any more. Before, the incoherent samples are reported,
+    even if the day turns out cloudy later (and its daily checking only
+    reports it as INFO)
+    """
+    name_check = 'check_coherence_radiation'
+
+    def __init__(self, live, threshold_pct, dni, ghi, dhi, radiation_threshold=None):
+        super().__init__(live)
+        self.threshold_pct, self.dni, self.ghi, self.dhi = threshold_pct, dni, ghi, dhi
+        self.last = None
+        self.is_first_differential = True
+        self.num_radiation_transitions = 0
+        self.is_cloudy = False
+
+    def update(self, df):
+        values = np.concatenate([[] if self.last is None else [self.last],
+                                 df[self.ghi].to_numpy(dtype=np.float64)])
+        self.last = values[-1]
+
+        with np.errstate(invalid='ignore'):
+            is_transition = np.diff(values) > DRADIATION_DT
+        # the first sample of the day takes the differential of the second one
+        if self.is_first_differential and len(is_transition):
+            is_transition = np.concatenate([is_transition[:1], is_transition])
+            self.is_first_differential = False
+        self.num_radiation_transitions += int(is_transition.sum())
+
+        if self.is_cloudy:
+            return
+
+        if self.num_radiation_transitions >= NUM_RADIATION_TRANSITIONS_THRESHOLD:
+            self.is_cloudy = True
+            self.live.report(
+                'Radiation coherence based on GHI not checked because the number of cloudy moments={} '
+                '[with a DRADIATION_DT={}] is higher than threshold={}'.format(
+                    self.num_radiation_transitions, DRADIATION_DT, NUM_RADIATION_TRANSITIONS_THRESHOLD),
+                self.name_check, error_level='INFO')
+            return
+
+        df_filt = df[df[self.ghi] > GHI_RADIATION_THRESHOLD]
+        if len(df_filt) == 0:
+            return
+
+        _, Zz = mc_solar.solpos(df_filt.index)
+        ghi_model = df_filt[self.dhi] + df_filt[self.dni] * np.cos(np.atleast_1d(Zz))
+
+        condition_list = ((df_filt[self.ghi] - ghi_model).abs()) / df_filt[self.ghi] * 100 < self.threshold_pct
+
+        if not condition_list.all():
+            self.live.report(
+                lambda: 'No coherence between radiations considering a percentage threshold of GHI {}% in {}'.format(
+                    self.threshold_pct, df_filt[~condition_list].index),
+                self.name_check, flagged=df_filt.index[~condition_list], flagged_columns=[self.dni, self.ghi, self.dhi])
+
+
+# {name of the check: Monitor of its running state}
+MONITORS = {monitor.name_check: monitor for monitor in [
+    TimeIndexMonitor, NullMonitor, RangeMonitor, PctChangeMonitor, AbsChangeMonitor, DifferentialMonitor,
+    TotalIrradiationMonitor, MisalignmentMonitor, CoherenceRadiationMonitor]}
+
+
+#%% Polling
+def state_file_path(type_data_station, date, state_path=LIVE_STATE_PATH):
+    """
+    File of the state of the LiveDay of a station and date
+    """
+    return Path(os.getcwd(), state_path, '{}_{}.pickle'.format(type_data_station, date))
+
+
+def open_live_day(type_data_station, checks, date=None, state_path=LIVE_STATE_PATH):
+    """
+    LiveDay of a station and date (today by default), going on from its
+    saved state if there is one with the same checks
+    """
+    date = dt.date.today() if date is None else date
+    file_path = state_file_path(type_data_station, date, state_path)
+
+    if file_path.is_file():
+        try:
+            live = LiveDay.load(file_path)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+            mc_core.add_line_log('INFO', error_message='State of the live checking not read: {!r}'.format(e),
+                                 type_data_station=type_data_station, file_path=file_path)
+        else:
+            if live.checks == checks:
+                return live
+
+    return LiveDay(type_data_station, checks, date=date)
+
+
+def run_live(check_plan, stations=None, poll_interval=LIVE_POLL_INTERVAL, state_path=LIVE_STATE_PATH,
+             num_polls=None):
+    """
+    Polls the files of today of the stations of 'check_plan' every
+    'poll_interval' seconds. After a poll with incidences, the log is
+    finished (see core.finish_log()) and started again. The state of every
+    file is saved after each poll, and at midnight the day is finished and
+    the new file is checked.
+
+    Parameters
+    ----------
+    check_plan : dict
+        {type_data_station: [(name of the check, dict of arguments), ...]}
+    stations : list, optional
+        Subset of the stations of 'check_plan' to check
+    poll_interval : float
+        Seconds between the beginnings of the polls
+    state_path : String
+        Directory of the saved states. Not saved if None
+    num_polls : int, optional
+        Number of polls. Endless if None
+
+    Returns
+    -------
+    live_days : dict
+        {type_data_station: LiveDay of the last poll}
+    """
+    if stations is None:
+        stations = list(check_plan)
+
+    if state_path is not None:
+        Path(os.getcwd(), state_path).mkdir(parents=True, exist_ok=True)
+
+    live_days = {}
+    num_poll = 0
+
+    try:
+        while num_polls is None or num_poll < num_polls:
+            start = time.monotonic()
+            today = dt.date.today()
+
+            for station in stations:
+                live = live_days.get(station)
+                if live is None or live.date != today:
+                    if live is not None:
+                        poll_live_day(live) # the last lines of the day
+                        live.finish()
+                        save_live_day(live, state_path)
+                    live = live_days[station] = open_live_day(station, check_plan[station], date=today,
+                                                              state_path=state_path)
+                poll_live_day(live)
+                save_live_day(live, state_path)
+
+            if mc_core.log.is_error_level_reached('WARNING'):
+                mc_core.finish_log(date=today)
+                mc_core.log.clear()
+
+            num_poll += 1
+            if num_polls is None or num_poll < num_polls:
+                time.sleep(max(0., poll_interval - (time.monotonic() - start)))
+    except KeyboardInterrupt:
+        pass
+
+    mc_core.finish_log(date=dt.date.today())
+
+    return live_days
+
+
+def poll_live_day(live):
+    """
+    Polls a LiveDay, logging the errors of reading its file
+    """
+    try:
+        live.poll()
+    except (OSError, ValueError) as e:
+        live.report('File not read: {!r}'.format(e), error_level='ERROR')
+
+
+def save_live_day(live, state_path=LIVE_STATE_PATH):
+    """
+    Saves the state of a LiveDay in 'state_path', if it is not None
+    """
+    if state_path is not None:
+        live.save(state_file_path(live.type_data_station, live.date, state_path))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='meteocheck.live',
+                                     description='Checks the files of today of meteo stations while they are written')
+    parser.add_argument('--plan', required=True,
+                        help='JSON file with {type_data_station: [[check, {arguments}], ...]}')
+    parser.add_argument('--stations', nargs='+', help='stations of the plan to check (default: all)')
+    parser.add_argument('--interval', type=float, default=LIVE_POLL_INTERVAL,
+                        help='seconds between polls (default: {})'.format(LIVE_POLL_INTERVAL))
+
+    args = parser.parse_args(argv)
+
+    run_live(mc_batch.read_check_plan(args.plan), stations=args.stations, poll_interval=args.interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1028 @@
+# -*- coding: utf-8 -*-
+"""
+Checking of several days of a meteo station at once.
+
+MultiDayChecking has the same checks as 'Checking', but each one is computed
+for every day in a single vectorized pass over a contiguous multi-day frame
+(segmented differences, integrals and counts by day). The incidences of each
+day are logged from these results with the same messages as if each day were
+checked separately, and messages and figures are only built for the days
+that fail. Daily irradiations close to a threshold, whose segmented sum may
+be rounded differently, are integrated again for those days only.
+
+Frames whose days are not contiguous (unsorted index) and other sources with
+repeated moments are checked day by day with the single-day 'Checking'.
+
+Incidences take the file of their day in the 'file' column of the log or,
+if it is unknown (frames given by the user), the day itself. The per-sample
+flags of every check are gathered in 'flags'.
+"""
+import functools
+
+import numpy as np
+import pandas as pd
+
+import meteocheck.solar_functions as mc_solar
+import meteocheck.figures as mc_fig
+import meteocheck.flags as mc_flags
+import meteocheck.config_meteo_stations as mc_meteo
+from meteocheck.core import Checking, add_line_log, finish_log, check, count_flagged, format_values
+from meteocheck.settings import (NUM_RADIATION_TRANSITIONS_THRESHOLD, DNI_RADIATION_THRESHOLD,
+                                 GHI_RADIATION_THRESHOLD, DAILY_IRRADIATION_THRESHOLD,
+                                 DRADIATION_DT, NUM_VALLEYS_THRESHOLD, MAX_ERROR_MESSAGE_LENGTH)
+
+# Relative tolerance when comparing integrals with thresholds. Days closer than it
+# to a threshold are checked individually, so rounding never hides an incidence
+TOLERANCE = 1e-9
+
+
+def segmented(function):
+    """
+    Decorator of the checks of MultiDayChecking that are computed from
+    segmented results. Frames whose days are not contiguous are checked
+    day by day
+    """
+    @functools.wraps(function)
+    def wrapper(self, *args, **kwargs):
+        if not self.is_segmented:
+            return self._report(np.ones(self.num_days, dtype=bool), function.__name__, *args, **kwargs)
+        return function(self, *args, **kwargs)
+
+    return wrapper
+
+
+class MultiDayChecking:
+    """
+    Parameters
+    ----------
+    type_data_station : String
+        Text describing the data station
+    df : pandas.DataFrame
+        Data of several days, with a chronological DatetimeIndex
+    samples_per_hour : float, optional
+        Time resolution. Inferred from the index if None
+    file_paths : dict, optional
+        {day (pandas.Timestamp at midnight): Path of its file}
+    finish_log_on_error : bool, default=True
+        If False, CRITICAL errors raise without finishing the log
+    """
+
+    def __init__(self, type_data_station, df, samples_per_hour=None, file_paths=None,
+                 finish_log_on_error=True):
+        self.type_data_station = type_data_station
+        self.df = df
+        self.file_paths = {} if file_paths is None else file_paths
+        self.finish_log_on_error = finish_log_on_error
+
+        add_line_log('INFO', error_message="Analyzing meteo data of type '{}' from {} to {}".format(
+                         self.type_data_station, df.index.min(), df.index.max()),
+                     type_data_station=self.type_data_station)
+
+        if samples_per_hour is None:
+            try:
+                samples_per_hour = mc_solar.infer_sampling(self.df.index).samples_per_hour
+            except TypeError:
+                samples_per_hour = None
+
+            if samples_per_hour is None:
+                add_line_log('CRITICAL', error_message="The 'Samples per hour' of the 'df' cannot be infered", type_data_station=self.type_data_station)
+                if self.finish_log_on_error:
+                    finish_log()
+                raise ValueError("The 'Samples per hour' of the 'df' cannot be infered")
+        self.samples_per_hour = samples_per_hour
+
+        # Segments of days
+        self.day_codes, self.days = pd.factorize(self.df.index.normalize())
+        self.num_days = len(self.days)
+        # Segmented operations need each day to be contiguous, otherwise every
+        # day is checked individually
+        self.is_segmented = self.df.index.is_monotonic_increasing
+
+        boundaries = np.flatnonzero(np.diff(self.day_codes)) + 1
+        self.day_start = np.concatenate([[0], boundaries])
+        self.day_stop = np.concatenate([boundaries, [len(self.df)]])
+
+        self._features = {}
+        # flags.QCFlags of the samples of 'df'
+        self.flags = mc_flags.QCFlags(self.df.index, self.df.columns)
+
+    @classmethod
+    def from_files(cls, type_data_station, date_start, date_end, finish_log_on_error=True):
+        """
+        Opens the files of a supported meteo station from 'date_start' to 'date_end'
+        (both included). Missing files are logged as CRITICAL and skipped.
+        """
+        frames, file_paths = [], {}
+
+        for date in pd.date_range(date_start, date_end, freq='D'):
+            try:
+                df, file_path = mc_meteo.open_meteo_file(date.date(), type_data_station)
+            except OSError as e:
+                add_line_log('CRITICAL', error_message=e, type_data_station=type_data_station)
+                continue
+            frames.append(df)
+            file_paths[date] = file_path
+
+        if not frames:
+            raise OSError('No file of type={} from {} to {} can be opened'.format(
+                type_data_station, date_start, date_end))
+
+        return cls(type_data_station, pd.concat(frames), file_paths=file_paths,
+                   finish_log_on_error=finish_log_on_error)
+
+    #%% Days
+    def day_frame(self, code_day):
+        return self.df.iloc[self.day_start[code_day]:self.day_stop[code_day]]
+
+    def day_rows(self, code_day):
+        """
+        Rows of the day with code 'code_day': a slice or their positions
+        """
+        if self.is_segmented:
+            return slice(self.day_start[code_day], self.day_stop[code_day])
+        return np.flatnonzero(self.day_codes == code_day)
+
+    def day_checking(self, code_day):
+        """
+        Single-day Checking of the day with code 'code_day'
+        """
+        day = self.days[code_day]
+        df_day = self.df.iloc[self.day_rows(code_day)]
+
+        return Checking.from_frame(df_day, self.type_data_station, self.samples_per_hour,
+                                   file_path=self.file_paths.get(day, day.date()), date=day.date())
+
+    def _report(self, is_candidate, name_check, *args, **kwargs):
+        """
+        Runs the single-day check 'name_check' on the candidate days, so they
+        log their incidences. Series with a DatetimeIndex in the arguments
+        (other sources) are sliced to the day. Only used when the days cannot
+        be checked from segmented results
+        """
+        for code_day in np.flatnonzero(is_candidate):
+            day = self.days[code_day]
+            next_day = day + pd.Timedelta('1D')
+
+            def slice_day(argument):
+                if isinstance(argument, pd.Series) and isinstance(argument.index, pd.DatetimeIndex):
+                    return argument[(argument.index >= day) & (argument.index < next_day)]
+                return argument
+
+            args_day = [slice_day(argument) for argument in args]
+            kwargs_day = {key: slice_day(argument) for key, argument in kwargs.items()}
+
+            checking = self.day_checking(code_day)
+            getattr(checking, name_check)(*args_day, **kwargs_day)
+
+            if checking._flags is not None:
+                self.flags.update(self.day_rows(code_day), checking.flags)
+
+    def _assertion(self, code_day, error_message, check_type, error_level='WARNING', figure=None,
+                   num_flagged=None):
+        """
+        Adds the line of a check that failed in the day with code 'code_day',
+        as Checking.assertion_base() of that day. The flags of every day are
+        set at once by the checks
+        """
+        count_flagged(1 if num_flagged is None else num_flagged)
+
+        if len(error_message) > MAX_ERROR_MESSAGE_LENGTH:
+            error_message = error_message[:MAX_ERROR_MESSAGE_LENGTH] + ' [...]'
+
+        day = self.days[code_day]
+        add_line_log(
+            error_level=error_level,
+            check_type=check_type,
+            error_message=error_message,
+            type_data_station=self.type_data_station,
+            file_path=self.file_paths.get(day, day.date()),
+            figure=figure)
+
+    def _figure_flagged(self, title, series, is_flagged):
+        figure = mc_fig.FigureSpec(title=title, suptitle=self.type_data_station)
+        figure.plot(series, style='.')
+        figure.plot(series, mask=is_flagged, style='rP')
+
+        return figure
+
+    def _by_moments(self, is_flagged):
+        """
+        Samples flagged by their moments, as flags.QCFlags.set() of a boolean
+        pandas.Series: repeated moments are flagged together
+        """
+        if self.df.index.is_unique:
+            return is_flagged
+        return self.df.index.isin(self.df.index[is_flagged])
+
+    def _assert_samples(self, name_check, is_flagged, flagged_columns, error_message, title=None,
+                        by_moments=True):
+        """
+        Lines of a check of every sample in the days with some 'is_flagged'
+        sample (aligned with 'df'). 'error_message' is called with the rows of
+        a failing day and its flagged samples. If 'title' is given, the figure
+        shows 'flagged_columns[0]' with the flagged samples
+        """
+        is_flagged = np.asarray(is_flagged, dtype=bool)
+        num_flagged = np.bincount(self.day_codes[is_flagged], minlength=self.num_days)
+
+        self.flags.set(name_check, self._by_moments(is_flagged) if by_moments else is_flagged, flagged_columns)
+
+        for code_day in np.flatnonzero(num_flagged):
+            rows = self.day_rows(code_day)
+            is_flagged_day = is_flagged[rows]
+
+            figure = None
+            if title is not None:
+                figure = self._figure_flagged(title, self.df[flagged_columns[0]].iloc[rows], is_flagged_day)
+
+            self._assertion(code_day, error_message(rows, is_flagged_day), name_check,
+                            figure=figure, num_flagged=num_flagged[code_day])
+
+    def _assert_filtered(self, name_check, is_filt, condition_list, num_radiation_transitions_value,
+                         flagged_columns, error_message, info_message, figure):
+        """
+        Lines of the coherence checks of the filtered samples 'is_filt' (aligned
+        with 'df') of each day: a WARNING if some of them fail 'condition_list'
+        and the day has less than NUM_RADIATION_TRANSITIONS_THRESHOLD
+        radiation transitions, an INFO if it has more. Days without filtered
+        samples are not checked.
+
+        'error_message' and 'figure' are called with the rows of a day, its
+        filtered samples and which of them are flagged (selected as the
+        single-day check does, so the moments keep the same frequency),
+        'info_message' with the number of transitions of the day
+        """
+        is_flagged = is_filt & ~np.asarray(condition_list, dtype=bool)
+        num_flagged = np.bincount(self.day_codes[is_flagged], minlength=self.num_days)
+        has_filt = self._any_by_day(is_filt)
+        is_checked = num_radiation_transitions_value < NUM_RADIATION_TRANSITIONS_THRESHOLD
+
+        self.flags.set(name_check, self._by_moments(is_flagged & is_checked[self.day_codes]), flagged_columns)
+
+        for code_day in np.flatnonzero(has_filt & (~is_checked | (num_flagged > 0))):
+            rows = self.day_rows(code_day)
+            is_filt_day = is_filt[rows]
+            is_flagged_day = is_flagged[rows][is_filt_day]
+
+            figure_day = figure(rows, is_filt_day, is_flagged_day) if num_flagged[code_day] else None
+
+            if is_checked[code_day]:
+                self._assertion(code_day, error_message(rows, is_filt_day, is_flagged_day), name_check,
+                                figure=figure_day, num_flagged=num_flagged[code_day])
+            else:
+                self._assertion(code_day, info_message(num_radiation_transitions_value[code_day]),
+                                name_check, error_level='INFO', figure=figure_day, num_flagged=0)
+
+    def _assert_irradiation_pair(self, name_check, is_candidate, irradiations, num_radiation_transitions_value,
+                                 threshold_pct, flagged_columns, error_message, info_message, figure):
+        """
+        Lines of the comparisons of the daily irradiation of two sources, in
+        the candidate days. 'irradiations' is called with the code of a day and
+        returns both irradiations as daily_irradiation(). Days with less than
+        DAILY_IRRADIATION_THRESHOLD are not checked.
+
+        A WARNING if they differ in more than 'threshold_pct' and the day has
+        less than NUM_RADIATION_TRANSITIONS_THRESHOLD radiation transitions,
+        an INFO if it has more. 'error_message' is called with the difference
+        [%], 'info_message' with the number of transitions and 'figure' with
+        the code of the day
+        """
+        is_flagged = np.zeros(self.num_days, dtype=bool)
+
+        for code_day in np.flatnonzero(is_candidate):
+            irradiation, irradiation_other = irradiations(code_day)
+
+            if irradiation < DAILY_IRRADIATION_THRESHOLD:
+                continue
+
+            diff_radiation = abs(irradiation - irradiation_other) / irradiation * 100
+            condition_list = diff_radiation < threshold_pct
+            figure_day = None if condition_list else figure(code_day)
+
+            if num_radiation_transitions_value[code_day] < NUM_RADIATION_TRANSITIONS_THRESHOLD:
+                if not condition_list:
+                    is_flagged[code_day] = True
+                    self._assertion(code_day, error_message(diff_radiation), name_check, figure=figure_day)
+            else:
+                self._assertion(code_day, info_message(num_radiation_transitions_value[code_day]),
+                                name_check, error_level='INFO', figure=figure_day, num_flagged=0)
+
+        self.flags.set(name_check, is_flagged[self.day_codes], flagged_columns)
+
+    def _join_other_source(self, column, other_radiation, label_other):
+        """
+        'column' joined with the other source on their common moments, as
+        Checking.joined_other_source(), and the position of every row of 'df'
+        in it (-1 if the moment is not in the other source). None if some
+        moment is repeated, so the join is not aligned with 'df'
+        """
+        if not (self.df.index.is_unique and other_radiation.index.is_unique):
+            return None, None
+
+        df_joined = self.df[[column]].join(other_radiation.rename(other_radiation.name + label_other),
+                                           how='inner')
+
+        is_joined = self.df.index.isin(other_radiation.index)
+        positions_joined = np.where(is_joined, np.cumsum(is_joined) - 1, -1)
+
+        return df_joined, positions_joined
+
+    @staticmethod
+    def _joined_rows(positions_joined, rows):
+        """
+        Slice of the joined rows of the rows 'rows' (a slice) of 'df'
+        """
+        positions = positions_joined[rows]
+        positions = positions[positions >= 0]
+        if len(positions) == 0:
+            return slice(0, 0)
+        return slice(positions[0], positions[-1] + 1)
+
+    #%% Segmented quantities
+    def _feature(self, key, compute):
+        try:
+            return self._features[key]
+        except KeyError:
+            value = self._features[key] = compute()
+            return value
+
+    def _any_by_day(self, mask, day_codes=None):
+        if day_codes is None:
+            day_codes = self.day_codes
+        return np.bincount(day_codes[np.asarray(mask, dtype=bool)], minlength=self.num_days) > 0
+
+    def _all_by_day(self, mask, day_codes=None):
+        return ~self._any_by_day(~np.asarray(mask, dtype=bool), day_codes)
+
+    def _position_in_day(self):
+        return self._feature(
+            ('position_in_day',),
+            lambda: np.arange(len(self.df)) - np.repeat(self.day_start, self.day_stop - self.day_start))
+
+    def _day_codes_of(self, index):
+        return self.days.get_indexer(index.normalize())
+
+    def _irradiation_by_day(self, values, day_codes):
+        """
+        Trapezoidal integral of each day [kWh], as daily_irradiation()
+        """
+        values = np.asarray(values, dtype=np.float64)
+        is_pair = day_codes[1:] == day_codes[:-1]
+        trapezoids = (values[1:] + values[:-1]) / 2
+
+        return np.bincount(day_codes[:-1][is_pair], weights=trapezoids[is_pair],
+                           minlength=self.num_days) / self.samples_per_hour / 1000
+
+    def _transitions_by_day(self, values, day_codes, dradiation_dt=DRADIATION_DT):
+        """
+        Number of radiation transitions of each day, as num_radiation_transitions()
+        """
+        values = np.asarray(values, dtype=np.float64)
+        num_values = len(values)
+
+        d_radiation = np.full(num_values, np.nan)
+        d_radiation[1:] = values[1:] - values[:-1]
+
+        is_first = np.ones(num_values, dtype=bool)
+        is_first[1:] = day_codes[1:] != day_codes[:-1]
+        has_next = np.zeros(num_values, dtype=bool)
+        has_next[:-1] = day_codes[1:] == day_codes[:-1]
+
+        # the first differential of each day takes the second one
+        first = np.flatnonzero(is_first)
+        d_radiation[first[has_next[first]]] = d_radiation[first[has_next[first]] + 1]
+        d_radiation[first[~has_next[first]]] = np.nan # days with less than 2 samples
+
+        with np.errstate(invalid='ignore'):
+            is_transition = d_radiation > dradiation_dt
+
+        return np.bincount(day_codes[is_transition], minlength=self.num_days)
+
+    def radiation_transitions(self, column, radiation_threshold=None):
+        def compute():
+            values = self.df[column].to_numpy(dtype=np.float64)
+            if radiation_threshold is None:
+                return self._transitions_by_day(values, self.day_codes)
+            with np.errstate(invalid='ignore'):
+                is_filt = values > radiation_threshold
+            return self._transitions_by_day(values[is_filt], self.day_codes[is_filt])
+
+        return self._feature(('radiation_transitions', column, radiation_threshold), compute)
+
+    def irradiation(self, column):
+        return self._feature(('irradiation', column),
+                             lambda: self._irradiation_by_day(self.df[column], self.day_codes))
+
+    def day_irradiation(self, column, code_day):
+        """
+        Irradiation of a day as the single-day Checking.irradiation(), whose
+        rounding may differ from the segmented one
+        """
+        return mc_solar.daily_irradiation(self.df[column].iloc[self.day_rows(code_day)],
+                                          samples_per_hour=self.samples_per_hour)
+
+    def differential(self, column):
+        def compute():
+            values = self.df[column].to_numpy(dtype=np.float64)
+            differential = np.full(len(values), np.nan)
+            differential[1:] = values[1:] - values[:-1]
+
+            is_long = self.day_stop - self.day_start > 1
+            differential[self.day_start[is_long]] = differential[self.day_start[is_long] + 1]
+            differential[self.day_start[~is_long]] = np.nan
+
+            return differential
+
+        return self._feature(('differential', column), compute)
+
+    def _bfill_by_day(self, series):
+        return series.groupby(self.day_codes).bfill()
+
+    #%% Checks
+    @check
+    @segmented
+    def check_total_irradiation(self, column, total_irradiation_threshold):
+
+        name_check_function = self.current_check
+
+        irradiation = self.irradiation(column)
+
+        # days close to the threshold are integrated again as a single day
+        tolerance = TOLERANCE * max(1, abs(total_irradiation_threshold))
+        is_flagged = np.zeros(self.num_days, dtype=bool)
+
+        for code_day in np.flatnonzero(~(irradiation < total_irradiation_threshold - tolerance)):
+            irradiation_day = self.day_irradiation(column, code_day)
+
+            if not irradiation_day < total_irradiation_threshold:
+                is_flagged[code_day] = True
+                self._assertion(
+                    code_day,
+                    error_message='Total irradiation (daily) from "' +
+                    column +
+                    '" is {:.2f}. '.format(irradiation_day) +
+                    'This is higher than the threshold: ' +
+                    str(total_irradiation_threshold),
+                    check_type=name_check_function)
+
+        self.flags.set(name_check_function, is_flagged[self.day_codes], column)
+
+    @check
+    @segmented
+    def check_format(self, num_columns):
+
+        name_check_function = self.current_check
+
+        num_moments = self.samples_per_hour * 24
+        lengths = self.day_stop - self.day_start
+
+        is_wrong_shape = lengths != num_moments
+        if self.df.shape[1] != num_columns:
+            is_wrong_shape[:] = True
+
+        # dtypes are the same in every day
+        columns_not_numerical = [column for column in self.df.columns if self.df.dtypes[column] != np.float64]
+
+        is_failing = is_wrong_shape.copy()
+        if columns_not_numerical:
+            is_failing[:] = True
+            self.flags.set(name_check_function, True, columns_not_numerical)
+
+        for code_day in np.flatnonzero(is_failing):
+            if is_wrong_shape[code_day]:
+                shape = (int(lengths[code_day]), self.df.shape[1])
+                error_message = 'Wrong dimensions: ' + \
+                    str(shape) + '. It should be: ' + str((num_moments, num_columns))
+
+                if shape[0] != num_moments:
+                    sampling = mc_solar.infer_sampling(self.df.index[self.day_rows(code_day)])
+                    error_message += '. Missing moments: {} in {} gaps. Repeated moments: {}'.format(
+                        sampling.num_missing, len(sampling.gaps), sampling.duplicated.sum())
+
+                self._assertion(code_day, error_message, name_check_function, error_level='ERROR')
+
+            for column in columns_not_numerical:
+                self._assertion(code_day, 'Column "' + column + '" is not numerical [np.float64]',
+                                name_check_function, error_level='ERROR')
+
+    @check
+    @segmented
+    def check_time_index(self):
+
+        name_check_function = self.current_check
+
+        # days with repeated or missing (or irregular) moments. Their sampling
+        # is inferred as a single day, as it may differ from the one of 'df'
+        deltas = np.diff(self.df.index.asi8)
+        is_same_day = self.day_codes[1:] == self.day_codes[:-1]
+
+        is_candidate = self._any_by_day((deltas == 0) & is_same_day, self.day_codes[1:])
+        is_irregular = (deltas != pd.Timedelta('1H').value / self.samples_per_hour) & is_same_day
+        is_candidate |= self._any_by_day(is_irregular, self.day_codes[1:])
+
+        flagged = np.zeros(len(self.df), dtype=bool)
+
+        for code_day in np.flatnonzero(is_candidate):
+            rows = self.day_rows(code_day)
+            index = self.df.index[rows]
+            sampling = mc_solar.infer_sampling(index)
+
+            if sampling.duplicated.any():
+                flagged[rows] |= sampling.duplicated
+                self._assertion(code_day, 'Index not unique. Duplicates: ' + str(index[sampling.duplicated]),
+                                name_check_function, num_flagged=sampling.duplicated.sum())
+
+            if sampling.is_inferred and len(sampling.gaps) > 0:
+                flagged[self.day_start[code_day] + sampling.gaps] = True
+                self._assertion(code_day, 'Index has {} missing moments in {} gaps of the sampling step {}. '
+                                'Moments after the gaps: {}'.format(
+                                    sampling.num_missing, len(sampling.gaps), sampling.step, index[sampling.gaps]),
+                                name_check_function, num_flagged=sampling.num_missing)
+
+        # the index of 'df' is monotonic and all dates
+        self.flags.set(name_check_function, flagged)
+
+    @check
+    @segmented
+    def check_null(self, column):
+
+        name_check_function = self.current_check
+
+        self._assert_samples(
+            name_check_function, self.df[column].isnull(), [column],
+            lambda rows, is_flagged: 'Column "' + column + '" has some NaN values: ' +
+            str(self.df.index[rows][is_flagged]),
+            by_moments=False)
+
+    @check
+    @segmented
+    def check_range(self, column, minimum, maximum):
+
+        name_check_function = self.current_check
+
+        condition_list = self.df[column].between(minimum, maximum) | self.df[column].isna()
+
+        self._assert_samples(
+            name_check_function, ~condition_list, [column],
+            lambda rows, is_flagged: 'Column "' + column + '" is not in range [' +
+            str(minimum) + ', ' + str(maximum) + ']',
+            title=name_check_function + ':' + column)
+
+    @check
+    @segmented
+    def check_pct_change(self, column, window, threshold_pct):
+
+        name_check_function = self.current_check
+
+        pct_change = self.df[column].groupby(self.day_codes).pct_change(window).abs() * 100
+
+        condition_list = self._bfill_by_day(pct_change) < threshold_pct
+
+        self._assert_samples(
+            name_check_function, ~condition_list, [column],
+            lambda rows, is_flagged: 'Percent change [%] of column ' + column +
+            ' is not in window of ' + str(window) + ' samples and threshold ' + str(threshold_pct) +
+            '%. List of values: ' + format_values(self.df[column].iloc[rows][is_flagged]),
+            title=name_check_function + ':' + column)
+
+    @check
+    @segmented
+    def check_abs_change(self, column, window, threshold):
+        """
+        Returns {window: boolean pandas.Series of the flagged samples}, as
+        Checking.check_abs_change()
+        """
+        name_check_function = self.current_check
+
+        windows = [window] if np.isscalar(window) else list(window)
+        thresholds = [threshold] * len(windows) if np.isscalar(threshold) else list(threshold)
+
+        rolling_ranges = mc_solar.rolling_ranges(self.df[column], windows)
+
+        flagged_windows, num_flagged = {}, {}
+        for window, threshold in zip(windows, thresholds):
+            rolling_range = rolling_ranges[window]
+
+            # windows must not cross days
+            rolling_range[self._position_in_day() < window - 1] = np.nan
+
+            condition_list = self._bfill_by_day(pd.Series(rolling_range)).to_numpy() < threshold
+            flagged_windows[window] = pd.Series(~condition_list, index=self.df.index, name=column)
+            num_flagged[window] = np.bincount(self.day_codes[~condition_list], minlength=self.num_days)
+
+            self.flags.set(name_check_function, self._by_moments(~condition_list), column)
+
+        # lines of every day in the order of the windows
+        for code_day in np.flatnonzero(np.any(list(num_flagged.values()), axis=0)):
+            rows = self.day_rows(code_day)
+            values = self.df[column].iloc[rows]
+
+            for window, threshold in zip(windows, thresholds):
+                if not num_flagged[window][code_day]:
+                    continue
+                is_flagged = flagged_windows[window].to_numpy()[rows]
+
+                self._assertion(
+                    code_day,
+                    error_message='Absolute change of column ' + column + ' is not in window of ' +
+                    str(window) + ' samples and threshold ' + str(threshold) + '. List of values: ' +
+                    format_values(values[is_flagged]),
+                    check_type=name_check_function,
+                    figure=self._figure_flagged(name_check_function + ':' + column, values, is_flagged),
+                    num_flagged=num_flagged[window][code_day])
+
+        return flagged_windows
+
+    @check
+    @segmented
+    def check_differential(self, column, threshold):
+
+        name_check_function = self.current_check
+
+        with np.errstate(invalid='ignore'):
+            condition_list = np.abs(self.differential(column)) < threshold
+
+        self._assert_samples(
+            name_check_function, ~condition_list, [column],
+            lambda rows, is_flagged: ('Differential change of column {}'.format(column) +
+                                      'larger than threshold {}'.format(str(threshold)) +
+                                      '. List of values: {}'.format(
+                                          format_values(self.df[column].iloc[rows][is_flagged]))),
+            title=name_check_function + ':' + column)
+
+    @check
+    @segmented
+    def check_misalignment_geonica(self, column):
+
+        name_check_function = self.current_check
+
+        num_valleys_misalign, _ = mc_solar.valleys_radiation(self.df[column], by_day=True)
+        num_valleys_misalign = num_valleys_misalign.reindex(self.days, fill_value=0).to_numpy()
+
+        flagged = []
+        # the valleys of the candidate days are found again, as a single day
+        for code_day in np.flatnonzero(~(num_valleys_misalign < NUM_VALLEYS_THRESHOLD)):
+            values = self.df[column].iloc[self.day_rows(code_day)]
+            num_valleys_day, moments_misalign = mc_solar.valleys_radiation(values)
+
+            if num_valleys_day < NUM_VALLEYS_THRESHOLD:
+                continue
+
+            flagged.extend(moments_misalign)
+
+            figure = mc_fig.FigureSpec(title=name_check_function, suptitle=self.type_data_station)
+            figure.plot(values, style='.')
+            figure.plot(values, mask=moments_misalign, style='r-P')
+
+            self._assertion(
+                code_day,
+                error_message='Possible misalignment in Geonica direct radiation due to ' +
+                'the number of suspicious valleys ({})'.format(num_valleys_day) +
+                ' larger than threshold, {}'.format(NUM_VALLEYS_THRESHOLD) +
+                '. List of values: {}'.format(format_values(values[moments_misalign])),
+                check_type=name_check_function,
+                figure=figure,
+                num_flagged=len(moments_misalign))
+
+        self.flags.set(name_check_function, pd.Index(flagged), column)
+
+    @check
+    @segmented
+    def check_coherence_radiation(self, threshold_pct, dni, ghi, dhi, radiation_threshold=None):
+
+        name_check_function = self.current_check
+
+        is_filt = (self.df[ghi] > GHI_RADIATION_THRESHOLD).to_numpy()
+
+        _, Zz = mc_solar.solar_position(self.df.index)
+
+        ghi_model = self.df[dhi].to_numpy() + self.df[dni].to_numpy() * np.cos(Zz)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            condition_list = (np.abs(self.df[ghi].to_numpy() - ghi_model) /
+                              self.df[ghi].to_numpy() * 100 < threshold_pct)
+
+        def figure(rows, is_filt, is_flagged):
+            return self._figure_flagged(name_check_function, self.df[ghi].iloc[rows][is_filt], is_flagged)
+
+        self._assert_filtered(
+            name_check_function, is_filt, condition_list, self.radiation_transitions(ghi), [dni, ghi, dhi],
+            lambda rows, is_filt, is_flagged: 'No coherence between radiations considering a percentage threshold of GHI {}% in {}'.format(
+                threshold_pct, self.df.index[rows][is_filt][is_flagged]),
+            lambda num_radiation_transitions_value: 'Radiation coherence based on GHI not checked because the number of cloudy moments={} [with a DRADIATION_DT={}] is higher than threshold={}'.format(
+                num_radiation_transitions_value, DRADIATION_DT, NUM_RADIATION_TRANSITIONS_THRESHOLD),
+            figure)
+
+    @check
+    @segmented
+    def check_radiation_other_source(
+            self,
+            column,
+            other_radiation,
+            threshold_pct,
+            radiation_threshold=None,
+            label_other='_other'):
+
+        name_check_function = self.current_check
+
+        df_joined, positions_joined = self._join_other_source(column, other_radiation, label_other)
+        if df_joined is None:
+            self._report(np.ones(self.num_days, dtype=bool), name_check_function, column, other_radiation,
+                         threshold_pct, radiation_threshold=radiation_threshold, label_other=label_other)
+            return
+
+        if radiation_threshold is None:
+            radiation_threshold = DNI_RADIATION_THRESHOLD
+
+        column_other = df_joined.columns[1]
+        is_joined = positions_joined >= 0
+
+        values = self.df[column].to_numpy(dtype=np.float64)
+        values_other = np.full(len(values), np.nan)
+        values_other[is_joined] = df_joined[column_other].to_numpy(dtype=np.float64)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            is_filt = is_joined & (values > radiation_threshold)
+            condition_list = np.abs(values - values_other) / values_other * 100 < threshold_pct
+
+        def filtered(rows, is_filt):
+            # the joined rows of a day are contiguous
+            df_day = df_joined.iloc[self._joined_rows(positions_joined, rows)]
+            return df_day[is_filt[is_joined[rows]]]
+
+        def figure(rows, is_filt, is_flagged):
+            df_filt = filtered(rows, is_filt)
+
+            figure = mc_fig.FigureSpec(title=name_check_function + ':' + column, suptitle=self.type_data_station,
+                                       legend=[column, column_other])
+            figure.plot(df_filt[column], style='.')
+            figure.plot(df_filt[column_other], style='.')
+            figure.plot(df_filt[column], mask=is_flagged, style='rP')
+
+            return figure
+
+        self._assert_filtered(
+            name_check_function, is_filt, condition_list,
+            self.radiation_transitions(column, DNI_RADIATION_THRESHOLD), [column],
+            lambda rows, is_filt, is_flagged: 'No coherence between {} and {} radiation sources considering a percentage THRESHOLD of {} % in {}'.format(
+                column, column_other, threshold_pct, filtered(rows, is_filt)[column][is_flagged].index),
+            lambda num_radiation_transitions_value: 'Comparison of radiation {} and {} from different sources not checked because the number of cloudy moments={} [with a DRADIATION_DT={}] is higher than threshold={}'.format(
+                column, column_other, num_radiation_transitions_value, DRADIATION_DT,
+                NUM_RADIATION_TRANSITIONS_THRESHOLD),
+            figure)
+
+    def _candidates_irradiation_pair(self, irradiation, irradiation_other, num_radiation_transitions_value,
+                                     threshold_pct):
+        """
+        Days whose segmented irradiations are not clearly below the irradiation
+        threshold, and are not clearly coherent or have too many transitions (INFO)
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            diff_radiation = np.abs(irradiation - irradiation_other) / irradiation * 100
+
+            is_checked = ~(irradiation < DAILY_IRRADIATION_THRESHOLD * (1 - TOLERANCE))
+            is_incoherent = ~(diff_radiation < threshold_pct * (1 - TOLERANCE))
+
+        return is_checked & (is_incoherent | ~(num_radiation_transitions_value < NUM_RADIATION_TRANSITIONS_THRESHOLD))
+
+    @check
+    @segmented
+    def check_total_irradiation_other_source(
+            self,
+            column,
+            other_radiation,
+            threshold_pct,
+            label_other='_other'):
+
+        name_check_function = self.current_check
+
+        df_joined, positions_joined = self._join_other_source(column, other_radiation, label_other)
+        if df_joined is None:
+            self._report(np.ones(self.num_days, dtype=bool), name_check_function, column, other_radiation,
+                         threshold_pct, label_other=label_other)
+            return
+
+        column_other = df_joined.columns[1]
+        day_codes_joined = self.day_codes[positions_joined >= 0]
+        num_radiation_transitions_value = self.radiation_transitions(column, DNI_RADIATION_THRESHOLD)
+
+        is_candidate = self._candidates_irradiation_pair(
+            self._irradiation_by_day(df_joined[column], day_codes_joined),
+            self._irradiation_by_day(df_joined[column_other], day_codes_joined),
+            num_radiation_transitions_value, threshold_pct)
+
+        def day_joined(code_day):
+            return df_joined.iloc[self._joined_rows(positions_joined, self.day_rows(code_day))]
+
+        def irradiations(code_day):
+            df_day = day_joined(code_day)
+            return (mc_solar.daily_irradiation(df_day[column], samples_per_hour=self.samples_per_hour),
+                    mc_solar.daily_irradiation(df_day[column_other], samples_per_hour=self.samples_per_hour))
+
+        def figure(code_day):
+            df_day = day_joined(code_day)
+
+            figure = mc_fig.FigureSpec(title=name_check_function + ':' + column, suptitle=self.type_data_station,
+                                       legend=[column, column_other])
+            figure.plot(df_day[column], style='k.')
+            figure.plot(df_day[column_other], style='r.')
+
+            return figure
+
+        self._assert_irradiation_pair(
+            name_check_function, is_candidate, irradiations, num_radiation_transitions_value, threshold_pct, column,
+            lambda diff_radiation: 'Total irradiation from {} is different to {} in more than {}%. It is {:.1f}% while DAILY_IRRADIATION_THRESHOLD is {:.2} kWh/(m2·day)'.format(
+                column, column_other, threshold_pct, diff_radiation, DAILY_IRRADIATION_THRESHOLD),
+            lambda num_radiation_transitions_value: 'Comparison of total irradiations {} and {} not checked because the number of cloudy moments={} [with a DRADIATION_DT={}] is higher than threshold={}'.format(
+                column, column_other, num_radiation_transitions_value, DRADIATION_DT,
+                NUM_RADIATION_TRANSITIONS_THRESHOLD),
+            figure)
+
+    @check
+    @segmented
+    def check_same_magnitude_pct_change(
+            self,
+            column,
+            column_other,
+            threshold_pct):
+
+        name_check_function = self.current_check
+
+        condition_list = (self.df[column] - self.df[column_other]
+                          ).abs() / self.df[column_other] * 100 < threshold_pct
+
+        self._assert_samples(
+            name_check_function, ~condition_list, [column, column_other],
+            lambda rows, is_flagged: 'Percent change [%] of column ' + column + ' samples and threshold ' +
+            str(threshold_pct) + '%. List of values: ' +
+            format_values(self.df[column].iloc[rows][is_flagged])[:1000],
+            title=name_check_function + ':' + column + '&' + column_other + ' with thresold_pct=' + str(threshold_pct))
+
+    @check
+    @segmented
+    def check_same_irradiance_pct_change(
+            self,
+            column,
+            column_other,
+            threshold_pct):
+
+        name_check_function = self.current_check
+
+        condition_list = ((self.df[column] - self.df[column_other]
+                          ).abs() / self.df[column_other] * 100 < threshold_pct) & self.df[column] < 100
+
+        self._assert_samples(
+            name_check_function, ~condition_list, [column, column_other],
+            lambda rows, is_flagged: 'Percent change [%] of column ' + column + ' samples and threshold ' +
+            str(threshold_pct) + '%. List of values: ' +
+            format_values(self.df[column].iloc[rows][is_flagged])[:1000],
+            title=name_check_function + ':' + column + '&' + column_other + ' with thresold_pct=' + str(threshold_pct))
+
+    @check
+    @segmented
+    def check_same_magnitude_total_irradiation(
+            self,
+            column,
+            column_other,
+            threshold_pct):
+
+        name_check_function = self.current_check
+
+        num_radiation_transitions_value = self.radiation_transitions(column, DNI_RADIATION_THRESHOLD)
+
+        is_candidate = self._candidates_irradiation_pair(
+            self.irradiation(column), self.irradiation(column_other), num_radiation_transitions_value,
+            threshold_pct)
+
+        def figure(code_day):
+            df_day = self.day_frame(code_day)
+
+            figure = mc_fig.FigureSpec(title=name_check_function + ':' + column + '&' + column_other +
+                                       ' with thresold_pct=' + str(threshold_pct),
+                                       suptitle=self.type_data_station, legend=[column, column_other])
+            figure.plot(df_day[column], style='k.')
+            figure.plot(df_day[column_other], style='r.')
+
+            return figure
+
+        self._assert_irradiation_pair(
+            name_check_function, is_candidate,
+            lambda code_day: (self.day_irradiation(column, code_day), self.day_irradiation(column_other, code_day)),
+            num_radiation_transitions_value, threshold_pct, [column, column_other],
+            lambda diff_radiation: 'Total irradiation from {} is different to {} in more than {}%. It is {:.1f}% while DAILY_IRRADIATION_THRESHOLD is {:.2} kWh/(m2·day)'.format(
+                column, column_other, threshold_pct, diff_radiation, DAILY_IRRADIATION_THRESHOLD),
+            lambda num_radiation_transitions_value: 'Comparison of total irradiations {} and {} not checked because the number of cloudy moments={} [with a DRADIATION_DT={}] is higher than threshold={}'.format(
+                column, column_other, num_radiation_transitions_value, DRADIATION_DT,
+                NUM_RADIATION_TRANSITIONS_THRESHOLD),
+            figure)
+
+    @check
+    @segmented
+    def check_num_radiation_transitions_other_source(
+            self,
+            column,
+            other_radiation,
+            num_diff_radiation_transitions_thresold,
+            radiation_threshold=None,
+            label_other='_other'):
+
+        name_check_function = self.current_check
+
+        if radiation_threshold is None:
+            radiation_threshold = DNI_RADIATION_THRESHOLD
+
+        with np.errstate(invalid='ignore'):
+            is_filt = (self.df[column] > radiation_threshold).to_numpy()
+        has_filt = self._any_by_day(is_filt)
+
+        if not other_radiation.index.is_monotonic_increasing: # days of other source are not contiguous
+            self._report(has_filt, name_check_function, column, other_radiation,
+                         num_diff_radiation_transitions_thresold, radiation_threshold=radiation_threshold,
+                         label_other=label_other)
+            return
+
+        column_other = other_radiation.name + label_other
+
+        values_other = other_radiation.to_numpy(dtype=np.float64)
+        with np.errstate(invalid='ignore'):
+            is_filt_other = values_other > radiation_threshold
+        day_codes_other = self._day_codes_of(other_radiation.index)
+        is_filt_other &= day_codes_other >= 0 # days of other source not in this frame
+
+        num_radiation_transitions_value = self.radiation_transitions(column, radiation_threshold)
+        num_radiation_transitions_value_other = self._transitions_by_day(
+            values_other[is_filt_other], day_codes_other[is_filt_other])
+
+        is_flagged = has_filt & ~(np.abs(num_radiation_transitions_value -
+                                         num_radiation_transitions_value_other) < num_diff_radiation_transitions_thresold)
+
+        self.flags.set(name_check_function, is_flagged[self.day_codes], column)
+
+        for code_day in np.flatnonzero(is_flagged):
+            rows = self.day_rows(code_day)
+            day = self.days[code_day]
+            other_day = other_radiation.iloc[other_radiation.index.searchsorted(day):
+                                             other_radiation.index.searchsorted(day + pd.Timedelta('1D'))]
+
+            figure = mc_fig.FigureSpec(title=name_check_function + ':' + column, suptitle=self.type_data_station,
+                                       legend=[column, column_other])
+            figure.plot(self.df[column].iloc[rows][is_filt[rows]], style='.-')
+            figure.plot(other_day[other_day > radiation_threshold], style='.-')
+
+            self._assertion(
+                code_day,
+                error_message='No coherence of cloudy moments between {} and {} radiation sources with {} and {} respectively. Maximum allowed difference: {}'.format(
+                    column,
+                    column_other,
+                    num_radiation_transitions_value[code_day],
+                    num_radiation_transitions_value_other[code_day],
+                    num_diff_radiation_transitions_thresold),
+                check_type=name_check_function,
+                figure=figure)
+
+    @check
+    @segmented
+    def check_coherence_isotypes(self, dni, top, mid, bot, threshold_pct, radiation_threshold=None):
+
+        name_check_function = self.current_check
+
+        is_filt = (self.df[dni] > DNI_RADIATION_THRESHOLD).to_numpy()
+
+        dni_model = (
+            self.df[top] *
+            0.51 +
+            self.df[mid] *
+            0.10 +
+            self.df[bot] *
+            0.39)
+
+        condition_list = (
+            ((self.df[dni] - dni_model).abs()) / self.df[dni] * 100 < threshold_pct).to_numpy()
+
+        def figure(rows, is_filt, is_flagged):
+            df_filt = self.df.iloc[rows][is_filt]
+
+            figure = mc_fig.FigureSpec(title=name_check_function, suptitle=self.type_data_station,
+                                       legend=[top, mid, bot])
+            figure.plot(df_filt[dni], style='k.')
+            figure.plot(df_filt[top], style='.')
+            figure.plot(df_filt[mid], style='.')
+            figure.plot(df_filt[bot], style='.')
+            figure.plot(
+                df_filt[dni],
+                mask=is_flagged,
+                marker='P',
+                markersize=8,
+                color='darkred',
+                markeredgecolor='yellow',
+                markeredgewidth=2)
+
+            return figure
+
+        self._assert_filtered(
+            name_check_function, is_filt, condition_list,
+            self.radiation_transitions(dni, DNI_RADIATION_THRESHOLD), [dni, top, mid, bot],
+            lambda rows, is_filt, is_flagged: 'No coherence between DNI radiation and isotypes considering a percentage threshold of {} % in {}'.format(
+                threshold_pct, self.df[dni].iloc[rows][is_filt][is_flagged].index),
+            lambda num_radiation_transitions_value: 'DNI vs isotypes comparison not checked because the number of cloudy moments={} [with a DRADIATION_DT={}] is higher than threshold={}'.format(
+                num_radiation_transitions_value, DRADIATION_DT, NUM_RADIATION_TRANSITIONS_THRESHOLD),
+            figure)
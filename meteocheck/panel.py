@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Several meteo stations of a date aligned in a single array.
+
+The numeric columns of every station are placed in one wide float64 array
+over the union of their indexes, so cross-source checks take column slices
+instead of copying and joining the other source in every call:
+
+    >>> panel = StationPanel.from_files('2019-06-01', ['helios', 'geonica'])
+    >>> checking = panel.checking('helios')
+    >>> checking.check_radiation_other_source('B', ('geonica', 'DNI'), 5)
+    >>> checking.check_num_radiation_transitions_other_source('B', ('geonica', 'DNI'), 3)
+
+The other source is given as the key (type_data_station, column) of the
+panel. The incidences are the same as if it were given as a pandas.Series
+named as the column. The values of the panel are a copy of the frames.
+"""
+import numpy as np
+import pandas as pd
+
+import meteocheck.solar_functions as mc_solar
+import meteocheck.config_meteo_stations as mc_meteo
+from meteocheck.core import Checking, add_line_log
+
+
+class StationPanel:
+    """
+    Parameters
+    ----------
+    frames : dict
+        {type_data_station: pandas.DataFrame with a DatetimeIndex}
+    file_paths : dict, optional
+        {type_data_station: Path of its file}
+    date : datetime.date, optional
+        Day of the frames
+
+    Moments repeated in the index of a station are aligned with their first
+    sample. Non-numeric columns are not in the panel.
+    """
+
+    def __init__(self, frames, file_paths=None, date=None):
+        self.frames = frames
+        self.file_paths = {} if file_paths is None else file_paths
+        self.date = date
+
+        index = pd.DatetimeIndex([])
+        for df in frames.values():
+            index = index.union(df.index[~df.index.duplicated()])
+        self.index = index
+
+        # Rows of the panel with a sample of each station
+        self.present = {}
+        # {(type_data_station, column): position in 'values'}
+        self.positions = {}
+
+        self.values = np.full((len(index), sum(len(df.select_dtypes('number').columns)
+                                                for df in frames.values())), np.nan)
+
+        position = 0
+        for type_data_station, df in frames.items():
+            df = df[~df.index.duplicated()].select_dtypes('number')
+            rows = index.get_indexer(df.index)
+
+            self.present[type_data_station] = np.zeros(len(index), dtype=bool)
+            self.present[type_data_station][rows] = True
+
+            self.values[rows, position:position + len(df.columns)] = df.to_numpy(dtype=np.float64)
+            for column in df.columns:
+                self.positions[(type_data_station, column)] = position
+                position += 1
+
+        self._aligned = {}
+
+    @classmethod
+    def from_files(cls, date, stations):
+        """
+        Opens the files of 'date' of the supported meteo 'stations'. Missing
+        files are logged as CRITICAL and skipped
+        """
+        frames, file_paths = {}, {}
+
+        add_line_log('INFO', error_message="Analyzing meteo data of types {} from {}".format(stations, date))
+
+        for type_data_station in stations:
+            try:
+                frames[type_data_station], file_paths[type_data_station] = mc_meteo.open_meteo_file(
+                    pd.Timestamp(date).date(), type_data_station)
+            except OSError as e:
+                add_line_log('CRITICAL', error_message=e, type_data_station=type_data_station)
+
+        if not frames:
+            raise OSError('No file of types={} of {} can be opened'.format(stations, date))
+
+        return cls(frames, file_paths=file_paths, date=pd.Timestamp(date).date())
+
+    def column(self, type_data_station, column):
+        """
+        View of a column over the whole index of the panel (NaN where the
+        station has no sample)
+        """
+        return self.values[:, self.positions[(type_data_station, column)]]
+
+    def series(self, type_data_station, column):
+        """
+        Column with the samples of its station, as a pandas.Series named 'column'
+        """
+        is_present = self.present[type_data_station]
+        return pd.Series(self.column(type_data_station, column)[is_present],
+                         index=self._index(is_present, type_data_station), name=column)
+
+    def aligned(self, key, key_other, label_other='_other'):
+        """
+        pandas.DataFrame with the columns 'key' and 'key_other' (both
+        (type_data_station, column)) on the moments of both stations, named
+        'column' and 'column_other' + 'label_other'. Computed once per pair
+        """
+        cache_key = (key, key_other, label_other)
+
+        if cache_key not in self._aligned:
+            is_common = self.present[key[0]] & self.present[key_other[0]]
+            self._aligned[cache_key] = pd.DataFrame(
+                {key[1]: self.column(*key)[is_common],
+                 key_other[1] + label_other: self.column(*key_other)[is_common]},
+                index=self._index(is_common, key[0]))
+
+        return self._aligned[cache_key]
+
+    def _index(self, rows, type_data_station):
+        # with the name of the index of the station, as a join would
+        return self.index[rows].rename(self.frames[type_data_station].index.name)
+
+    def checking(self, type_data_station):
+        """
+        Checking of a station of the panel, whose cross-source checks take
+        the other sources from the panel. While its 'df' is not replaced, its
+        own columns are also taken from the panel, so changes made in place
+        to 'df' are not seen by those checks
+        """
+        df = self.frames[type_data_station]
+
+        samples_per_hour = mc_solar.infer_sampling(df.index).samples_per_hour
+        if samples_per_hour is None:
+            add_line_log('CRITICAL', error_message="The 'Samples per hour' of the 'df' cannot be infered",
+                         type_data_station=type_data_station, file_path=self.file_paths.get(type_data_station))
+            raise ValueError("The 'Samples per hour' of '{}' cannot be infered".format(type_data_station))
+
+        checking = Checking.from_frame(df, type_data_station, samples_per_hour,
+                                       file_path=self.file_paths.get(type_data_station), date=self.date)
+        checking.panel = self
+
+        return checking
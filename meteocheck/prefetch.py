@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+Reading of the files of a batch ahead of their checking.
+
+The files live on a network share, where every read blocks for a while. A
+Prefetcher reads the next files in a pool of threads while the current one
+is parsed and checked, so a batch does not alternate between waiting and
+computing:
+
+    >>> prefetcher = Prefetcher([('helios', date) for date in dates], num_ahead=4)
+    >>> for (type_data_station, date), fetched in prefetcher:
+    ...     checking = Checking(type_data_station, date, fetched=fetched)
+    >>> prefetcher.stats.io_wait, prefetcher.stats.fetch_time
+
+A slow share can be simulated on a local directory by wrapping the reading
+function:
+
+    >>> prefetcher = Prefetcher(tasks, fetch=with_latency(fetch_station_day, 0.2))
+"""
+import collections
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import meteocheck.config_meteo_stations as mc_meteo
+from meteocheck.settings import PREFETCH_NUM_FILES, PREFETCH_MAX_BYTES, PREFETCH_THREADS
+
+
+class PrefetchStats:
+    """
+    Counters of a batch. Times are in seconds
+
+    Attributes
+    ----------
+    io_wait : float
+        Time blocked waiting for files not read yet
+    fetch_time : float
+        Time reading the files, in the threads
+    compute_time : float
+        Time parsing and checking the files, measured by the user of the files
+    num_files : int
+        Files read, also those that failed
+    num_bytes : int
+        Bytes read (in memory for the files in the cache)
+    max_buffered_bytes : int
+        Maximum bytes of the files read and not used yet
+    """
+
+    def __init__(self):
+        self.io_wait = 0.
+        self.fetch_time = 0.
+        self.compute_time = 0.
+        self.num_files = 0
+        self.num_bytes = 0
+        self.max_buffered_bytes = 0
+
+    def __repr__(self):
+        return ('PrefetchStats(files={}, MB={:.1f}, io_wait={:.2f} s, fetch_time={:.2f} s, '
+                'compute_time={:.2f} s)'.format(self.num_files, self.num_bytes / 2**20, self.io_wait,
+                                                self.fetch_time, self.compute_time))
+
+
+def fetched_size(fetched):
+    """
+    Bytes of the result of config_meteo_stations.fetch_meteo_file()
+    """
+    _, df, content, _ = fetched
+    if df is not None:
+        return int(df.memory_usage(index=True).sum())
+    if isinstance(content, bytes):
+        return len(content)
+    return 0
+
+
+def with_latency(fetch, latency):
+    """
+    'fetch' delayed 'latency' seconds, as if the files were on a slow share
+    """
+    def fetch_with_latency(*args, **kwargs):
+        time.sleep(latency)
+        return fetch(*args, **kwargs)
+
+    return fetch_with_latency
+
+
+class Prefetcher:
+    """
+    Iterates over (task, fetch(*task)) in the order of 'tasks', reading up
+    to 'num_ahead' of the next ones in advance.
+
+    Parameters
+    ----------
+    tasks : list
+        Arguments of 'fetch', e.g. (type_data_station, date)
+    fetch : function, optional
+        Reads a task. Defaults to fetch_station_day()
+    num_ahead : int
+        Tasks read in advance. If 0, each one is read when it is used
+    max_bytes : int
+        No more tasks are read in advance while the ones read and not used
+        yet take more than these bytes. The ones being read are counted with
+        the mean size of those already read (only one is read until then)
+    num_threads : int
+        Threads reading the tasks
+    size : function
+        Bytes of the result of 'fetch'
+    stats : PrefetchStats, optional
+        Counters to update. New ones by default
+    hold : bool, default=False
+        If True, the results stay counted in the 'max_bytes' after they are
+        yielded, until they are given to release(), e.g. while they are
+        checked in other processes
+    """
+
+    def __init__(self, tasks, fetch=None, num_ahead=PREFETCH_NUM_FILES, max_bytes=PREFETCH_MAX_BYTES,
+                 num_threads=PREFETCH_THREADS, size=fetched_size, stats=None, hold=False):
+        self.tasks = list(tasks)
+        if fetch is None:
+            fetch = fetch_station_day
+        self.fetch = fetch
+        self.num_ahead = num_ahead
+        self.max_bytes = max_bytes
+        self.num_threads = num_threads
+        self.size = size
+        self.hold = hold
+
+        self.stats = PrefetchStats() if stats is None else stats
+
+        self._buffered_bytes = 0
+        self._num_reading = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def is_full(self):
+        """
+        True if the results read and not used (or not released) take 'max_bytes'
+        """
+        with self._lock:
+            if self.stats.num_files == 0: # size unknown, only one is read
+                return self._num_reading > 0 or self._buffered_bytes >= self.max_bytes
+
+            mean_bytes = self.stats.num_bytes / self.stats.num_files
+            return self._buffered_bytes + self._num_reading * mean_bytes >= self.max_bytes
+
+    def release(self, result):
+        """
+        Stops counting a result yielded with 'hold'
+        """
+        with self._lock:
+            self._buffered_bytes -= self.size(result)
+
+    def __iter__(self):
+        pending = collections.deque()
+        next_task = 0
+
+        with ThreadPoolExecutor(max_workers=max(1, self.num_threads)) as executor:
+            try:
+                while True:
+                    # the next task is always read, the ones after it within the limits
+                    while next_task < len(self.tasks) and (
+                            not pending or
+                            (len(pending) <= self.num_ahead and not self.is_full())):
+                        with self._lock:
+                            self._num_reading += 1
+                        pending.append(executor.submit(self._fetch, self.tasks[next_task]))
+                        next_task += 1
+
+                    if not pending:
+                        return
+
+                    start = time.perf_counter()
+                    task, result, num_bytes = pending.popleft().result()
+                    self.stats.io_wait += time.perf_counter() - start
+
+                    if not self.hold:
+                        with self._lock:
+                            self._buffered_bytes -= num_bytes
+
+                    yield task, result
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def _fetch(self, task):
+        start = time.perf_counter()
+        result = self.fetch(*task)
+        num_bytes = self.size(result)
+
+        with self._lock:
+            self._num_reading -= 1
+            self._buffered_bytes += num_bytes
+            self.stats.max_buffered_bytes = max(self.stats.max_buffered_bytes, self._buffered_bytes)
+            self.stats.fetch_time += time.perf_counter() - start
+            self.stats.num_files += 1
+            self.stats.num_bytes += num_bytes
+
+        return task, result, num_bytes
+
+
+def fetch_station_day(type_data_station, date):
+    """
+    config_meteo_stations.fetch_meteo_file() of a (type_data_station, date) task
+    """
+    return mc_meteo.fetch_meteo_file(date, type_data_station)
@@ -7,9 +7,74 @@ Created on Thu Jan 19 13:12:43 2017
 
 MINIMUM_ERROR_LEVEL_TO_SEND_EMAIL = 'WARNING'
 
+# Emails are sent by a background thread (email_dispatcher.py). Reports queued
+# within EMAIL_COALESCE_WINDOW seconds are sent together in one digest
+EMAIL_COALESCE_WINDOW = 10
+# Failed sendings are retried after EMAIL_RETRY_BACKOFF * 2**attempt seconds
+EMAIL_MAX_RETRIES = 4
+EMAIL_RETRY_BACKOFF = 5
+# The SMTP connection is closed after these seconds without emails
+EMAIL_IDLE_TIMEOUT = 60
+
 # Logs' filenames
 FILENAME_SESSION_LOG = 'meteocheck_session.log'
+# Tab-separated history of older versions. It can be imported with history.import_history_log()
 FILENAME_HISTORY_LOG = 'meteocheck_history.log'
+# SQLite database with the history of every session (see history.py)
+FILENAME_HISTORY_DB = 'meteocheck_history.sqlite'
+# Figures of the sessions sent by email are stored as PNG files in this
+# directory, referenced by the database of the history
+HISTORY_FIGURES_PATH = 'meteocheck_history_figures'
+IS_STORING_HISTORY_FIGURES = True
+# Time, rows and flagged samples of every check of the session
+FILENAME_SESSION_PROFILE = 'meteocheck_session_profile.log'
+
+# Cache of parsed meteo files, relative to the Current Working Directory
+IS_CACHING_FILES = True
+CACHE_PATH = 'meteocheck_cache'
+CACHE_MAX_BYTES = 2 * 2**30
+
+# Live checking of the files of today (see live.py): seconds between polls of
+# the files, and directory of the state of every file, relative to the Current
+# Working Directory, so a new session goes on from the last line checked
+LIVE_POLL_INTERVAL = 30
+LIVE_STATE_PATH = 'meteocheck_live'
+
+# Service mode (see watch.py): seconds between scans of the directories of the
+# stations, seconds a changed file of another day must stay unchanged before
+# it is checked (today's file is checked at every change), and number of
+# processes of the daily checkings
+WATCH_POLL_INTERVAL = 10
+WATCH_DEBOUNCE = 5
+WATCH_MAX_WORKERS = 2
+
+# Batch checking (see batch.py and prefetch.py): files read ahead of the one
+# being checked, maximum bytes of the files read and not checked yet, and
+# threads reading them
+PREFETCH_NUM_FILES = 4
+PREFETCH_MAX_BYTES = 256 * 2**20
+PREFETCH_THREADS = 4
+
+# Maximum bytes of rendered figures, and data of the ones not rendered yet, kept
+# in memory. Beyond it, the oldest figures not rendered are rendered and older
+# PNGs are written to FIGURES_SPILL_PATH (a temporary directory if None)
+FIGURES_MEMORY_BUDGET = 50 * 2**20
+FIGURES_SPILL_PATH = None
+
+# The sampling step is the most frequent difference between consecutive moments.
+# Differences within SAMPLING_TOLERANCE (fraction of the step) are regular. If
+# less than SAMPLING_MIN_REGULARITY of them are, the step cannot be inferred
+SAMPLING_TOLERANCE = 0.01
+SAMPLING_MIN_REGULARITY = 0.5
+
+# Prints every new line of the log when it is added
+IS_PRINTING_LOG = True
+
+# Error messages of the checks are only built when the check fails. They list
+# at most MAX_MESSAGE_VALUES flagged samples and are cut to
+# MAX_ERROR_MESSAGE_LENGTH characters
+MAX_MESSAGE_VALUES = 100
+MAX_ERROR_MESSAGE_LENGTH = 5000
 
 # THRESHOLD for derivative of radiation with respect time. Used when
 # calculating cloudy moments [per minute]
@@ -41,3 +106,6 @@ DEPTH_VALLEY_MAX = 0.95
 # THRESHOLD onf number of valleys (as defined in solar_functions.num_valleys_radiation())
 # If the number is higher, it is highly probable that the tracker is misaligned
 NUM_VALLEYS_THRESHOLD = 5
+
+# Number of solar position series (site, day and resolution) kept in memory by solpos()
+SOLPOS_CACHE_SIZE = 32
@@ -5,13 +5,15 @@ Created on Mon Feb 22 15:42:46 2016
 @author: ruben
 """
 import datetime as dt
+import functools
 
 import pandas as pd
 import numpy as np
 from numpy import sin, cos, pi, arccos, radians
 
 from meteocheck.settings import (DRADIATION_DT, LENGTH_VALLEY, DEPTH_VALLEY_MIN,
-                                 DEPTH_VALLEY_MAX)
+                                 DEPTH_VALLEY_MAX, SOLPOS_CACHE_SIZE, SAMPLING_TOLERANCE,
+                                 SAMPLING_MIN_REGULARITY)
 
 def solpos(time, latitude=40.45, longitude=-3.73, timezone=+1):
     """
@@ -30,12 +32,14 @@ def solpos(time, latitude=40.45, longitude=-3.73, timezone=+1):
     Returns
     -------
     az : numpy.array
-        List of azimuth angles (radians)
+        List of azimuth angles (radians) of the instants when the zenith is
+        increasing only, with reversed sign
     zz : numpy.array
         List of zenith angles (radians)
 
     See Also
     --------
+    solar_position : azimuth of every instant
 
     Examples
     --------
@@ -44,94 +48,339 @@ def solpos(time, latitude=40.45, longitude=-3.73, timezone=+1):
     >>> time = pd.date_range(start='2014/01/01', end='2014/05/01', freq='1H')
     >>> az, zz = solpos(time, latitude=40.45, longitude=-3.73)
     """
+    az, zz = solar_position(time, latitude, longitude, timezone)
 
+    az, zz = np.atleast_1d(az), np.atleast_1d(zz)
+    az = az[_is_zenith_increasing(zz)]
+
+    if len(az) == 1:
+        az = az[0]
+
+    if len(zz) == 1:
+        zz = zz[0]
+
+    return az, zz
+
+
+def solar_position(time, latitude=40.45, longitude=-3.73, timezone=+1):
+    """
+    Returns azimuth and zenith angles (radians) of the solar position of
+    every instant, as solpos(). The azimuth is positive while the zenith is
+    decreasing and negative while it is increasing.
+    """
     # If a single element is received, it will be converted to array
     if isinstance(time, pd.Timestamp):
         time = pd.DatetimeIndex([time])
-        
-    def time_from_moment(moment):
-        return np.array([mom.hour + mom.minute/60 + mom.second/3600 for mom in moment.time])
-    
-    def equation_time(moment):
-        return -7.64 * sin(radians(moment.dayofyear - 2)) + 9.86 * sin(radians(2 * (moment.dayofyear - 80)))
-        
-    def solar_time_radians(moment):
-        hora = time_from_moment(moment)
-        
-        DT = is_dst(moment) # Daylight Saving Time
-        ET = equation_time(moment) / 60
-        
-        apparent_solar_time = hora - DT + ET - (timezone - longitude / 15)
-        
-        return (apparent_solar_time - 12) * (2 * pi / 24)
-        
-    def declination(moment):
-        return radians(23.45) * sin(2 * pi * (moment.dayofyear + 284) / 365)
-        
-    def zenith(moment):
-        return arccos(cos(declination(moment)) * cos(solar_time_radians(moment)) * cos(radians(latitude)) + sin(declination(moment)) * sin(radians(latitude)))
-    
-    def azimuth(moment):
-        ang_azimuth = arccos((cos(zenith(moment)) * sin(radians(latitude)) - sin(declination(moment))) / (sin(zenith(moment)) * cos(radians(latitude))))
+    elif not isinstance(time, pd.DatetimeIndex):
+        time = pd.DatetimeIndex(time)
 
-        mom_inc_zz = np.diff(zenith(moment)) > 0
-        mom_inc_zz = np.append(mom_inc_zz, mom_inc_zz[-1])
+    # Civil time is the wall time, also for tz-aware indexes
+    if time.tz is not None:
+        time = time.tz_localize(None)
+
+    time_ns = time.asi8
+    step = _regular_step(time_ns)
+
+    if step is None:
+        az, zz = _solar_angles(time_ns, latitude, longitude, timezone)
+    else: # regular indexes are memoized, so checks of the same day reuse them
+        az, zz = _solpos_regular(latitude, longitude, timezone,
+                                 int(time_ns[0]), step, len(time_ns))
 
-        ang_azimuth_reversed = ang_azimuth[mom_inc_zz] * -1 # reverses the sign of those moments when zz is increasing. It means that az should be not changing trend
-        
-        return ang_azimuth_reversed
-    
-    az, zz = azimuth(time), zenith(time)
-    
     if len(az) == 1:
         az = az[0]
-    
+
     if len(zz) == 1:
         zz = zz[0]
-    
+
+    return az, zz
+
+
+NS_PER_HOUR = 3600 * 10**9
+NS_PER_DAY = 24 * NS_PER_HOUR
+
+
+def _regular_step(time_ns):
+    """
+    Returns the step [ns] of an evenly spaced index, otherwise None
+    """
+    if len(time_ns) < 2:
+        return 0
+
+    steps = np.diff(time_ns)
+    if (steps == steps[0]).all():
+        return int(steps[0])
+
+    return None
+
+
+@functools.lru_cache(maxsize=SOLPOS_CACHE_SIZE)
+def _solpos_regular(latitude, longitude, timezone, start, step, length):
+
+    time_ns = start + step * np.arange(length, dtype=np.int64)
+
+    az, zz = _solar_angles(time_ns, latitude, longitude, timezone)
+
+    # cached results are shared between callers
+    az.flags.writeable = False
+    zz.flags.writeable = False
+
     return az, zz
 
+
+def _solar_angles(time_ns, latitude, longitude, timezone):
+    """
+    Azimuth and zenith angles (radians) from civil time as int64 nanoseconds.
+    Every quantity is evaluated only once.
+    """
+    days = time_ns // NS_PER_DAY
+    hora = (time_ns - days * NS_PER_DAY) / NS_PER_HOUR
+
+    days = days.astype('datetime64[D]')
+    dayofyear = (days - days.astype('datetime64[Y]').astype('datetime64[D]')).astype(np.int64) + 1
+
+    DT = is_dst(time_ns) # Daylight Saving Time
+    ET = (-7.64 * sin(radians(dayofyear - 2)) + 9.86 * sin(radians(2 * (dayofyear - 80)))) / 60 # Equation of time
+
+    apparent_solar_time = hora - DT + ET - (timezone - longitude / 15)
+    solar_time_radians = (apparent_solar_time - 12) * (2 * pi / 24)
+
+    declination = radians(23.45) * sin(2 * pi * (dayofyear + 284) / 365)
+    sin_declination = sin(declination)
+    sin_latitude, cos_latitude = sin(radians(latitude)), cos(radians(latitude))
+
+    zz = arccos(cos(declination) * cos(solar_time_radians) * cos_latitude + sin_declination * sin_latitude)
+
+    az = arccos((cos(zz) * sin_latitude - sin_declination) / (sin(zz) * cos_latitude))
+
+    # reverses the sign of those moments when zz is increasing. It means that az should be not changing trend
+    az[_is_zenith_increasing(zz)] *= -1
+
+    return az, zz
+
+
+def _is_zenith_increasing(zz):
+    # the last moment keeps the trend of the previous one
+    mom_inc_zz = np.zeros(len(zz), dtype=bool)
+    if len(zz) > 1:
+        mom_inc_zz[:-1] = np.diff(zz) > 0
+        mom_inc_zz[-1] = mom_inc_zz[-2]
+    return mom_inc_zz
+
 def is_dst(time):
+    """
+    Returns a boolean mask of the instants inside the Daylight Saving Time period.
 
-    delta = np.array([], dtype=bool)
-    
-    for year in np.unique(time.year):
-    
-        day_change_time_march = dt.date(year, 3, 31) - dt.timedelta(days=dt.date(year, 3, 31).isoweekday())
-        day_change_time_october = dt.date(year, 10, 31) - dt.timedelta(days=dt.date(year, 10, 31).isoweekday())
-            # isoweekday() Return the day of the week as an integer, where Monday is 1 and Sunday is 7
-        
-        time_year = time[time.year == year]
-        dst_period = ((time_year.date >= day_change_time_march) & (time_year.date <= day_change_time_october))
-        
-        delta_year = np.zeros(len(time_year), dtype=bool)
-        delta_year[dst_period] = True
-                
-        delta = np.append(delta, delta_year)
-    
-    return delta
+    The period lasts from the last Sunday before March 31 to the last Sunday
+    before October 31, both days included.
 
+    Parameters
+    ----------
+    time : pandas.DatetimeIndex or numpy.array of int64 (civil time in nanoseconds)
+        List of instants. It can be unsorted and span any number of years
 
-def change_datetimeindex(data_series, mode, winter_delta, summer_delta):
+    Returns
+    -------
+    delta : numpy.array of bool
+        Same order as 'time'
     """
-    Converts UTC <-> civil time (accounts for DST) as per 'mode'
+    if isinstance(time, pd.DatetimeIndex):
+        if time.tz is not None:
+            time = time.tz_localize(None)
+        time_ns = time.asi8
+    else:
+        time_ns = np.asarray(time, dtype=np.int64)
+
+    delta = np.zeros(len(time_ns), dtype=bool)
+
+    is_valid = time_ns != np.iinfo(np.int64).min # NaT
+    if not is_valid.any():
+        return delta
+
+    years = time_ns[is_valid].view('datetime64[ns]').astype('datetime64[Y]').astype(np.int64) + 1970
+
+    # Sorted switch instants [start_0, end_0, start_1, end_1...]: inside DST if odd position
+    limits = _dst_limits(int(years.min()), int(years.max()))
+    position = np.searchsorted(limits, time_ns, side='right')
+
+    np.equal(position & 1, 1, out=delta, where=is_valid)
+
+    return delta
+
+
+@functools.lru_cache(maxsize=None)
+def _dst_limit_year(year):
+
+    day_change_time_march = dt.date(year, 3, 31) - dt.timedelta(days=dt.date(year, 3, 31).isoweekday())
+    day_change_time_october = dt.date(year, 10, 31) - dt.timedelta(days=dt.date(year, 10, 31).isoweekday())
+        # isoweekday() Return the day of the week as an integer, where Monday is 1 and Sunday is 7
+
+    # from the beginning of March's day to the end of October's day
+    start = np.datetime64(day_change_time_march, 'ns').astype(np.int64)
+    end = np.datetime64(day_change_time_october + dt.timedelta(days=1), 'ns').astype(np.int64)
+
+    return start, end
+
+
+@functools.lru_cache(maxsize=64)
+def _dst_limits(year_min, year_max):
+
+    limits = np.array([_dst_limit_year(year) for year in range(year_min, year_max + 1)],
+                      dtype=np.int64).ravel()
+    limits.flags.writeable = False
+
+    return limits
+
+
+def change_datetimeindex(data_series, mode, winter_delta, summer_delta, copy=False):
     """
-    delta_dst = is_dst(data_series.index)
+    Converts UTC <-> civil time (accounts for DST) as per 'mode'.
 
+    Every moment is shifted by the offset of its own period (summer or
+    winter), so samples keep their values and their order.
+
+    Parameters
+    ----------
+    data_series : pandas.Series or pandas.DataFrame
+        Data with a DatetimeIndex without time zone
+    mode : String
+        'utc->civil' or 'civil->utc'
+    winter_delta, summer_delta : float
+        Hours of civil time ahead of UTC in winter and in summer
+    copy : bool, default=False
+        If False, the index of 'data_series' is replaced and its values are
+        not copied (e.g. for archives of several years). If True,
+        'data_series' is not modified and a copy is returned
+
+    Returns
+    -------
+    data_series : pandas.Series or pandas.DataFrame
+        With the converted index
+    """
     if mode == 'utc->civil':
-        time_changed_summer = data_series[delta_dst].index + dt.timedelta(hours=summer_delta)
-        time_changed_winter = data_series[~delta_dst].index + dt.timedelta(hours=winter_delta)
+        sign = 1
     elif mode == 'civil->utc':
-        time_changed_summer = data_series[delta_dst].index - dt.timedelta(hours=summer_delta)
-        time_changed_winter = data_series[~delta_dst].index - dt.timedelta(hours=winter_delta)
+        sign = -1
     else:
         raise ValueError("Set correct mode: 'utc->civil' or 'civil->utc'")
-    
-    data_series.index = pd.Index(np.concatenate([time_changed_summer, time_changed_winter])).sort_values()
-    
+
+    index = data_series.index
+    if index.tz is not None:
+        raise ValueError('The index has a time zone, use tz_convert() instead')
+
+    delta_dst = is_dst(index)
+
+    # Offset of every moment [ns], to which its time is added in place
+    time_ns = np.where(delta_dst,
+                       np.int64(round(sign * summer_delta * 3600e9)),
+                       np.int64(round(sign * winter_delta * 3600e9)))
+    time_ns += index.asi8
+
+    index_changed = pd.DatetimeIndex(time_ns.view('datetime64[ns]'), name=index.name)
+
+    if copy:
+        return data_series.set_axis(index_changed, axis=0)
+
+    data_series.index = index_changed
+
     return data_series
 
 
+class Sampling:
+    """
+    Sampling of a DatetimeIndex, as inferred by infer_sampling()
+
+    Attributes
+    ----------
+    step : pandas.Timedelta
+        Most frequent difference between consecutive moments. None if it
+        cannot be inferred
+    samples_per_hour : float
+        None if the step cannot be inferred
+    regularity : float
+        Fraction of the differences within the tolerance of the step
+    is_monotonic : bool
+        No moment is earlier than the previous one
+    duplicated : numpy.array of bool
+        Moments repeated, after the first one (as pandas.Index.duplicated())
+    gaps : numpy.array of int
+        Positions of the moments that follow a gap (a difference longer than the step)
+    num_missing : int
+        Moments missing in the gaps
+    """
+
+    def __init__(self, step, regularity, is_monotonic, duplicated, gaps, num_missing):
+        self.step = step
+        self.samples_per_hour = None if step is None else pd.Timedelta('1H') / step
+        self.regularity = regularity
+        self.is_monotonic = is_monotonic
+        self.duplicated = duplicated
+        self.gaps = gaps
+        self.num_missing = num_missing
+
+    @property
+    def is_inferred(self):
+        return self.step is not None
+
+
+def infer_sampling(index, tolerance=SAMPLING_TOLERANCE, min_regularity=SAMPLING_MIN_REGULARITY):
+    """
+    Infers the sampling step of 'index' from the most frequent (modal)
+    difference between consecutive moments. Unlike pandas.infer_freq(), some
+    missing or repeated moments do not prevent it
+
+    Parameters
+    ----------
+    index : pandas.DatetimeIndex
+    tolerance : float
+        Differences within 'tolerance' times the step are regular
+    min_regularity : float
+        Minimum fraction of regular differences to infer the step
+
+    Returns
+    -------
+    Sampling
+    """
+    if not isinstance(index, pd.DatetimeIndex):
+        raise TypeError('The index is not a DatetimeIndex')
+
+    time_ns = index.asi8
+    deltas = np.diff(time_ns)
+    num_deltas = len(deltas)
+
+    is_monotonic = bool((deltas >= 0).all())
+    if is_monotonic:
+        duplicated = np.concatenate([[False], deltas == 0])
+    else:
+        duplicated = index.duplicated()
+
+    def regularity_of(step_ns):
+        margin = int(tolerance * step_ns)
+        return np.count_nonzero((deltas >= step_ns - margin) & (deltas <= step_ns + margin)) / num_deltas
+
+    # the median is the modal difference if most of them are equal, and it is
+    # found without sorting
+    step_ns = np.partition(deltas, num_deltas // 2)[num_deltas // 2] if num_deltas else 0
+    regularity = regularity_of(step_ns) if step_ns > 0 else 0.0
+
+    if regularity < min_regularity:
+        positive = deltas[deltas > 0]
+        if len(positive) == 0:
+            return Sampling(None, 0.0, is_monotonic, duplicated, np.array([], dtype=np.int64), 0)
+
+        values, counts = np.unique(positive, return_counts=True)
+        step_ns = values[np.argmax(counts)]
+        regularity = regularity_of(step_ns)
+
+    is_gap = deltas > step_ns + int(tolerance * step_ns)
+    gaps = np.flatnonzero(is_gap) + 1
+    num_missing = int((np.round(deltas[is_gap] / step_ns) - 1).sum())
+
+    step = pd.Timedelta(int(step_ns), 'ns') if regularity >= min_regularity else None
+
+    return Sampling(step, regularity, is_monotonic, duplicated, gaps, num_missing)
+
+
 def num_radiation_transitions(data_series, dradiation_dt=DRADIATION_DT):
     
     if len(data_series) < 2:
@@ -143,6 +392,70 @@ def num_radiation_transitions(data_series, dradiation_dt=DRADIATION_DT):
     return len(d_radiation[d_radiation > dradiation_dt])
 
 
+def rolling_ranges(values, windows):
+    """
+    Maximum minus minimum in rolling windows of several lengths, as
+    pandas' rolling(window).max() - rolling(window).min() (NaN in the first
+    'window' - 1 samples and in windows with some NaN or infinite value).
+
+    The extremes are taken with the van Herk/Gil-Werman algorithm: the
+    samples are split in blocks of 'window' samples and every window is the
+    suffix of one block plus the prefix of the next one. So it is linear in
+    the number of samples for any window length, with one pass per window.
+    Only the detection of NaN and infinite values is shared by the windows.
+
+    Parameters
+    ----------
+    values : pandas.Series or numpy.array
+    windows : list of int
+        Lengths of the windows [samples]
+
+    Returns
+    -------
+    ranges : dict
+        {window: numpy.array of the same length as 'values'}
+    """
+    values = np.asarray(values, dtype=np.float64)
+    num_values = len(values)
+
+    is_nan = ~np.isfinite(values)
+    # number of NaN before every sample, to find the windows with some NaN
+    num_nan = np.concatenate([[0], np.cumsum(is_nan)])
+    values_max = np.where(is_nan, -np.inf, values)
+    values_min = np.where(is_nan, np.inf, values)
+
+    ranges = {}
+    for window in windows:
+        rolling_range = np.full(num_values, np.nan)
+
+        if 0 < window <= num_values:
+            rolling_range[window - 1:] = (_rolling_extreme(values_max, window, np.maximum, -np.inf) -
+                                          _rolling_extreme(values_min, window, np.minimum, np.inf))
+            rolling_range[window - 1:][num_nan[window:] - num_nan[:-window] > 0] = np.nan
+
+        ranges[window] = rolling_range
+
+    return ranges
+
+
+def _rolling_extreme(values, window, ufunc, fill):
+    """
+    'ufunc' (np.maximum or np.minimum) of the windows that end at samples
+    window - 1, window, ...
+    """
+    num_values = len(values)
+    num_blocks = -(-num_values // window)
+
+    blocks = np.full(num_blocks * window, fill)
+    blocks[:num_values] = values
+    blocks = blocks.reshape(num_blocks, window)
+
+    prefix = ufunc.accumulate(blocks, axis=1).ravel()
+    suffix = ufunc.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+
+    return ufunc(suffix[:num_values - window + 1], prefix[window - 1:num_values])
+
+
 def daily_irradiation(series, samples_per_hour):
 
     return np.trapz(series, dx=(1 / samples_per_hour)) / 1000 # [kWh]
@@ -151,47 +464,128 @@ def daily_irradiation(series, samples_per_hour):
 def valleys_radiation(dni_series, dratiation_dt=DRADIATION_DT,
                       length_valley_pattern=LENGTH_VALLEY,
                       depth_valley_min=DEPTH_VALLEY_MIN,
-                      depth_valley_max=DEPTH_VALLEY_MAX):
-    
-    lista_delta = dni_series.diff().shift(-1)
-    lista_delta[-1] = lista_delta[-2]
-    
-    in_valley = False
-    moments_misalign = []
-    moments_valley = []
-    num_valleys_misalign = 0
-    
-    for moment in dni_series.index:
-        if abs(lista_delta[moment]) <= dratiation_dt: # flat zone
-            in_valley = False
-            
-        elif not in_valley: # a valley starts
-            if lista_delta[moment] <= -dratiation_dt:
-                in_valley = True
-                
-                moments_valley.append(moment)
-        else: # inside a valley
-            moments_valley.append(moment)
-    
-        if in_valley == False and moments_valley: # a valley ends
-            moments_valley.append(moment)
-            
-            energy_valley_actual = dni_series[moments_valley].sum()
-            energy_valley_ideal = dni_series[moments_valley[0]] * len(moments_valley)
-            
-            depth_valley = energy_valley_actual / energy_valley_ideal
-            
-            is_closed = abs(dni_series[moments_valley[0]] - dni_series[moments_valley[-1]]) < 3 * dratiation_dt
-            
-            if (len(moments_valley) in length_valley_pattern and 
-                (depth_valley_min < depth_valley < depth_valley_max) and 
-                is_closed):
-                moments_misalign.extend(moments_valley)
-                num_valleys_misalign += 1
-            
-            moments_valley = []
-
-    return num_valleys_misalign, moments_misalign
+                      depth_valley_max=DEPTH_VALLEY_MAX,
+                      by_day=False):
+    """
+    Finds the valleys of radiation that match the pattern of a misaligned tracker.
+
+    A valley starts with a drop larger than 'dratiation_dt' and lasts while the
+    differential is not flat. It is counted if its length is in
+    'length_valley_pattern', its depth is in ('depth_valley_min', 'depth_valley_max')
+    and it is closed (recovers the initial value).
+
+    Parameters
+    ----------
+    dni_series : pandas.Series
+        DNI radiation with a chronological DatetimeIndex. It can span several days.
+    by_day : bool, default=False
+        If True, each day is analyzed separately (as if it were called once
+        per day) and the number of valleys is returned per day.
+
+    Returns
+    -------
+    num_valleys_misalign : int or pandas.Series
+        Number of valleys. If 'by_day', a Series indexed by day
+    moments_misalign : list
+        Timestamps of the samples inside the valleys
+    """
+    values = np.asarray(dni_series, dtype=np.float64)
+    num_samples = len(values)
+
+    if by_day:
+        days, segment = np.unique(dni_series.index.normalize().asi8, return_inverse=True)
+        days = pd.DatetimeIndex(days)
+    else:
+        days, segment = None, np.zeros(num_samples, dtype=np.int64)
+
+    if num_samples < 2:
+        num_valleys = np.zeros(0 if days is None else len(days), dtype=np.int64)
+        if by_day:
+            return pd.Series(num_valleys, index=days), []
+        return 0, []
+
+    start, length = find_valleys(values, segment, dratiation_dt, length_valley_pattern,
+                                 depth_valley_min, depth_valley_max)
+
+    # positions of every sample of the selected valleys
+    offsets = np.arange(length.sum()) - np.repeat(np.cumsum(length) - length, length)
+    positions = np.repeat(start, length) + offsets
+
+    moments_misalign = dni_series.index[positions].tolist()
+
+    if by_day:
+        num_valleys = np.bincount(segment[start], minlength=len(days))
+        return pd.Series(num_valleys, index=days), moments_misalign
+
+    return len(start), moments_misalign
+
+
+def find_valleys(values, segment, dratiation_dt=DRADIATION_DT,
+                 length_valley_pattern=LENGTH_VALLEY,
+                 depth_valley_min=DEPTH_VALLEY_MIN,
+                 depth_valley_max=DEPTH_VALLEY_MAX):
+    """
+    Valleys of valleys_radiation() in an array of at least 2 samples.
+
+    Parameters
+    ----------
+    values : numpy.array of float64
+        DNI radiation
+    segment : numpy.array of int
+        Code of the segment (day) of every sample. Segments are analyzed separately
+
+    Returns
+    -------
+    start : numpy.array of int
+        Position of the first sample of every valley
+    length : numpy.array of int
+        Number of samples of every valley
+    """
+    num_samples = len(values)
+
+    # last sample of each segment (day) takes the previous differential
+    is_last = np.append(segment[1:] != segment[:-1], True)
+    is_first = np.insert(is_last[:-1], 0, True)
+
+    delta = np.empty(num_samples)
+    delta[:-1] = values[1:] - values[:-1]
+    last = np.flatnonzero(is_last & ~is_first)
+    delta[last] = delta[last - 1]
+    delta[is_last & is_first] = np.nan # single-sample segments
+
+    with np.errstate(invalid='ignore'):
+        flat = np.abs(delta) <= dratiation_dt
+        falling = delta <= -dratiation_dt
+
+    # Runs of non-flat samples, never crossing a segment boundary
+    not_flat = ~flat
+    run_start = np.flatnonzero(not_flat & (is_first | np.insert(flat[:-1], 0, True)))
+    run_end = np.flatnonzero(not_flat & (is_last | np.append(flat[1:], True)))
+
+    # Only one valley per run: from its first falling sample to the next flat sample
+    next_falling = np.where(falling, np.arange(num_samples), num_samples)
+    next_falling = np.minimum.accumulate(next_falling[::-1])[::-1]
+
+    start = next_falling[run_start]
+    # A valley ends in the flat sample after the run, that must be in the same segment
+    is_valley = (start <= run_end) & ~is_last[run_end]
+    start = start[is_valley]
+    end = run_end[is_valley] + 1
+
+    length = end - start + 1
+    cumsum = np.concatenate([[0.], np.cumsum(np.nan_to_num(values))])
+    energy_valley_actual = cumsum[end + 1] - cumsum[start]
+    energy_valley_ideal = values[start] * length
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        depth_valley = energy_valley_actual / energy_valley_ideal
+        is_closed = np.abs(values[start] - values[end]) < 3 * dratiation_dt
+
+    is_misalign = (np.isin(length, length_valley_pattern) &
+                   (depth_valley_min < depth_valley) & (depth_valley < depth_valley_max) &
+                   is_closed)
+
+    return start[is_misalign], length[is_misalign]
 
 def dew_at_morning(df, label_temp, label_dni):
     df[label_temp].loc[0]
@@ -0,0 +1,372 @@
+# -*- coding: utf-8 -*-
+"""
+Service mode: checks the files of the meteo stations when they change.
+
+A Watcher scans the directories of the stations (DATA_PATH_HELIOS,
+DATA_PATH_GEONICA and DATA_PATH_METEO) and compares the modification time
+and size of their daily files with those already checked:
+
+    - the file of today is checked incrementally with a LiveDay (see live.py)
+      at every scan where it changed. It only parses the new complete lines,
+      so the lines being written are checked at the next scan.
+    - files of other days (e.g. a corrected file) are checked once they have
+      stayed unchanged for 'debounce' seconds, so a file being copied is not
+      checked after every block. They, and the file of yesterday once the day
+      is over, are checked entirely as in batch.py, in a pool of
+      'max_workers' processes.
+
+Files that are already there when the service starts (or when a station is
+added to the check plan) are not checked again, except the file of today.
+The directories are scanned instead of
+watched with inotify, that does not see the files written to a network
+share by other hosts. A scan only reads the directory entries.
+
+The configuration files (meteocheck_meteo_stations.ini, meteocheck_email.ini
+and the check plan) are read again when they change, without restarting.
+From CLI, with the same check plan as batch.py:
+
+    python -m meteocheck.watch --plan plan.json --stations helios geonica
+"""
+import argparse
+import configparser
+import datetime as dt
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import meteocheck.core as mc_core
+import meteocheck.figures as mc_fig
+import meteocheck.batch as mc_batch
+import meteocheck.live as mc_live
+import meteocheck.config_meteo_stations as mc_meteo
+import meteocheck.config_email as mc_email
+import meteocheck.email_dispatcher as mc_dispatcher
+from meteocheck.settings import (WATCH_POLL_INTERVAL, WATCH_DEBOUNCE, WATCH_MAX_WORKERS, LIVE_STATE_PATH)
+
+
+def file_signature(file_path):
+    """
+    (modification time [ns], size) of a file. None if it does not exist
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+
+    return stat.st_mtime_ns, stat.st_size
+
+
+class Watcher:
+    """
+    Parameters
+    ----------
+    check_plan : dict or String
+        {type_data_station: [(name of the check, dict of arguments), ...]}, or
+        a JSON file with it (see batch.read_check_plan()), read again when it
+        changes
+    stations : list, optional
+        Subset of the stations of 'check_plan' to check
+    debounce : float
+        Seconds a changed file of another day must stay unchanged before it
+        is checked. The file of today is checked at every change
+    max_workers : int
+        Number of processes of the checkings of whole days
+    state_path : String
+        Directory of the states of the LiveDays (see live.py). Not saved if None
+    flags_path : String, optional
+        Directory where the per-sample flags of the whole days checked are
+        saved (.npz)
+    """
+
+    def __init__(self, check_plan, stations=None, debounce=WATCH_DEBOUNCE, max_workers=WATCH_MAX_WORKERS,
+                 state_path=LIVE_STATE_PATH, flags_path=None):
+        if isinstance(check_plan, dict):
+            self.plan_path = None
+        else:
+            self.plan_path, check_plan = Path(check_plan), mc_batch.read_check_plan(check_plan)
+        self.check_plan = check_plan
+        self.stations = stations
+        self.debounce = debounce
+        self.max_workers = max_workers
+        self.state_path = state_path
+        self.flags_path = flags_path
+
+        # {path: signature} of the files checked (or found at the first scan)
+        self.checked = {}
+        # {path: (signature, monotonic time when it was first seen)} of the changed files
+        self.changed = {}
+        # {path: (type_data_station, date)} of the files to check
+        self.ready = {}
+        # {future: (type_data_station, date, path)} of the checkings of whole days
+        self.running = {}
+        # {type_data_station: LiveDay of today}
+        self.live_days = {}
+
+        self.num_scans = 0
+        self.num_live_polls = 0
+        self.num_days_checked = 0
+
+        self._config_signatures = {}
+        # stations whose files were already found
+        self._scanned_stations = set()
+        self._unreadable_directories = set()
+        self._executor = None
+
+        if self.state_path is not None:
+            Path(os.getcwd(), self.state_path).mkdir(parents=True, exist_ok=True)
+
+    def watched_stations(self):
+        if self.stations is None:
+            return list(self.check_plan)
+        return [station for station in self.stations if station in self.check_plan]
+
+    #%% Scans
+    def scan(self):
+        """
+        Daily files of the stations: {path: (type_data_station, date, signature)}
+        """
+        files = {}
+
+        for station in self.watched_stations():
+            directory = mc_meteo.data_path(station)
+            try:
+                entries = list(os.scandir(directory))
+            except OSError as e:
+                if directory not in self._unreadable_directories:
+                    self._unreadable_directories.add(directory)
+                    mc_core.add_line_log('ERROR', error_message='Directory not scanned: {!r}'.format(e),
+                                         type_data_station=station)
+                continue
+            self._unreadable_directories.discard(directory)
+
+            for entry in entries:
+                date = mc_meteo.meteo_file_date(entry.name, station)
+                if date is None or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                files[Path(entry.path)] = (station, date, (stat.st_mtime_ns, stat.st_size))
+
+        return files
+
+    def step(self, now=None):
+        """
+        Reloads the changed configuration, scans the directories and checks
+        the files that changed and are stable
+        """
+        now = time.monotonic() if now is None else now
+        today = dt.date.today()
+
+        self.reload_config()
+
+        files = self.scan()
+
+        for path, (station, date, signature) in files.items():
+            if self.checked.get(path) == signature:
+                self.changed.pop(path, None)
+            elif station not in self._scanned_stations and date != today:
+                self.checked[path] = signature
+            elif date == today:
+                # it grows continuously: the LiveDay only parses its complete lines
+                self.changed.pop(path, None)
+                self.checked[path] = signature
+                self.ready[path] = (station, date)
+            elif path not in self.changed or self.changed[path][0] != signature:
+                self.changed[path] = (signature, now)
+            elif now - self.changed[path][1] >= self.debounce:
+                del self.changed[path]
+                self.checked[path] = signature
+                self.ready[path] = (station, date)
+
+        self._scanned_stations.update(station for station, _, _ in files.values())
+        self.num_scans += 1
+
+        # days over: the last lines are checked live and then the whole day
+        for station, live in list(self.live_days.items()):
+            if live.date != today:
+                mc_live.poll_live_day(live)
+                live.finish()
+                mc_live.save_live_day(live, self.state_path)
+                del self.live_days[station]
+
+                self.checked[live.file_path] = file_signature(live.file_path)
+                self.changed.pop(live.file_path, None)
+                self.ready[live.file_path] = (station, live.date)
+
+        self._collect()
+        self._dispatch(today)
+
+        if mc_core.log.is_error_level_reached('WARNING'):
+            mc_core.finish_log(date=today)
+            mc_core.log.clear()
+
+    def _dispatch(self, today):
+        paths_running = {path for _, _, path in self.running.values()}
+
+        for path, (station, date) in list(self.ready.items()):
+            if path in paths_running: # checked again when it finishes
+                continue
+            if station not in self.check_plan:
+                del self.ready[path]
+                continue
+
+            if date == today:
+                del self.ready[path]
+
+                live = self.live_days.get(station)
+                if live is None:
+                    live = self.live_days[station] = mc_live.open_live_day(
+                        station, self.check_plan[station], date=today, state_path=self.state_path)
+                mc_live.poll_live_day(live)
+                mc_live.save_live_day(live, self.state_path)
+                self.num_live_polls += 1
+
+            elif len(self.running) < self.max_workers:
+                del self.ready[path]
+
+                future = self._get_executor().submit(mc_batch.check_station_day, station, date,
+                                                     self.check_plan[station])
+                self.running[future] = (station, date, path)
+
+    def _collect(self):
+        for future in [future for future in self.running if future.done()]:
+            station, date, path = self.running.pop(future)
+
+            try:
+                lines, profile_lines, flags = future.result()
+            except Exception as e:
+                mc_core.add_line_log('ERROR', error_message='Checking failed to run: {!r}'.format(e),
+                                     type_data_station=station, file_path=path)
+                continue
+
+            mc_fig.adopt_figures(line[6] for line in lines)
+            mc_core.log.extend(lines)
+            mc_core.profile.extend(profile_lines)
+            self.num_days_checked += 1
+
+            if flags is not None and self.flags_path is not None:
+                Path(self.flags_path).mkdir(parents=True, exist_ok=True)
+                flags.save(Path(self.flags_path, '{}_{}.npz'.format(station, date)))
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def _restart_executor(self):
+        # the processes have the previous configuration. Running checkings finish
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    #%% Configuration
+    def reload_config(self):
+        """
+        Reads again the configuration files that changed since the last call
+        """
+        config_files = [
+            (Path(mc_meteo.stations_config.file_path or Path(os.getcwd(), mc_meteo.StationsConfig.FILE_NAME)),
+             self._reload_stations_config),
+            (Path(mc_email.email_config.file_path or Path(os.getcwd(), mc_email.EmailConfig.FILE_NAME)),
+             self._reload_email_config)]
+        if self.plan_path is not None:
+            config_files.append((self.plan_path, self._reload_check_plan))
+
+        for file_path, reload in config_files:
+            signature = file_signature(file_path)
+            is_changed = (file_path in self._config_signatures and
+                          self._config_signatures[file_path] != signature)
+            self._config_signatures[file_path] = signature
+
+            if not is_changed or signature is None:
+                continue
+
+            try:
+                reload()
+            except (OSError, ValueError, KeyError, configparser.Error) as e:
+                mc_core.add_line_log('ERROR', error_message='Configuration not reloaded from {}: {!r}'.format(
+                    file_path, e))
+            else:
+                mc_core.add_line_log('INFO', error_message='Configuration reloaded from {}'.format(file_path))
+
+    def _reload_stations_config(self):
+        mc_meteo.stations_config.reload()
+        self._restart_executor()
+
+    def _reload_email_config(self):
+        mc_email.email_config.reload()
+        mc_dispatcher.reset_email_dispatcher()
+
+    def _reload_check_plan(self):
+        check_plan = mc_batch.read_check_plan(self.plan_path)
+
+        # the files of today of the stations with new checks are checked again from the start
+        for station, live in list(self.live_days.items()):
+            if check_plan.get(station) != self.check_plan.get(station):
+                del self.live_days[station]
+                self.ready[live.file_path] = (station, live.date)
+
+        self.check_plan = check_plan
+        self._restart_executor()
+
+    #%% Service
+    def run(self, poll_interval=WATCH_POLL_INTERVAL, num_steps=None):
+        """
+        Scans every 'poll_interval' seconds, 'num_steps' times (endless if
+        None) or until it is interrupted
+        """
+        num_step = 0
+
+        try:
+            while num_steps is None or num_step < num_steps:
+                start = time.monotonic()
+                self.step()
+
+                num_step += 1
+                if num_steps is None or num_step < num_steps:
+                    time.sleep(max(0., poll_interval - (time.monotonic() - start)))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Waits for the running checkings and finishes the log. LiveDays are
+        saved, not finished, so a new service goes on from them
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._collect()
+
+        mc_core.finish_log(date=dt.date.today())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='meteocheck.watch',
+                                     description='Checks the files of meteo stations when they change')
+    parser.add_argument('--plan', required=True,
+                        help='JSON file with {type_data_station: [[check, {arguments}], ...]}, '
+                             'read again when it changes')
+    parser.add_argument('--stations', nargs='+', help='stations of the plan to check (default: all)')
+    parser.add_argument('--interval', type=float, default=WATCH_POLL_INTERVAL,
+                        help='seconds between scans (default: {})'.format(WATCH_POLL_INTERVAL))
+    parser.add_argument('--debounce', type=float, default=WATCH_DEBOUNCE,
+                        help='seconds a file of another day must stay unchanged before it is checked '
+                             '(default: {})'.format(
+                            WATCH_DEBOUNCE))
+    parser.add_argument('--workers', type=int, default=WATCH_MAX_WORKERS,
+                        help='processes of the checkings of whole days (default: {})'.format(WATCH_MAX_WORKERS))
+    parser.add_argument('--flags-path',
+                        help='directory where the per-sample flags of the whole days checked are saved (.npz)')
+
+    args = parser.parse_args(argv)
+
+    watcher = Watcher(args.plan, stations=args.stations, debounce=args.debounce, max_workers=args.workers,
+                      flags_path=args.flags_path)
+    watcher.run(poll_interval=args.interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Keys of the entries of the on-disk cache of parsed meteo files.
+"""
+import pandas as pd
+import pytest
+
+import meteocheck.cache as mc_cache
+import meteocheck.config_meteo_stations as mc_meteo
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return mc_cache.FileCache(cache_path=tmp_path / 'cache')
+
+
+def _frame():
+    return pd.DataFrame({'B': [1.0, 2.0], 'Tamb': [20.0, 21.0]},
+                        index=pd.DatetimeIndex(['2019-06-01 12:00', '2019-06-01 12:01'], name='yyyy/mm/dd_hh:mm'))
+
+
+def test_version(cache, tmp_path):
+    file_path = tmp_path / 'data2019_06_01.txt'
+    file_path.write_text('content')
+
+    assert cache.put(file_path, _frame(), version='schema 1')
+
+    pd.testing.assert_frame_equal(cache.get(file_path, version='schema 1'), _frame())
+    # parsed with another schema, or by another format of the cache
+    assert cache.get(file_path, version='schema 2') is None
+    assert cache.get(file_path) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    # only the entry of the last version is kept
+    cache.put(file_path, _frame(), version='schema 2')
+    assert cache.stats()['entries'] == 1
+    assert cache.get(file_path, version='schema 1') is None
+
+
+def test_missing_file(cache, tmp_path):
+    file_path = tmp_path / 'data2019_06_01.txt'
+    file_path.write_text('content')
+    cache.put(file_path, _frame())
+
+    file_path.unlink()
+
+    assert cache.get(file_path) is None
+    assert cache.misses == 1
+
+
+def test_cache_version():
+    versions = {station: mc_meteo.cache_version(station) for station in mc_meteo.SUPPORTED_STATIONS}
+
+    assert len(set(versions.values())) == len(versions)
+    assert mc_meteo.cache_version('helios') == versions['helios']
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Schema fast path of read_meteo_file() against the generic parser.
+"""
+import pandas as pd
+import pytest
+
+import meteocheck.config_meteo_stations as mc_meteo
+
+COLUMNS = {
+    'helios': ['G(0)', 'G(41)', 'D(0)', 'B', 'Wvel', 'Wdir', 'Tamb'],
+    'geonica': ['DNI', 'GHI', 'DHI', 'T'],
+    'meteo': ['T', 'HR', 'P', 'Wvel'],
+}
+
+
+def _write_file(file_path, type_data_station, moments):
+    columns = COLUMNS[type_data_station]
+    values = '\t'.join('{:.2f}'.format(number) for number in range(len(columns)))
+
+    if type_data_station == 'meteo':
+        lines = ['date\t' + '\t'.join(columns)] + ['{}\t{}'.format(moment, values) for moment in moments]
+    else:
+        lines = ['yyyy/mm/dd\thh:mm\t' + '\t'.join(columns)] + [
+            '{}\t{}'.format(moment.replace(' ', '\t'), values) for moment in moments]
+
+    file_path.write_text('\n'.join(lines) + '\n')
+
+
+@pytest.mark.parametrize('type_data_station', list(COLUMNS))
+def test_same_as_generic(type_data_station, tmp_path):
+    file_path = tmp_path / 'day.txt'
+    _write_file(file_path, type_data_station, ['2019/02/28 23:58', '2019/02/28 23:59'])
+
+    df = mc_meteo.read_meteo_file(file_path, type_data_station)
+
+    pd.testing.assert_frame_equal(df, mc_meteo._read_meteo_file_generic(file_path, type_data_station),
+                                  check_names=False)
+    assert isinstance(df.index, pd.DatetimeIndex)
+
+
+@pytest.mark.parametrize('type_data_station', list(COLUMNS))
+def test_impossible_date(type_data_station, tmp_path):
+    # the 30th of February is not moved to March: it is left to the generic parser
+    file_path = tmp_path / 'day.txt'
+    _write_file(file_path, type_data_station, ['2019/02/28 23:59', '2019/02/30 00:00'])
+
+    with pytest.raises(ValueError):
+        mc_meteo._read_meteo_file_schema(file_path, mc_meteo.STATION_SCHEMAS[type_data_station])
+
+    df = mc_meteo.read_meteo_file(file_path, type_data_station)
+    df_generic = mc_meteo._read_meteo_file_generic(file_path, type_data_station)
+
+    assert list(df.index.astype(str)) == list(df_generic.index.astype(str))
+    assert pd.Timestamp('2019-03-02') not in df.index
+
+
+def test_datetime_from_strings():
+    moments = mc_meteo.datetime_from_strings(['2020/02/29 12:00', '2019/12/31 23:59'])
+
+    assert list(moments) == list(pd.to_datetime(['2020-02-29 12:00', '2019-12-31 23:59']).to_numpy())
+
+    with pytest.raises(ValueError):
+        mc_meteo.datetime_from_strings(['2019/04/31 00:00'])
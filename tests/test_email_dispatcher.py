@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+EmailDispatcher against a local aiosmtpd server.
+"""
+import socket
+
+import pytest
+
+controller = pytest.importorskip('aiosmtpd.controller')
+
+import meteocheck.core as mc_core # noqa: E402
+from meteocheck.email_dispatcher import EmailDispatcher # noqa: E402
+
+
+class Handler:
+
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return '250 OK'
+
+
+@pytest.fixture
+def smtp_server():
+    handler = Handler()
+    server = controller.Controller(handler, hostname='127.0.0.1', port=_free_port())
+    server.start()
+    yield server, handler
+    server.stop()
+
+
+@pytest.fixture(autouse=True)
+def session_log():
+    sinks = list(mc_core.log_sinks)
+    mc_core.log_sinks.clear()
+    mc_core.log.clear()
+    yield mc_core.log
+    mc_core.log.clear()
+    mc_core.log_sinks.extend(sinks)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _dispatcher(port, **kwargs):
+    return EmailDispatcher(receivers=['qc@example.com'], sender='meteocheck@example.com',
+                           smtp_server='127.0.0.1', smtp_port=port, login=None, use_starttls=False,
+                           **kwargs)
+
+
+def test_send(smtp_server):
+    server, handler = smtp_server
+    dispatcher = _dispatcher(server.port, coalesce_window=0)
+
+    dispatcher.submit(body='<p>Test</p>', subject='Test', list_figures=[])
+    dispatcher.close()
+
+    assert dispatcher.num_sent == 1
+    assert dispatcher.failures == []
+    assert len(handler.messages) == 1
+    assert handler.messages[0].rcpt_tos == ['qc@example.com']
+    assert b'Subject: Test' in handler.messages[0].content
+
+
+def test_digest(smtp_server):
+    server, handler = smtp_server
+    dispatcher = _dispatcher(server.port, coalesce_window=5)
+
+    dispatcher.submit(body='<p>1</p>', subject='First', list_figures=[])
+    dispatcher.submit(body='<p>2</p>', subject='Second', list_figures=[])
+    dispatcher.flush()
+    dispatcher.close()
+
+    assert dispatcher.num_sent == 1
+    assert dispatcher.num_reports_sent == 2
+    assert len(handler.messages) == 1
+    assert b'Digest of 2 meteocheck reports' in handler.messages[0].content
+
+
+def test_dropped_is_logged(session_log):
+    dispatcher = _dispatcher(_free_port(), coalesce_window=0, max_retries=1, retry_backoff=0)
+
+    dispatcher.submit(body='<p>Test</p>', subject='Lost', list_figures=[])
+    dispatcher.close()
+
+    assert dispatcher.num_sent == 0
+    assert dispatcher.num_retries == 1
+    assert len(dispatcher.failures) == 1
+
+    errors = [line for line in session_log.lines() if line[1] == mc_core.ERROR_LEVELS.index('ERROR')]
+    assert len(errors) == 1
+    assert "['Lost']" in errors[0][4]
+
+
+def test_dropped_is_logged_from_the_log_thread(session_log):
+    # the background thread does not touch the log. The failure reaches the sinks later
+    lines_sinks = []
+    mc_core.log_sinks.append(lines_sinks.append)
+    dispatcher = _dispatcher(_free_port(), coalesce_window=0, max_retries=0)
+
+    dispatcher.submit(body='<p>Test</p>', subject='Lost', list_figures=[])
+    dispatcher.flush()
+
+    assert len(dispatcher.failures) == 1
+    assert len(session_log) == 0
+
+    dispatcher.log_failures()
+    dispatcher.close()
+
+    assert len(session_log) == 1
+    assert lines_sinks == session_log.lines()
+    assert "['Lost']" in lines_sinks[0][4]
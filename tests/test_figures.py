@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Memory of the FigureSpec's not rendered yet: only the data to plot is kept and
+it is counted in the memory budget of the FigureManager.
+"""
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import meteocheck.figures as mc_fig
+
+
+@pytest.fixture
+def manager(monkeypatch, tmp_path):
+    manager = mc_fig.FigureManager(memory_budget=2**20, spill_path=tmp_path)
+    monkeypatch.setattr(mc_fig, '_figure_manager', manager)
+    yield manager
+    manager.close()
+
+
+def _frame(num_rows=100000):
+    return pd.DataFrame(np.random.default_rng(0).random((num_rows, 4)),
+                        index=pd.date_range('2019-06-01', periods=num_rows, freq='s'))
+
+
+def test_keeps_only_the_selection(manager):
+    df = _frame()
+    is_flagged = df[0] > 0.999
+
+    figure = mc_fig.FigureSpec('check_range:0').plot(df[0], mask=is_flagged, style='rP')
+
+    (series, _), = figure.lines
+    pd.testing.assert_series_equal(series, df[0][is_flagged])
+    assert not np.shares_memory(series.to_numpy(), df.to_numpy())
+    # sent to another process without the frame
+    assert len(pickle.dumps(figure)) < df[0].memory_usage(index=True) / 10
+    assert manager.bytes_unrendered == figure.num_bytes == series.memory_usage(index=True)
+
+
+def test_unrendered_in_budget(manager):
+    df = _frame()
+    manager.memory_budget = 3 * df[0].memory_usage(index=True)
+
+    figures = [mc_fig.FigureSpec(str(column)).plot(df[column]) for column in df]
+
+    # the oldest are rendered to stay within the budget, but not the last one
+    assert [figure.png is not None for figure in figures] == [True, True, False, False]
+    assert figures[0].lines == [] and figures[0].num_bytes == 0
+    assert manager.bytes_unrendered == 2 * df[0].memory_usage(index=True)
+    assert manager.bytes_in_memory + manager.bytes_unrendered <= manager.memory_budget
+
+    mc_fig.discard_figures(figures)
+
+    assert manager.bytes_unrendered == manager.bytes_in_memory == 0
+
+
+def test_release_adopt(manager):
+    series = _frame(1000)[0]
+    figure = mc_fig.FigureSpec('check_range:0').plot(series)
+
+    mc_fig.release_figures([figure])
+    assert manager.bytes_unrendered == 0
+
+    # as in the parent process of a batch
+    figure = pickle.loads(pickle.dumps(figure))
+    mc_fig.adopt_figures([figure])
+    assert manager.bytes_unrendered == figure.num_bytes > 0
+
+    assert figure.render().getvalue().startswith(b'\x89PNG')
+    assert manager.bytes_unrendered == 0
+    assert manager.bytes_in_memory == len(figure.png)
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Budget of the time to import meteocheck, and the heavy modules it must not
+load (see benchmarks/bench_import.py).
+"""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# Seconds, best of RUNS imports in fresh interpreters
+BUDGET = {'meteocheck': 0.1, 'meteocheck.core': 2.0, 'meteocheck.batch': 2.0}
+RUNS = 3
+
+# Only needed when they are used: data, figures and emails
+LAZY_MODULES = {'meteocheck': ['pandas', 'matplotlib', 'keyring'],
+                'meteocheck.core': ['matplotlib', 'keyring'],
+                'meteocheck.batch': ['matplotlib', 'keyring']}
+
+_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, [name for name in {lazy_modules!r} if name in sys.modules]]))
+"""
+
+
+def _import(module, cwd):
+    # from an empty directory, so no '.ini' file can be read
+    root = str(Path(__file__).resolve().parents[1])
+    output = subprocess.run([sys.executable, '-c', _SCRIPT.format(module=module,
+                                                                  lazy_modules=LAZY_MODULES[module])],
+                            cwd=str(cwd), env={'PYTHONPATH': root}, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout)
+
+
+@pytest.mark.parametrize('module', list(BUDGET))
+def test_import_budget(module, tmp_path):
+    results = [_import(module, tmp_path) for _ in range(RUNS)]
+
+    assert min(elapsed for elapsed, _ in results) < BUDGET[module]
+    assert [name for _, loaded in results for name in loaded] == []
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+MultiDayChecking against a single-day Checking of every day: same lines in
+the log and same per-sample flags (see benchmarks/bench_multiday.py).
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# synthetic data of the benchmarks
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'benchmarks'))
+
+import synthetic # noqa: E402
+
+import meteocheck.core as mc_core # noqa: E402
+from meteocheck.multiday import MultiDayChecking # noqa: E402
+
+DAYS = 6
+
+CHECKS = {
+    'helios': [
+        ('check_format', {'num_columns': 7}),
+        ('check_time_index', {}),
+        ('check_null', {'column': 'B'}),
+        ('check_range', {'column': 'B', 'minimum': 0, 'maximum': 1000}),
+        ('check_pct_change', {'column': 'Tamb', 'window': 5, 'threshold_pct': 1}),
+        ('check_abs_change', {'column': 'B', 'window': [5, 60], 'threshold': [400, 600]}),
+        ('check_differential', {'column': 'B', 'threshold': 200}),
+        ('check_total_irradiation', {'column': 'B', 'total_irradiation_threshold': 5}),
+        ('check_coherence_radiation', {'threshold_pct': 10, 'dni': 'B', 'ghi': 'G(0)', 'dhi': 'D(0)'}),
+        ('check_radiation_other_source', {'column': 'B', 'threshold_pct': 5}),
+        ('check_total_irradiation_other_source', {'column': 'B', 'threshold_pct': 5}),
+        ('check_num_radiation_transitions_other_source', {'column': 'B',
+                                                          'num_diff_radiation_transitions_thresold': 5}),
+        ('check_same_magnitude_pct_change', {'column': 'G(41)', 'column_other': 'G(0)', 'threshold_pct': 15}),
+        ('check_same_irradiance_pct_change', {'column': 'G(41)', 'column_other': 'G(0)', 'threshold_pct': 15}),
+        ('check_same_magnitude_total_irradiation', {'column': 'G(41)', 'column_other': 'G(0)',
+                                                    'threshold_pct': 15}),
+    ],
+    'geonica': [
+        ('check_misalignment_geonica', {'column': 'DNI'}),
+        ('check_coherence_isotypes', {'dni': 'DNI', 'top': 'Top', 'mid': 'Mid', 'bot': 'Bot', 'threshold_pct': 5}),
+    ],
+}
+
+
+@pytest.fixture(autouse=True)
+def session_log():
+    sinks = list(mc_core.log_sinks)
+    mc_core.log_sinks.clear()
+    mc_core.log.clear()
+    yield mc_core.log
+    mc_core.log.clear()
+    mc_core.log_sinks.extend(sinks)
+
+
+def _frames(type_data_station, **defects):
+    df = synthetic.station_frame(type_data_station, '2019-06-01', days=DAYS, **defects)
+    other_radiation = synthetic.station_frame('geonica', '2019-06-01', days=DAYS, seed=1)['DNI']
+
+    return df, other_radiation
+
+
+def _lines(log):
+    # without the time stamp, and only if there is a figure
+    return [line[1:6] + (line[6] is not None,) for line in log.lines()]
+
+
+def _arguments(name_check, kwargs, other_radiation):
+    if name_check.endswith('other_source'):
+        return dict(kwargs, other_radiation=other_radiation)
+    return kwargs
+
+
+def _check_days(type_data_station, df, name_check, kwargs):
+    """
+    Lines of the log and flags of a single-day Checking of every day
+    """
+    flags = []
+    for day, df_day in df.groupby(df.index.normalize()):
+        kwargs_day = {key: value[(value.index >= day) & (value.index < day + pd.Timedelta('1D'))]
+                      if isinstance(value, pd.Series) else value for key, value in kwargs.items()}
+
+        checking = mc_core.Checking.from_frame(df_day, type_data_station, 60, file_path=day.date(),
+                                               date=day.date())
+        getattr(checking, name_check)(**kwargs_day)
+        flags.append(checking.flags.values)
+
+    return _lines(mc_core.log), np.concatenate(flags)
+
+
+@pytest.mark.parametrize('defects', [{}, {'duplicates': True}, {'gaps': False, 'spikes': False}])
+@pytest.mark.parametrize('type_data_station, name_check, kwargs',
+                         [(type_data_station, name_check, kwargs)
+                          for type_data_station, checks in CHECKS.items() for name_check, kwargs in checks])
+def test_same_as_single_days(type_data_station, name_check, kwargs, defects, session_log):
+    df, other_radiation = _frames(type_data_station, **defects)
+    kwargs = _arguments(name_check, kwargs, other_radiation)
+
+    lines, flags = _check_days(type_data_station, df, name_check, kwargs)
+    session_log.clear()
+
+    checking = MultiDayChecking(type_data_station, df, samples_per_hour=60)
+    session_log.clear()
+    getattr(checking, name_check)(**kwargs)
+
+    assert _lines(session_log) == lines
+    np.testing.assert_array_equal(checking.flags.values, flags)
+
+
+def test_unsorted_days(session_log):
+    # days that are not contiguous are checked one by one, with the same lines
+    df, _ = _frames('helios')
+    # without frequency, as the frames read from files
+    df.index = pd.DatetimeIndex(df.index.to_numpy())
+    df_unsorted = pd.concat([df.iloc[1440:], df.iloc[:1440]])
+
+    lines = []
+    for df_checked in [df, df_unsorted]:
+        checking = MultiDayChecking('helios', df_checked, samples_per_hour=60)
+        session_log.clear()
+        checking.check_differential('B', 200)
+        lines.append(_lines(session_log))
+
+    assert not checking.is_segmented
+    assert len(lines[0]) > 1
+    assert sorted(lines[1]) == sorted(lines[0])
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Profile of the checks (see core.ProfileTable) run from several threads.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import meteocheck.core as mc_core
+
+NUM_THREADS = 4
+NUM_CALLS = 50
+
+
+@pytest.fixture(autouse=True)
+def session_log():
+    sinks = list(mc_core.log_sinks)
+    mc_core.log_sinks.clear()
+    mc_core.log.clear()
+    mc_core.profile.clear()
+    yield mc_core.log
+    mc_core.log.clear()
+    mc_core.profile.clear()
+    mc_core.log_sinks.extend(sinks)
+
+
+def _checking(num_flagged):
+    values = np.zeros(1440)
+    values[:num_flagged] = 2000
+    df = pd.DataFrame({'B': values}, index=pd.date_range('2019-06-01', periods=1440, freq='min'))
+
+    return mc_core.Checking.from_frame(df, 'helios', 60, file_path=num_flagged)
+
+
+def test_threads():
+    # each thread counts the samples flagged by its own checks, at depth 0
+    def run(checking):
+        for _ in range(NUM_CALLS):
+            checking.check_range('B', 0, 1000)
+
+    threads = [threading.Thread(target=run, args=(_checking(num_flagged),))
+               for num_flagged in range(1, NUM_THREADS + 1)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    frame = mc_core.profile.to_frame()
+
+    assert len(frame) == NUM_THREADS * NUM_CALLS
+    assert (frame['depth'] == 0).all()
+    assert (frame['flagged'] == frame['file']).all()